@@ -1,34 +1,108 @@
-﻿import os
-from datetime import datetime
+﻿import argparse
+import subprocess
+import sys
+from datetime import datetime, timedelta
 
-print("🚀 Starting ScratchModelV3.1 Pipeline...")
+import get_scores
+import http_cache
+import odds_scraper_with_fallback as odds_scraper
+import pipeline
+import storage
+from pipeline import Stage, script
 
-# === STEP 1: Generate matchups from Rotowire for today + tomorrow
-print("📅 Step 1: Building matchups for today + tomorrow...")
-os.system("python get_todays_matchups.py")
+# === Stages: what each step reads and writes decides the order (see pipeline.py);
+# unchanged inputs + code + params mean a stage is restored from the stage cache instead
+today = datetime.today()
+yesterday, tomorrow = today - timedelta(days=1), today + timedelta(days=1)
+ROTOWIRE_CSV = "data/rotowire-projstarters.csv"
+MODEL_FILES = ["model/yrfi_xgb_model.pkl", "model/yrfi_encoder.pkl", "model/bundles/LATEST"]
+DAY = {"today": today.strftime("%Y-%m-%d")}
 
-# === STEP 2: Build input features with odds
-print("📊 Step 2: Generating features with market odds...")
-os.system("python generate_pregame_with_odds.py")
 
-# === STEP 3: Run predictions for all available matchups
-print("🧠 Step 3: Running predictions...")
-os.system("python predict_today.py")
+def scrape_scores():
+    get_scores.scrape_range(yesterday.strftime("%Y-%m-%d"), tomorrow.strftime("%Y-%m-%d"))
 
-# === STEP 4: Force Git to always commit (touch .last_push.txt)
-timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-touch_file = "data/.last_push.txt"
-with open(touch_file, "w") as f:
-    f.write(f"Last push: {timestamp}\n")
 
-# === STEP 5: Git commit + push
-print("📤 Step 4: Committing and pushing updates to GitHub...")
-os.system("git add .")  # Includes all .py, .csv, .txt, etc.
-os.system(f'git commit -m "🤖 Auto push from pipeline @ {timestamp}"')
-os.system("git push origin main")
+def scrape_odds():
+    odds_scraper.scrape_range(today.replace(hour=0, minute=0, second=0, microsecond=0), tomorrow)
 
-# === STEP 6: Launch dashboard (local only)
-print("📈 Step 5: Launching Streamlit dashboard...")
-os.system("start streamlit run yrfi_dashboard.py")  # For Windows users
 
-print("✅ ScratchModelV3.1 pipeline complete.")
+def publish():
+    # Partial (per-month) writes leave a table's whole-table CSV export stale; refresh those once here
+    for name in storage.export_stale_csv():
+        print(f"📄 Exported {storage.csv_path(name)}")
+    # Force Git to always commit (touch .last_push.txt), then commit + push
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with open("data/.last_push.txt", "w") as f:
+        f.write(f"Last push: {timestamp}\n")
+    subprocess.run(["git", "add", "."], check=True)  # Includes all .py, .csv, .txt, etc.
+    subprocess.run(["git", "commit", "-m", f"🤖 Auto push from pipeline @ {timestamp}"], check=True)
+    subprocess.run(["git", "push", "origin", "main"], check=True)
+
+
+STAGES = [
+    # Network scrapes and publishing always run
+    Stage("scores", scrape_scores, outputs=["mlb_boxscores_cleaned"], cache=False),
+    Stage("odds", scrape_odds, outputs=["mlb_odds_mybookie"], cache=False),
+    Stage("matchups", script("get_todays_matchups.py"), outputs=["today_matchups"],
+          sources=[ROTOWIRE_CSV], code=["rotowire.py"], params=DAY),
+    Stage("market", odds_scraper.merge_with_model_results,
+          inputs=["mlb_odds_mybookie", "mlb_boxscores_cleaned"], outputs=["mlb_model_and_odds"],
+          code=["teams.py"]),
+    Stage("starters", script("matchandmerge.py"),
+          inputs=["mlb_boxscores_cleaned"], outputs=["boxscores_with_starters"],
+          sources=[ROTOWIRE_CSV], code=["rotowire.py", "teams.py"]),
+    # Writes only the game store (starters, era_history, starter_era), which features reads;
+    # nothing for the stage cache to restore, so it always runs
+    Stage("era", script("add_era_to_yrfi_input.py"), after=["starters"], sources=[ROTOWIRE_CSV], cache=False),
+    Stage("features", script("add_team_1st_inning_rates.py"),
+          inputs=["mlb_boxscores_cleaned", "boxscores_with_starters"],
+          outputs=["yrfi_model_input_with_era_and_team_rates"], after=["era"],
+          store=["games", "starters", "starter_era"],
+          code=["team_rates.py", "starter_features.py", "game_store.py"], params=DAY),
+    Stage("predict", script("predict_today.py"),
+          inputs=["yrfi_model_input_with_era_and_team_rates"],
+          outputs=["yrfi_predictions_pregame_with_odds"],
+          sources=MODEL_FILES, code=["features.py", "inference.py"]),
+    Stage("explain", script("explain_predictions.py"),
+          inputs=["yrfi_predictions_pregame_with_odds", "yrfi_model_input_with_era_and_team_rates"],
+          outputs=["yrfi_prediction_contributions"],
+          sources=MODEL_FILES, code=["features.py", "inference.py"]),
+    Stage("publish", publish,
+          inputs=["yrfi_predictions_pregame_with_odds", "yrfi_prediction_contributions",
+                  "mlb_model_and_odds", "today_matchups"], cache=False),
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="+", metavar="STAGE",
+                        help=f"Run just these stages and what they depend on ({', '.join(s.name for s in STAGES)})")
+    parser.add_argument("--skip", nargs="+", metavar="STAGE", default=[],
+                        help="Leave these stages out (e.g. publish); their outputs are used as stored")
+    parser.add_argument("--workers", type=int, default=4, help="Stages run in parallel")
+    parser.add_argument("--no-cache", action="store_true", help="Re-run every stage instead of restoring cached outputs")
+    parser.add_argument("--replay-only", action="store_true", help="Serve every request from the HTTP cache")
+    parser.add_argument("--no-dashboard", action="store_true", help="Don't launch Streamlit afterwards")
+    args = parser.parse_args()
+    if args.replay_only:
+        http_cache.REPLAY_ONLY = True
+
+    unknown = sorted((set(args.only or []) | set(args.skip)) - {stage.name for stage in STAGES})
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    print("🚀 Starting ScratchModelV3.1 Pipeline...")
+    try:
+        # Skipped stages count as done for the stages after them
+        pipeline.run(STAGES, workers=args.workers, only=args.only, skip=args.skip, use_cache=not args.no_cache)
+    except pipeline.StageFailed as e:
+        print(f"❌ ScratchModelV3.1 pipeline failed: {e}")
+        sys.exit(1)
+
+    # === Launch dashboard (local only)
+    if not args.no_dashboard:
+        print("📈 Launching Streamlit dashboard...")
+        subprocess.Popen([sys.executable, "-m", "streamlit", "run", "yrfi_dashboard.py"])
+
+    print("✅ ScratchModelV3.1 pipeline complete.")
@@ -1,45 +1,25 @@
 ﻿# add_team_1st_inning_rates.py
-import pandas as pd
-from pathlib import Path
+import game_store
+import starter_features
+import storage
+import team_rates
 
-DATA_DIR = Path("data")
+# Point-in-time team home/away 1st-inning scoring rates: only days not yet folded into
+# the running state are processed (see team_rates.py); the model_input view joins them in.
+conn = game_store.connect()
+n = team_rates.update(conn)
+print(f"📈 Team rate features updated for {n} games")
 
-# Load boxscores
-box = pd.read_csv(DATA_DIR / "mlb_boxscores_cleaned.csv", parse_dates=["Game Date"])
-box = box.rename(columns={
-    "Game Date": "date",
-    "Home Team": "home_team",
-    "Away Team": "away_team",
-    "Home 1st": "home_1st",
-    "Away 1st": "away_1st"
-})
+# As-of starter first-inning runs allowed (grouped cumulative sums over every start)
+n = starter_features.update(conn)
+print(f"🎯 Starter first-inning features updated for {n} starts")
 
-# Calculate team scoring rates as HOME
-home_rates = (
-    box.groupby("home_team")["home_1st"]
-    .agg(["mean", "count"])
-    .rename(columns={"mean": "home_team_avg_1st", "count": "home_games"})
-    .reset_index()
-)
-
-# Calculate team scoring rates as AWAY
-away_rates = (
-    box.groupby("away_team")["away_1st"]
-    .agg(["mean", "count"])
-    .rename(columns={"mean": "away_team_avg_1st", "count": "away_games"})
-    .reset_index()
-)
-
-# Load model input
-games = pd.read_csv(DATA_DIR / "yrfi_model_input_with_era.csv", parse_dates=["date"])
-
-# Merge in the scoring rates
-games = games.merge(home_rates, left_on="home_team", right_on="home_team", how="left")
-games = games.merge(away_rates, left_on="away_team", right_on="away_team", how="left")
+# Load model input (games with known starters, ERA and team rates in one query)
+games = game_store.model_input(conn=conn, complete=True)
 
 # Final output
-out_path = DATA_DIR / "yrfi_model_input_with_era_and_team_rates.csv"
-games.to_csv(out_path, index=False)
+storage.write_table(games, "yrfi_model_input_with_era_and_team_rates")
+out_path = storage.table_path("yrfi_model_input_with_era_and_team_rates")
 print(f"✅ Team 1st inning rates added. Saved to: {out_path.resolve()}")
 
 # Preview
@@ -1,31 +1,31 @@
 ﻿import pandas as pd
-from pathlib import Path
+import game_store
+import storage
 
-DATA_DIR = Path("data")
-main_file = DATA_DIR / "yrfi_model_input_with_era_and_team_rates.csv"
-live_file = DATA_DIR / "yrfi_model_input_live_with_era.csv"
+main_table = "yrfi_model_input_with_era_and_team_rates"
+live_table = "yrfi_model_input_live_with_era"
 
-# === Load both files
-main_df = pd.read_csv(main_file, parse_dates=["date"])
-live_df = pd.read_csv(live_file, parse_dates=["date"])
-
-# Ensure datetime type
-main_df["date"] = pd.to_datetime(main_df["date"])
+# === Load the live rows
+# prepare_model_input_live.py builds them from the game store's model_input view (get_scores
+# upserts every scheduled game), so nothing is written back to the store here
+live_df = storage.read_table(live_table)
 live_df["date"] = pd.to_datetime(live_df["date"])
 
-# === Identify unique matchup keys (date + teams)
+# === Which live games the main table is missing (game_key: date, teams and game number)
 match_keys = ["date", "away_team", "home_team"]
+if live_df.empty or not storage.exists(main_table):
+    stored_keys = pd.Series([], dtype="int64")
+else:
+    stored_keys = storage.read_table(main_table, columns=["game_key"], start=live_df["date"].min())["game_key"]
+added = int((~live_df["game_key"].isin(stored_keys)).sum())
 
-# Perform left merge to find new matchups
-merged = live_df.merge(main_df[match_keys], on=match_keys, how="left", indicator=True)
-new_rows = merged[merged["_merge"] == "left_only"].drop(columns=["_merge"])
-
-# === Append new rows if found
-if new_rows.empty:
+# === Re-export the main table from the store if anything is missing
+if added == 0:
     print("ℹ️ No new matchups to append. Everything is current.")
 else:
-    combined = pd.concat([main_df, new_rows], ignore_index=True)
-    combined.to_csv(main_file, index=False)
-    print(f"✅ Appended {len(new_rows)} new matchups to {main_file.name}")
-    print("📋 Sample new rows:")
-    print(new_rows[match_keys + ['home_era', 'away_era']].head())
+    main_df = game_store.model_input(complete=True)
+    storage.write_table(main_df, main_table)
+    print(f"✅ Appended {added} new matchups to {main_table}")
+    print("📋 Sample live rows:")
+    live_rows = main_df[main_df["date"] >= live_df["date"].min()]
+    print(live_rows[match_keys + ['home_era', 'away_era']].head())
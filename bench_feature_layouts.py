@@ -0,0 +1,92 @@
+﻿# bench_feature_layouts.py
+# Dense one-hot vs sparse CSR vs XGBoost-native categorical feature layouts (features.py):
+# matrix memory, build time, fit time, predict time and holdout quality for each.
+#
+#   python bench_feature_layouts.py                   # the model's categoricals
+#   python bench_feature_layouts.py --with-pitchers   # + starting pitchers as categoricals
+#   python bench_feature_layouts.py --repeat 10       # history tiled 10x, to see scaling
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import log_loss, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import OneHotEncoder
+
+import features
+import storage
+
+PITCHER_COLS = ["home_starter_clean", "away_starter_clean"]
+XGB_PARAMS = dict(objective="binary:logistic", eval_metric="logloss", n_estimators=100,
+                  max_depth=4, learning_rate=0.1, random_state=42)
+
+
+def build(rows, cols, layout):
+    encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit(rows[cols].astype(str))
+    if layout == "dense":
+        return np.hstack([encoder.transform(rows[cols].astype(str)), features.numeric(rows)])
+    if layout == "sparse":
+        return features.one_hot_csr(rows.assign(**{c: rows[c].astype(str) for c in cols}), encoder.categories_, cols)
+    return features.categorical_frame(rows.assign(**{c: rows[c].astype(str) for c in cols}), encoder.categories_, cols)
+
+
+def nbytes(X):
+    if isinstance(X, pd.DataFrame):
+        return int(X.memory_usage(deep=True).sum())
+    if hasattr(X, "indptr"):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, float(np.median(times))
+
+
+def take(X, idx):
+    return X.iloc[idx] if isinstance(X, pd.DataFrame) else X[idx]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--with-pitchers", action="store_true", help="Add starting pitchers as categoricals")
+    parser.add_argument("--repeat", type=int, default=1, help="Tile the history this many times")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per measurement (median kept)")
+    args = parser.parse_args()
+
+    rows = features.prepare(storage.read_table(features.SOURCE_TABLE))
+    cols = features.CATEGORICAL_COLS + (PITCHER_COLS if args.with_pitchers else [])
+    rows = rows.dropna(subset=cols)
+    rows = pd.concat([rows] * args.repeat, ignore_index=True)
+    y = rows["yrfi"].astype(int).to_numpy()
+    train, test = train_test_split(np.arange(len(rows)), test_size=0.2, stratify=y, random_state=42)
+    print(f"📐 {len(rows)} rows, categoricals: {', '.join(cols)}")
+
+    results, baseline = [], None
+    for layout in features.LAYOUTS:
+        X, build_s = timed(lambda: build(rows, cols, layout), args.runs)
+        model = xgb.XGBClassifier(**XGB_PARAMS, **features.xgb_options(layout))
+        _, fit_s = timed(lambda: model.fit(take(X, train), y[train]), args.runs)
+        X_test = take(X, test)
+        proba, predict_s = timed(lambda: model.predict_proba(X_test)[:, 1], args.runs)
+        if baseline is None:
+            baseline = proba
+        results.append({
+            "layout": layout,
+            "columns": X.shape[1],
+            "matrix_kb": nbytes(X) / 1024,
+            "build_ms": build_s * 1000,
+            "fit_ms": fit_s * 1000,
+            "predict_ms": predict_s * 1000,
+            "auc": roc_auc_score(y[test], proba),
+            "logloss": log_loss(y[test], proba),
+            "max_prob_diff_vs_dense": float(np.max(np.abs(proba - baseline))),
+        })
+
+    print(pd.DataFrame(results).round(4).to_string(index=False))
@@ -0,0 +1,79 @@
+﻿# bench_half_inning.py
+# Half-inning decomposition model (half_inning.py) vs the current combined XGBoost model,
+# backtested on the same time-ordered folds as tune_yrfi_xgb.py (train on earlier game
+# days, score the next chunk). Both use the same booster parameters. Reports YRFI log
+# loss, Brier score and ROC AUC per fold, each half's own log loss, and fit / slate
+# scoring time.
+#
+#   python bench_half_inning.py
+#   python bench_half_inning.py --folds 5
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import log_loss, roc_auc_score
+from sklearn.preprocessing import OneHotEncoder
+
+import features
+import half_inning
+import tune_yrfi_xgb
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def scores(y, p):
+    return {
+        "logloss": log_loss(y, p, labels=[0, 1]),
+        "brier": float(np.mean((p - y) ** 2)),
+        "auc": roc_auc_score(y, p) if len(np.unique(y)) > 1 else np.nan,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folds", type=int, default=3, help="Time-ordered folds")
+    args = parser.parse_args()
+
+    rows, _ = features.cached_rows()
+    rows = rows[features.labeled(rows)].reset_index(drop=True)
+    params = tune_yrfi_xgb.best_params()
+    encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit(rows[features.CATEGORICAL_COLS])
+    X = features.matrix(rows, encoder)
+    y = rows["yrfi"].astype(int).to_numpy()
+    print(f"⚾ {len(rows)} games, {args.folds} time-ordered folds, params {params}")
+
+    results = []
+    for fold, (train, valid) in enumerate(tune_yrfi_xgb.time_folds(rows["date"].to_numpy(), args.folds), start=1):
+        combined = xgb.XGBClassifier(objective="binary:logistic", eval_metric="logloss", random_state=42, **params)
+        _, fit_s = timed(lambda: combined.fit(X[train], y[train]))
+        p, predict_s = timed(lambda: combined.predict_proba(X[valid])[:, 1])
+        results.append({"fold": fold, "model": "combined", **scores(y[valid], p),
+                        "fit_ms": fit_s * 1000, "predict_ms": predict_s * 1000})
+
+        half, fit_s = timed(lambda: half_inning.fit(rows.iloc[train], params))
+        (p_top, p_bottom, p), predict_s = timed(lambda: half_inning.predict_halves(half, rows.iloc[valid]))
+        top = (rows["Away 1st"].iloc[valid].to_numpy() > 0).astype(int)
+        bottom = (rows["Home 1st"].iloc[valid].to_numpy() > 0).astype(int)
+        results.append({"fold": fold, "model": "half_inning", **scores(y[valid], p),
+                        "top_logloss": log_loss(top, p_top, labels=[0, 1]),
+                        "bottom_logloss": log_loss(bottom, p_bottom, labels=[0, 1]),
+                        "fit_ms": fit_s * 1000, "predict_ms": predict_s * 1000})
+
+    table = pd.DataFrame(results)
+    print(table.round(4).to_string(index=False))
+    print("\n📊 Mean over folds:")
+    print(table.drop(columns="fold").groupby("model").mean().round(4).to_string())
+
+    # Whole-table scoring: 2n halves in one pass vs the combined model's n rows
+    full = half_inning.fit(rows, params)
+    _, half_s = timed(lambda: half_inning.predict_halves(full, rows))
+    combined = xgb.XGBClassifier(objective="binary:logistic", eval_metric="logloss", random_state=42, **params).fit(X, y)
+    _, combined_s = timed(lambda: combined.predict_proba(X))
+    print(f"\n⏱ Scoring all {len(rows)} games: combined {combined_s * 1000:.1f} ms, "
+          f"half-inning {half_s * 1000:.1f} ms ({2 * len(rows)} halves)")
@@ -0,0 +1,76 @@
+﻿# bench_inference_load.py
+# Cold start of a prediction run: joblib model + encoder (sklearn/xgboost stack) vs the
+# inference bundle (inference.py, NumPy only). Each run is a fresh interpreter that loads
+# the model and scores every cached row; the bundle's probabilities are checked against
+# model.predict_proba. Run save_yrfi_model.py first.
+#
+#   python bench_inference_load.py            # 5 cold starts per path, median kept
+#   python bench_inference_load.py --runs 10
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+import inference
+
+LEGACY = """
+import time; start = time.perf_counter()
+import joblib, features
+model = joblib.load("model/yrfi_xgb_model.pkl"); encoder = joblib.load("model/yrfi_encoder.pkl")
+loaded = time.perf_counter()
+fm = features.cached(encoder, layout=features.model_layout(model))
+p = model.predict_proba(fm.X)[:, 1]
+"""
+BUNDLE = """
+import time; start = time.perf_counter()
+import inference, features
+bundle = inference.load()
+loaded = time.perf_counter()
+rows, _ = features.cached_rows()
+p = bundle.predict_proba(rows)
+"""
+REPORT = """
+done = time.perf_counter()
+import json, sys
+print(json.dumps({"load_ms": (loaded - start) * 1000, "total_ms": (done - start) * 1000,
+                  "modules": len(sys.modules), "sklearn": "sklearn" in sys.modules,
+                  "xgboost": "xgboost" in sys.modules, "proba": p.tolist()}))
+"""
+
+
+def cold_start(code):
+    out = subprocess.run([sys.executable, "-c", code + REPORT], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per path (median kept)")
+    args = parser.parse_args()
+    if inference.latest() is None:
+        sys.exit("❌ No inference bundle yet; run save_yrfi_model.py first")
+
+    cold_start(LEGACY)  # warm the feature cache and the OS page cache once
+    results, probas = [], {}
+    for name, code in [("joblib", LEGACY), ("bundle", BUNDLE)]:
+        runs = [cold_start(code) for _ in range(args.runs)]
+        probas[name] = np.asarray(runs[-1]["proba"])
+        results.append({
+            "path": name,
+            "load_ms": float(np.median([r["load_ms"] for r in runs])),
+            "total_ms": float(np.median([r["total_ms"] for r in runs])),
+            "modules": runs[-1]["modules"],
+            "sklearn": runs[-1]["sklearn"],
+            "xgboost": runs[-1]["xgboost"],
+        })
+
+    print(f"📦 Bundle {inference.latest().name}, {len(probas['bundle'])} rows")
+    print(pd.DataFrame(results).round(1).to_string(index=False))
+    diff = float(np.max(np.abs(probas["bundle"] - probas["joblib"])))
+    speedup = results[0]["total_ms"] / results[1]["total_ms"]
+    print(f"⏱ Cold start {speedup:.1f}x faster; max probability difference {diff:.2e}")
+    if diff > 1e-5:
+        sys.exit("❌ Bundle probabilities disagree with the joblib model")
@@ -0,0 +1,98 @@
+﻿# bench_prediction_service.py
+# Latency of the resident scoring service (prediction_service.py) vs a cold prediction run.
+# Starts a service on a spare port, then measures single-game requests one after another,
+# and many clients at once (where micro-batching merges their requests). Run
+# save_yrfi_model.py first.
+#
+#   python bench_prediction_service.py
+#   python bench_prediction_service.py --requests 2000 --clients 16
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+import features
+import prediction_service
+
+PORT = 8799
+
+COLD = """
+import time; start = time.perf_counter()
+import features, inference
+bundle = inference.load()
+rows, _ = features.cached_rows()
+p = bundle.predict_proba(rows.iloc[:1])
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def percentiles(seconds):
+    ms = np.asarray(seconds) * 1000
+    return f"p50 {np.percentile(ms, 50):.3f} ms, p99 {np.percentile(ms, 99):.3f} ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per measurement")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    args = parser.parse_args()
+
+    rows, _ = features.cached_rows()
+    games = [{"game_key": int(k)} for k in rows["game_key"].dropna()]
+    server = subprocess.Popen([sys.executable, "prediction_service.py", "--port", str(PORT)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(600):
+            if prediction_service.available(PORT):
+                break
+            time.sleep(0.05)
+        else:
+            sys.exit("❌ Scoring service did not start")
+
+        cold = float(subprocess.run([sys.executable, "-c", COLD], capture_output=True, text=True,
+                                    check=True).stdout.strip().splitlines()[-1])
+        print(f"🧊 Cold start + one prediction: {cold:.0f} ms")
+
+        # One client, one game per request (each waits out the batch window alone)
+        sequential = []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            prediction_service.predict([games[i % len(games)]], port=PORT)
+            sequential.append(time.perf_counter() - start)
+        print(f"🔁 Sequential single-game requests: {percentiles(sequential)}")
+
+        # Many clients at once: requests inside one window are scored together
+        before = prediction_service.health(PORT)
+        latencies, lock = [], threading.Lock()
+
+        def client(n):
+            mine = []
+            for i in range(n):
+                start = time.perf_counter()
+                prediction_service.predict([games[i % len(games)]], port=PORT)
+                mine.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(mine)
+
+        threads = [threading.Thread(target=client, args=(args.requests // args.clients,)) for _ in range(args.clients)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        after = prediction_service.health(PORT)
+        served, batches = after["requests"] - before["requests"], after["batches"] - before["batches"]
+        print(f"👥 {args.clients} concurrent clients: {percentiles(latencies)}, "
+              f"{len(latencies) / elapsed:.0f} req/s, {served / max(batches, 1):.1f} requests per batch")
+
+        # The whole slate in one request
+        start = time.perf_counter()
+        prediction_service.predict(games, port=PORT)
+        print(f"📋 All {len(games)} games in one request: {(time.perf_counter() - start) * 1000:.2f} ms")
+    finally:
+        server.terminate()
+        server.wait()
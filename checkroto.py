@@ -1,7 +1,8 @@
 ﻿import pandas as pd
 from pathlib import Path
+import storage
 
 DATA_DIR = Path("data")
-odds = pd.read_csv(DATA_DIR / "yrfi_predictions_pregame.csv")
+odds = storage.read_table("yrfi_predictions_pregame")
 print("📋 Predictions Pregame columns:")
 print(odds.columns.tolist())
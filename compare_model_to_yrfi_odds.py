@@ -1,14 +1,18 @@
 ﻿# compare_model_to_predictions_file.py
 import pandas as pd
 from pathlib import Path
+import explain_predictions
+import storage
+import teams
 
 DATA_DIR = Path("data")
 
 # Load your predictions + odds file
-df = pd.read_csv(DATA_DIR / "yrfi_predictions_pregame.csv")
+df = storage.read_table("yrfi_predictions_pregame")
 df["date"] = pd.to_datetime(df["Game Date"], errors="coerce")
-df["away_team"] = df["Away Team"].str.strip().str.title()
-df["home_team"] = df["Home Team"].str.strip().str.title()
+df["away_team"] = teams.canonical(df["Away Team"])
+df["home_team"] = teams.canonical(df["Home Team"])
+df["game_key"] = teams.game_keys(df)
 
 # ✅ Ensure 'yrfi_odds' column exists
 if "yrfi_odds" not in df.columns:
@@ -30,9 +34,12 @@ df["implied_prob"] = df["yrfi_odds"].apply(odds_to_implied_prob)
 # Calculate model edge
 df["predicted_edge"] = (df["YRFI_Prob"] - df["implied_prob"]).round(3)
 
+# Biggest feature contributions behind each probability (see explain_predictions.py)
+df = explain_predictions.attach_drivers(df)
+
 # Save output
-out_path = DATA_DIR / "yrfi_model_edge_vs_market.csv"
-df.to_csv(out_path, index=False)
+storage.write_table(df, "yrfi_model_edge_vs_market")
+out_path = storage.table_path("yrfi_model_edge_vs_market")
 
 print(f"✅ Comparison complete — saved to: {out_path.resolve()}")
 print(df[[
@@ -1,15 +1,19 @@
 ﻿import pandas as pd
 from pathlib import Path
+import explain_predictions
+import storage
+import teams
 
 DATA_DIR = Path("data")
 
 # Load your fireball-enhanced file
-df = pd.read_csv(DATA_DIR / "yrfi_predictions_pregame_with_odds.csv")
+df = storage.read_table("yrfi_predictions_pregame_with_odds")
 df["date"] = pd.to_datetime(df["Game Date"], errors="coerce")
 
 # Clean team names
-df["away_team"] = df["Away Team"].str.strip().str.title()
-df["home_team"] = df["Home Team"].str.strip().str.title()
+df["away_team"] = teams.canonical(df["Away Team"])
+df["home_team"] = teams.canonical(df["Home Team"])
+df["game_key"] = teams.game_keys(df)
 
 # Convert odds to implied probability
 def odds_to_implied_prob(o):
@@ -27,9 +31,12 @@ df["implied_prob"] = df["yrfi_odds"].apply(odds_to_implied_prob)
 # Calculate model edge
 df["predicted_edge"] = (df["YRFI_Prob"] - df["implied_prob"]).round(3)
 
+# Biggest feature contributions behind each probability (see explain_predictions.py)
+df = explain_predictions.attach_drivers(df)
+
 # Save output
-output_path = DATA_DIR / "model_vs_inferred_yrfi_market.csv"
-df.to_csv(output_path, index=False)
+storage.write_table(df, "model_vs_inferred_yrfi_market")
+output_path = storage.table_path("model_vs_inferred_yrfi_market")
 
 print(f"✅ Model vs inferred market saved to: {output_path.resolve()}")
 print(df[[
@@ -0,0 +1,130 @@
+﻿# era_history.py
+# As-of starter ERA from every Rotowire snapshot.
+#
+# Each Rotowire download shows every listed pitcher's ERA as of the moment it was
+# downloaded (the same value under every date column). Each download is therefore one
+# snapshot per (pitcher, team), stamped with its download time, and all of them are kept
+# in the game store's era_history table.
+#
+# EraIndex holds the snapshots as one sorted int64 key array, (pitcher code << 40) |
+# minutes since the epoch. An as-of lookup is then a single np.searchsorted over the whole
+# batch: for each start it finds the latest snapshot strictly before first pitch. New
+# snapshots are merged into the sorted array as they arrive, with no re-sort.
+import numpy as np
+import pandas as pd
+
+import game_store
+
+# Boxscores carry no start time; treat a game as starting at noon of its date
+GAME_START = pd.Timedelta(hours=12)
+TIME_BITS = 40
+
+
+class EraIndex:
+    def __init__(self):
+        self.codes = {}
+        self.keys = np.empty(0, dtype=np.int64)
+        self.eras = np.empty(0, dtype=float)
+        self.observed = np.empty(0, dtype="datetime64[m]")
+
+    def _codes(self, teams, pitchers):
+        names = pd.Series(teams, dtype=object).astype(str) + "|" + pd.Series(pitchers, dtype=object).astype(str)
+        for name in names.unique():
+            self.codes.setdefault(name, len(self.codes))
+        return names.map(self.codes).to_numpy(dtype=np.int64)
+
+    def _keys(self, codes, times):
+        minutes = pd.DatetimeIndex(times).to_numpy(dtype="datetime64[m]").astype(np.int64)
+        return (codes << TIME_BITS) | minutes
+
+    def add(self, snapshots):
+        """Merges snapshots (pitcher, team, observed_at, era) into the sorted index."""
+        snapshots = snapshots.dropna(subset=["pitcher", "observed_at"])
+        if snapshots.empty:
+            return
+        keys = self._keys(self._codes(snapshots["team"], snapshots["pitcher"]), snapshots["observed_at"])
+        order = np.argsort(keys, kind="stable")
+        keys, eras = keys[order], snapshots["era"].to_numpy(dtype=float)[order]
+        observed = pd.DatetimeIndex(snapshots["observed_at"]).to_numpy(dtype="datetime64[m]")[order]
+
+        # Same pitcher and minute again: the newer value wins
+        pos = np.searchsorted(self.keys, keys)
+        hit = pos < len(self.keys)
+        hit[hit] = self.keys[pos[hit]] == keys[hit]
+        self.eras[pos[hit]] = eras[hit]
+        new = ~hit
+        self.keys = np.insert(self.keys, pos[new], keys[new])
+        self.eras = np.insert(self.eras, pos[new], eras[new])
+        self.observed = np.insert(self.observed, pos[new], observed[new])
+
+    def lookup(self, teams, pitchers, starts, backfill=False):
+        """Latest ERA strictly before each start -> (era, observed_at) arrays.
+
+        backfill=True falls back to the pitcher's earliest snapshot when none precedes the
+        start (for history older than the first saved download).
+        """
+        codes = self._codes(teams, pitchers)
+        era = np.full(len(codes), np.nan)
+        observed = np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[m]")
+        if not len(self.keys):
+            return era, observed
+
+        # Last key below (pitcher, start): same pitcher means an earlier snapshot of theirs
+        idx = np.searchsorted(self.keys, self._keys(codes, starts), side="left") - 1
+        ok = (idx >= 0) & ((self.keys[np.clip(idx, 0, None)] >> TIME_BITS) == codes)
+        if backfill:
+            nxt = idx + 1
+            later = ~ok & (nxt < len(self.keys))
+            later[later] = (self.keys[nxt[later]] >> TIME_BITS) == codes[later]
+            idx = np.where(later, nxt, idx)
+            ok = ok | later
+        era[ok] = self.eras[idx[ok]]
+        observed[ok] = self.observed[idx[ok]]
+        return era, observed
+
+    @classmethod
+    def load(cls, conn):
+        index = cls()
+        index.add(game_store.query(
+            "SELECT pitcher, team, observed_at, era FROM era_history ORDER BY pitcher, team, observed_at",
+            conn=conn, dates=("observed_at",),
+        ))
+        return index
+
+
+def snapshots_from_starters(starters, observed_at):
+    """One (pitcher, team) ERA snapshot per Rotowire download, stamped `observed_at`."""
+    snaps = starters.dropna(subset=["pitcher", "era"]).sort_values("date")
+    snaps = snaps.drop_duplicates(subset=["pitcher", "team"], keep="last")
+    return snaps.assign(observed_at=pd.Timestamp(observed_at))[["pitcher", "team", "observed_at", "era", "record"]]
+
+
+def as_of_join(games, index, backfill=False):
+    """Adds era / era_observed_at to rows with date, team, pitcher."""
+    era, observed = index.lookup(games["team"], games["pitcher"], pd.to_datetime(games["date"]) + GAME_START, backfill)
+    return games.assign(era=era, era_observed_at=pd.to_datetime(observed))
+
+
+def ingest(starters, observed_at, conn=None, backfill=False):
+    """Stores one download's snapshots and refreshes the starter ERAs they can change.
+
+    Only starts after the download (or not resolved yet) are looked up again.
+    """
+    conn = conn or game_store.connect()
+    snaps = snapshots_from_starters(starters, observed_at)
+    stored = snaps.assign(observed_at=snaps["observed_at"].dt.strftime("%Y-%m-%d %H:%M"))
+    game_store.upsert(conn, "era_history", stored)
+
+    index = EraIndex.load(conn)
+    cutoff = pd.Timestamp(observed_at) - GAME_START
+    starts = game_store.query(
+        "SELECT s.date, s.team, s.game_number, s.pitcher FROM starters s "
+        "LEFT JOIN starter_era e ON e.date = s.date AND e.team = s.team AND e.game_number = s.game_number "
+        "WHERE s.pitcher IS NOT NULL AND (s.date >= ? OR e.date IS NULL OR e.era IS NULL "
+        "OR e.pitcher IS NOT s.pitcher)",
+        (cutoff.strftime("%Y-%m-%d"),), conn=conn,
+    )
+    resolved = as_of_join(starts, index, backfill)
+    resolved = resolved.assign(observed_at=resolved.pop("era_observed_at").dt.strftime("%Y-%m-%d %H:%M"))
+    game_store.upsert(conn, "starter_era", resolved, replace=True)
+    return len(snaps), len(resolved)
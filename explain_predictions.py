@@ -0,0 +1,99 @@
+﻿# explain_predictions.py
+# Per-feature contributions behind every prediction, computed after predict_today.py.
+#
+# One batched XGBoost pred_contribs call over the bundle's matrix gives each column's
+# contribution to the game's log-odds; one-hot columns are summed back into their
+# categorical feature. The result is stored columnar in yrfi_prediction_contributions
+# (partitioned by date): one row per game with its game_key, row hash, model version,
+# probability, bias and a contrib_<feature> column per model feature. Only games whose
+# (game_key, row hash, model version) isn't stored yet are computed, and only the months
+# holding them are rewritten, so the dashboard and the edge reports just read the table.
+import numpy as np
+import pandas as pd
+
+import features
+import inference
+import storage
+
+TABLE = "yrfi_prediction_contributions"
+PREFIX = "contrib_"
+MODEL_FEATURES = features.CATEGORICAL_COLS + features.NUMERIC_COLS
+
+
+def contributions(bundle, rows):
+    """Frame of per-feature contributions (log-odds) for `rows`, plus bias and probability."""
+    X = bundle.matrix(rows)
+    raw = bundle.contributions(X)  # (rows, columns + 1): bias last
+    owners = bundle.column_features()
+    to_feature = np.zeros((len(owners), len(MODEL_FEATURES)))
+    to_feature[np.arange(len(owners)), [MODEL_FEATURES.index(f) for f in owners]] = 1.0
+    per_feature = raw[:, :-1] @ to_feature
+    out = pd.DataFrame(per_feature.astype(np.float32), columns=[PREFIX + f for f in MODEL_FEATURES])
+    out.insert(0, "bias", raw[:, -1].astype(np.float32))
+    out.insert(0, "yrfi_prob", 1.0 / (1.0 + np.exp(-raw.sum(axis=1))))
+    return out
+
+
+def top_drivers(df, n=3):
+    """"feature +0.21, feature -0.08, ..." for each row: its `n` largest contributions."""
+    cols = [c for c in df.columns if c.startswith(PREFIX)]
+    values = df[cols].to_numpy(dtype=float)
+    order = np.argsort(-np.abs(values), axis=1)[:, :n]
+    names = np.array([c[len(PREFIX):] for c in cols])
+    return pd.Series([
+        ", ".join(f"{names[j]} {values[i, j]:+.2f}" for j in row) for i, row in enumerate(order)
+    ], index=df.index)
+
+
+def attach_drivers(df, n=3):
+    """`df` (with a game_key column) plus a top_drivers column from the stored contributions."""
+    if not storage.exists(TABLE) or "game_key" not in df.columns:
+        return df
+    stored = storage.read_table(TABLE)
+    stored = stored.sort_values("model_version").drop_duplicates("game_key", keep="last")
+    stored = stored.assign(top_drivers=top_drivers(stored, n))[["game_key", "top_drivers"]]
+    return df.merge(stored, on="game_key", how="left")
+
+
+if __name__ == "__main__":
+    bundle_path = inference.latest()
+    if bundle_path is None:
+        raise SystemExit("❌ No inference bundle; run save_yrfi_model.py first")
+    bundle = inference.load(bundle_path)
+    model_version = f"bundle:{bundle.version}"
+
+    rows, _ = features.cached_rows()
+    rows = rows[rows["game_key"].notna()].reset_index(drop=True)
+    rows["row_hash"] = features.row_hashes(rows)
+
+    # Games already explained for this model and these exact inputs are skipped
+    if storage.exists(TABLE):
+        stored = storage.read_table(TABLE, columns=["game_key", "row_hash", "model_version"])
+        done = stored[stored["model_version"] == model_version]
+        known = rows[["game_key", "row_hash"]].merge(done, on=["game_key", "row_hash"], how="left", indicator=True)
+        todo = np.flatnonzero((known["_merge"] == "left_only").to_numpy())
+    else:
+        todo = np.arange(len(rows))
+
+    if len(todo) == 0:
+        print(f"✅ Contributions already stored for all {len(rows)} games")
+        raise SystemExit(0)
+
+    new = rows.iloc[todo].reset_index(drop=True)
+    explained = pd.concat([
+        new[["date", "game_key", "away_team", "home_team", "row_hash"]].assign(model_version=model_version),
+        contributions(bundle, new),
+    ], axis=1)
+
+    if len(todo) == len(rows) or not storage.is_partitioned(TABLE):
+        storage.write_table(explained, TABLE)
+    else:
+        # Rewrite only the months holding a new or changed game
+        months = explained["date"].dt.to_period("M").unique()
+        existing = storage.read_table(TABLE, start=months.min().start_time, end=months.max().end_time)
+        existing = existing[~existing["game_key"].isin(explained["game_key"])]
+        existing = existing[existing["date"].dt.to_period("M").isin(months)]
+        storage.write_partitions(pd.concat([existing, explained], ignore_index=True), TABLE)
+        # The whole-table CSV export is refreshed at publish (storage.export_stale_csv)
+    print(f"🧮 Stored contributions for {len(explained)} games ({len(rows) - len(explained)} already stored) "
+          f"in {storage.table_path(TABLE)}")
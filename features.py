@@ -0,0 +1,266 @@
+﻿# features.py
+# Model feature columns, shared by training, saving and every predictor so the matrix
+# layout can't drift between them.
+#
+# cached() builds the encoded matrix once per version of the source table and of the code
+# that prepares it (this module and teams.py): the prepared rows (sorted by date, with
+# their game_key) and a float matrix saved as .npy under data/features/<version>/, one
+# matrix per encoder version. Scripts memory-map it
+# (no parse, no re-encode, no copy) and slice rows by date or pick them by game_key.
+#
+# Three matrix layouts (LAYOUTS) are supported, and the trained model records its own:
+#   dense        one-hot categoricals + numerics as one float array (the original layout)
+#   sparse       the same columns as a CSR matrix: only the hot cells and the numerics are
+#                stored, so it stays small as high-cardinality categoricals are added
+#   categorical  a DataFrame with pandas categoricals, split natively by XGBoost
+#                (enable_categorical); no one-hot columns at all
+import hashlib
+import json
+import os
+import pickle
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import stage_cache
+import storage
+import teams
+
+SOURCE_TABLE = "yrfi_model_input_with_era_and_team_rates"
+FEATURE_DIR = Path("data") / "features"
+KEEP_VERSIONS = 3  # source-table versions kept on disk
+# Changes to how rows are prepared (columns, derived features, game keys) make a new version
+FEATURE_CODE = [Path(__file__), Path(teams.__file__)]
+LAYOUTS = ("dense", "sparse", "categorical")
+
+CATEGORICAL_COLS = ["away_team", "home_team", "away_hand", "home_hand"]
+BASE_NUMERIC_COLS = [
+    "home_era", "away_era", "home_team_avg_1st", "away_team_avg_1st",
+    "day_of_week", "same_hand"
+]
+# As-of starter first-inning history (starter_features.py); empty before a pitcher's
+# first start, which XGBoost treats as missing
+STARTER_COLS = [
+    "home_starter_r1_rate", "home_starter_scoreless_pct", "home_starter_starts",
+    "away_starter_r1_rate", "away_starter_scoreless_pct", "away_starter_starts"
+]
+NUMERIC_COLS = BASE_NUMERIC_COLS + STARTER_COLS
+REQUIRED_COLS = CATEGORICAL_COLS + BASE_NUMERIC_COLS
+
+
+def add_derived(df):
+    df["day_of_week"] = df["date"].dt.dayofweek
+    df["same_hand"] = (df["away_hand"] == df["home_hand"]).astype(int)
+    for col in STARTER_COLS:
+        if col not in df.columns:
+            df[col] = np.nan
+    return df
+
+
+def prepare(df):
+    """Derived columns added, rows missing a required feature dropped."""
+    return add_derived(df).dropna(subset=REQUIRED_COLS)
+
+
+def labeled(rows):
+    """Boolean mask of rows from finished games, the only ones with a real yrfi label.
+
+    A game not played yet is stored with a 0 first inning, so it also needs both scores,
+    which get_scores.py only stores once the game is final.
+    """
+    return rows["yrfi"].notna() & rows["Away Score"].notna() & rows["Home Score"].notna()
+
+
+def row_hashes(df):
+    """int64 hash of each row's date and model inputs; changes when any feature does
+    (e.g. a starter swap or an ERA update)."""
+    # Normalized first, so a column's storage dtype (categorical, nullable int) can't change the hash
+    frame = df[CATEGORICAL_COLS].astype(str).reset_index(drop=True)
+    frame["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d").to_numpy()
+    frame[NUMERIC_COLS] = numeric(df)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+
+def numeric(df):
+    return df[NUMERIC_COLS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+
+def one_hot_csr(df, categories, cols=CATEGORICAL_COLS):
+    """The dense layout's columns as CSR: a 1 per known category, then every numeric value.
+
+    Numeric zeros are stored explicitly, since XGBoost reads absent CSR cells as missing;
+    unknown categories get no cell (as handle_unknown="ignore" does).
+    """
+    offsets = np.cumsum([0] + [len(c) for c in categories])
+    codes = np.column_stack([
+        pd.Categorical(df[col].astype(object), categories=cats).codes for col, cats in zip(cols, categories)
+    ]).astype(np.int64)
+    cat_idx = np.where(codes >= 0, codes + offsets[:-1], -1)
+    X_num = numeric(df)
+    num_idx = np.broadcast_to(offsets[-1] + np.arange(X_num.shape[1]), X_num.shape)
+    idx = np.hstack([cat_idx, num_idx])
+    values = np.hstack([np.ones(cat_idx.shape), X_num])
+    keep = idx >= 0
+    from scipy import sparse  # imported here: predictors on the inference bundle don't need it
+    indptr = np.concatenate([[0], np.cumsum(keep.sum(axis=1))])
+    return sparse.csr_matrix(
+        (values[keep], idx[keep].astype(np.int32), indptr),
+        shape=(len(df), offsets[-1] + X_num.shape[1]),
+    )
+
+
+def categorical_frame(df, categories, cols=CATEGORICAL_COLS):
+    """Categoricals as pandas categories (fixed to the encoder's, so codes match across runs)
+    followed by the numeric columns; unknown categories become missing."""
+    cats = {col: pd.Categorical(df[col].astype(object), categories=c) for col, c in zip(cols, categories)}
+    nums = {col: values for col, values in zip(NUMERIC_COLS, numeric(df).T)}
+    return pd.DataFrame({**cats, **nums})
+
+
+def matrix(df, encoder, fit=False, layout="dense"):
+    """Model matrix in `layout`; the default is one-hot categoricals followed by the
+    numeric columns, as a float array."""
+    if fit:
+        encoder.fit(df[CATEGORICAL_COLS])
+    if layout == "sparse":
+        return one_hot_csr(df, encoder.categories_)
+    if layout == "categorical":
+        return categorical_frame(df, encoder.categories_)
+    if layout != "dense":
+        raise ValueError(f"Unknown feature layout '{layout}' (expected one of {LAYOUTS})")
+    X_cat = encoder.transform(df[CATEGORICAL_COLS])
+    X_cat = X_cat.toarray() if hasattr(X_cat, "toarray") else X_cat
+    return np.hstack([X_cat, numeric(df)])
+
+
+def xgb_options(layout):
+    """Extra XGBClassifier arguments a layout needs."""
+    return {"enable_categorical": True, "tree_method": "hist"} if layout == "categorical" else {}
+
+
+def tag_layout(model, layout):
+    """Records the feature layout inside the booster, so it travels with the saved model."""
+    model.get_booster().set_attr(feature_layout=layout)
+
+
+def model_layout(model):
+    return model.get_booster().attr("feature_layout") or "dense"
+
+
+def _take(X, pos):
+    return X.iloc[pos].reset_index(drop=True) if isinstance(X, pd.DataFrame) else X[pos]
+
+
+# === Cached, memory-mapped feature matrix ===
+class FeatureMatrix:
+    """Prepared rows and their encoded matrix, row i of `rows` being row i of `X`.
+
+    Rows are sorted by date, so a date range is a contiguous slice (a view of the map).
+    """
+
+    def __init__(self, rows, X, encoder):
+        self.rows = rows
+        self.X = X
+        self.encoder = encoder
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def y(self):
+        return self.rows["yrfi"]
+
+    def between(self, start=None, end=None):
+        dates = self.rows["date"].to_numpy()
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), "left")
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), "right")
+        return FeatureMatrix(self.rows.iloc[lo:hi].reset_index(drop=True), _take(self.X, slice(lo, hi)), self.encoder)
+
+    def select(self, game_keys):
+        """Rows whose game_key is in `game_keys` (in date order)."""
+        pos = np.flatnonzero(self.rows["game_key"].isin(game_keys).to_numpy(dtype=bool, na_value=False))
+        return FeatureMatrix(self.rows.iloc[pos].reset_index(drop=True), _take(self.X, pos), self.encoder)
+
+
+def encoder_version(encoder):
+    """Digest of what a fitted encoder does: its class, parameters and categories."""
+    spec = {
+        "class": type(encoder).__name__,
+        "params": encoder.get_params(),
+        "categories": [list(map(str, c)) for c in encoder.categories_],
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _atomic(path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _prune(keep):
+    versions = sorted((p for p in FEATURE_DIR.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime)
+    for old in versions[:-KEEP_VERSIONS]:
+        if old != keep:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def cached_rows(table=SOURCE_TABLE):
+    """(rows, version_dir): the prepared rows of `table`, sorted by date, with game_key."""
+    parts = [stage_cache.table_digest(table), *(stage_cache.file_digest(p) for p in FEATURE_CODE)]
+    digest = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+    stage_cache.save_digests()
+    version_dir = FEATURE_DIR / digest
+    version_dir.mkdir(parents=True, exist_ok=True)
+    os.utime(version_dir)
+
+    rows_path = version_dir / "rows.pkl"
+    if rows_path.exists():
+        rows = pd.read_pickle(rows_path)
+    else:
+        rows = prepare(storage.read_table(table))
+        if "game_key" not in rows.columns:  # tables from before the game store kept game_key
+            rows["game_key"] = teams.game_keys(rows, "date", "home_team", "away_team")
+        rows = rows.sort_values(["date", "game_key"], kind="stable").reset_index(drop=True)
+        _atomic(rows_path, lambda f: rows.to_pickle(f))
+        _prune(version_dir)
+    return rows, version_dir
+
+
+def cached(encoder, fit=False, table=SOURCE_TABLE, layout="dense"):
+    """FeatureMatrix of every prepared row of `table`, built once per table and encoder version.
+
+    fit=True fits `encoder` on the rows first; the fitted encoder is cached too and is
+    the one on the result (`.encoder`). Sparse matrices are cached as memory-mapped CSR
+    arrays; the categorical layout is a frame over the cached rows.
+    """
+    rows, version_dir = cached_rows(table)
+    if fit:
+        params = json.dumps(encoder.get_params(), sort_keys=True, default=str)
+        fit_path = version_dir / f"encoder-{hashlib.sha256(params.encode('utf-8')).hexdigest()[:16]}.pkl"
+        if fit_path.exists():
+            with open(fit_path, "rb") as f:
+                encoder = pickle.load(f)
+        else:
+            encoder.fit(rows[CATEGORICAL_COLS])
+            _atomic(fit_path, lambda f: pickle.dump(encoder, f))
+
+    if layout == "categorical":
+        return FeatureMatrix(rows, matrix(rows, encoder, layout=layout), encoder)
+    if layout == "sparse":
+        parts = {name: version_dir / f"X-{encoder_version(encoder)}-csr-{name}.npy" for name in ["data", "indices", "indptr"]}
+        if not all(path.exists() for path in parts.values()):
+            X = matrix(rows, encoder, layout=layout)
+            for name, path in parts.items():
+                _atomic(path, lambda f: np.save(f, getattr(X, name)))
+        data, indices, indptr = (np.load(parts[name], mmap_mode="r") for name in ["data", "indices", "indptr"])
+        n_cols = sum(len(c) for c in encoder.categories_) + len(NUMERIC_COLS)
+        from scipy import sparse
+        return FeatureMatrix(rows, sparse.csr_matrix((data, indices, indptr), shape=(len(rows), n_cols)), encoder)
+    matrix_path = version_dir / f"X-{encoder_version(encoder)}.npy"
+    if not matrix_path.exists():
+        _atomic(matrix_path, lambda f: np.save(f, np.ascontiguousarray(matrix(rows, encoder))))
+    return FeatureMatrix(rows, np.load(matrix_path, mmap_mode="r"), encoder)
@@ -0,0 +1,355 @@
+﻿# game_store.py
+# Embedded SQLite store for games, starters, ERA snapshots, odds and predictions.
+#
+# Per-game tables (games, odds, predictions, team_rate_features) are keyed on the packed
+# game_key (teams.py), so both games of a doubleheader are kept, and the model_input view
+# joins them on it; starter tables are keyed on (date, team, game_number), the number
+# game_key packs, so each game of a doubleheader has its own starter; history on pitcher. Writers
+# upsert instead of rewriting whole files, and the model_input view assembles the model's
+# feature rows in one query. Rows whose teams aren't in the registry have no game_key and
+# are not stored. Point-in-time team first-inning rates are materialized
+# per game in team_rate_features by team_rates.py; small engine state lives in `state`.
+# prediction_cache remembers each game's last probability with the feature-row hash and
+# model version it came from, so predict_today.py only re-scores games whose inputs changed.
+#
+# The scrapers upsert as they compact; `python game_store.py` backfills games and odds
+# from the stored tables (e.g. the first time the store is created).
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+import teams
+
+DB_PATH = Path("data") / "yrfi.sqlite"
+
+# One connection per thread and store (sqlite3 connections stay on their thread)
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_applied = set()
+
+# A game's number within its (date, home, away) doubleheader, unpacked from game_key (teams.py)
+GAME_NUMBER = f"(g.game_key & {teams.GAME_MASK})"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS games (
+    game_key INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    home_team TEXT NOT NULL,
+    away_team TEXT NOT NULL,
+    away_record TEXT,
+    home_record TEXT,
+    away_score INTEGER,
+    home_score INTEGER,
+    away_1st INTEGER,
+    home_1st INTEGER
+);
+CREATE INDEX IF NOT EXISTS games_date ON games (date, home_team, away_team);
+CREATE TABLE IF NOT EXISTS starters (
+    date TEXT NOT NULL,
+    team TEXT NOT NULL,
+    game_number INTEGER NOT NULL DEFAULT 1,
+    starter TEXT,
+    pitcher TEXT,
+    hand TEXT,
+    PRIMARY KEY (date, team, game_number)
+);
+CREATE INDEX IF NOT EXISTS starters_pitcher ON starters (pitcher, date);
+CREATE TABLE IF NOT EXISTS era_history (
+    pitcher TEXT NOT NULL,
+    team TEXT NOT NULL,
+    observed_at TEXT NOT NULL,
+    era REAL,
+    record TEXT,
+    PRIMARY KEY (pitcher, team, observed_at)
+);
+CREATE TABLE IF NOT EXISTS starter_era (
+    date TEXT NOT NULL,
+    team TEXT NOT NULL,
+    game_number INTEGER NOT NULL DEFAULT 1,
+    pitcher TEXT,
+    era REAL,
+    observed_at TEXT,
+    PRIMARY KEY (date, team, game_number)
+);
+CREATE TABLE IF NOT EXISTS odds (
+    game_key INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    home_team TEXT NOT NULL,
+    away_team TEXT NOT NULL,
+    bookmaker TEXT,
+    ml_home REAL, ml_away REAL,
+    spread_home REAL, spread_home_odds REAL,
+    spread_away REAL, spread_away_odds REAL,
+    total REAL, over_odds REAL, under_odds REAL
+);
+CREATE INDEX IF NOT EXISTS odds_date ON odds (date);
+CREATE TABLE IF NOT EXISTS predictions (
+    game_key INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    home_team TEXT NOT NULL,
+    away_team TEXT NOT NULL,
+    yrfi_prob REAL,
+    nrfi_prob REAL
+);
+CREATE INDEX IF NOT EXISTS predictions_date ON predictions (date);
+CREATE TABLE IF NOT EXISTS prediction_cache (
+    game_key INTEGER PRIMARY KEY,
+    row_hash INTEGER NOT NULL,
+    model_version TEXT NOT NULL,
+    yrfi_prob REAL
+);
+CREATE TABLE IF NOT EXISTS team_rate_features (
+    game_key INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    home_team TEXT NOT NULL,
+    away_team TEXT NOT NULL,
+    home_team_avg_1st REAL, home_games INTEGER,
+    home_team_ewm_1st REAL, home_team_recent_1st REAL,
+    away_team_avg_1st REAL, away_games INTEGER,
+    away_team_ewm_1st REAL, away_team_recent_1st REAL
+);
+CREATE TABLE IF NOT EXISTS starter_features (
+    date TEXT NOT NULL,
+    team TEXT NOT NULL,
+    game_number INTEGER NOT NULL DEFAULT 1,
+    pitcher TEXT,
+    r1_rate REAL,
+    scoreless_pct REAL,
+    starts INTEGER,
+    PRIMARY KEY (date, team, game_number)
+);
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+DROP VIEW IF EXISTS model_input;
+CREATE VIEW model_input AS
+SELECT
+    g.game_key, g.date, g.away_team, g.home_team,
+    a.starter AS away_starter, a.hand AS away_hand,
+    h.starter AS home_starter, h.hand AS home_hand,
+    g.away_score AS "Away Score", g.home_score AS "Home Score",
+    g.away_1st AS "Away 1st", g.home_1st AS "Home 1st",
+    -- get_scores.py stores scores only for final games, so there is no label before then
+    CASE WHEN g.away_score IS NULL OR g.home_score IS NULL
+           OR g.away_1st IS NULL OR g.home_1st IS NULL THEN NULL
+         ELSE (g.away_1st > 0 OR g.home_1st > 0) END AS yrfi,
+    h.pitcher AS home_starter_clean, he.era AS home_era,
+    a.pitcher AS away_starter_clean, ae.era AS away_era,
+    tr.home_team_avg_1st, tr.home_games, tr.home_team_ewm_1st, tr.home_team_recent_1st,
+    tr.away_team_avg_1st, tr.away_games, tr.away_team_ewm_1st, tr.away_team_recent_1st,
+    hf.r1_rate AS home_starter_r1_rate, hf.scoreless_pct AS home_starter_scoreless_pct,
+    hf.starts AS home_starter_starts,
+    af.r1_rate AS away_starter_r1_rate, af.scoreless_pct AS away_starter_scoreless_pct,
+    af.starts AS away_starter_starts
+FROM games g
+LEFT JOIN starters h ON h.date = g.date AND h.team = g.home_team AND h.game_number = {GAME_NUMBER}
+LEFT JOIN starters a ON a.date = g.date AND a.team = g.away_team AND a.game_number = {GAME_NUMBER}
+LEFT JOIN starter_era he ON he.date = g.date AND he.team = g.home_team AND he.game_number = h.game_number
+    AND he.pitcher = h.pitcher
+LEFT JOIN starter_era ae ON ae.date = g.date AND ae.team = g.away_team AND ae.game_number = a.game_number
+    AND ae.pitcher = a.pitcher
+LEFT JOIN team_rate_features tr ON tr.game_key = g.game_key
+LEFT JOIN starter_features hf ON hf.date = g.date AND hf.team = g.home_team AND hf.game_number = h.game_number
+    AND hf.pitcher = h.pitcher
+LEFT JOIN starter_features af ON af.date = g.date AND af.team = g.away_team AND af.game_number = a.game_number
+    AND af.pitcher = a.pitcher;
+"""
+
+# DataFrame column -> store column, per table
+GAME_COLUMNS = {
+    "Game Date": "date", "Home Team": "home_team", "Away Team": "away_team",
+    "Away Record": "away_record", "Home Record": "home_record",
+    "Away Score": "away_score", "Home Score": "home_score",
+    "Away 1st": "away_1st", "Home 1st": "home_1st",
+    "date": "date", "home_team": "home_team", "away_team": "away_team", "game_key": "game_key",
+}
+ODDS_COLUMNS = {
+    "Game Date": "date", "Home Team": "home_team", "Away Team": "away_team",
+    "Bookmaker Used": "bookmaker", "ML Home": "ml_home", "ML Away": "ml_away",
+    "Spread Home": "spread_home", "Spread Home Odds": "spread_home_odds",
+    "Spread Away": "spread_away", "Spread Away Odds": "spread_away_odds",
+    "Total": "total", "Over Odds": "over_odds", "Under Odds": "under_odds", "game_key": "game_key",
+}
+PREDICTION_COLUMNS = {
+    "Game Date": "date", "date": "date", "Home Team": "home_team", "home_team": "home_team",
+    "Away Team": "away_team", "away_team": "away_team",
+    "YRFI_Prob": "yrfi_prob", "NRFI_Prob": "nrfi_prob", "game_key": "game_key",
+}
+KEYS = {
+    "games": ["game_key"],
+    "odds": ["game_key"],
+    "predictions": ["game_key"],
+    "prediction_cache": ["game_key"],
+    "team_rate_features": ["game_key"],
+    "starters": ["date", "team", "game_number"],
+    "era_history": ["pitcher", "team", "observed_at"],
+    "starter_era": ["date", "team", "game_number"],
+    "starter_features": ["date", "team", "game_number"],
+}
+
+
+def connect(path=DB_PATH):
+    """This thread's connection to the store at `path`, opened once and then reused.
+
+    The schema is applied the first time a process opens each store.
+    """
+    path = Path(path).resolve()
+    conns = _local.__dict__.setdefault("conns", {})
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = sqlite3.connect(path)
+        with _schema_lock:
+            if path not in _schema_applied:
+                conn.executescript(SCHEMA)
+                _schema_applied.add(path)
+    return conn
+
+
+def _to_sql_value(v):
+    if v is None or (isinstance(v, float) and v != v) or v is pd.NA or v is pd.NaT:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.strftime("%Y-%m-%d")
+    if hasattr(v, "item"):
+        return v.item()  # numpy scalar -> python
+    return v
+
+
+def upsert(conn, table, df, columns=None, replace=False):
+    """INSERT ... ON CONFLICT DO UPDATE for every row of `df` (renamed via `columns`).
+
+    NULLs in `df` never overwrite stored values, so a pre-game row can't erase a final score;
+    replace=True overwrites every column instead (for derived tables).
+    """
+    if df is None or df.empty:
+        return 0
+    if columns is not None:
+        df = df[[c for c in df.columns if c in columns]].rename(columns=columns)
+        df = df.loc[:, ~df.columns.duplicated()]
+    if "date" in df.columns:
+        df = df.assign(date=pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d"))
+    keys = KEYS[table]
+    if keys == ["game_key"] and "game_key" not in df.columns:
+        # Repeated (date, home, away) rows are numbered in order: a doubleheader's two games
+        df = df.assign(game_key=teams.game_keys(df, "date", "home_team", "away_team"))
+    if "game_key" in keys:
+        df = df[df["game_key"].notna()]
+        if df.empty:
+            return 0
+    cols = list(df.columns)
+    fmt = "{c} = excluded.{c}" if replace else "{c} = COALESCE(excluded.{c}, {c})"
+    updates = ", ".join(fmt.format(c=c) for c in cols if c not in keys)
+    sql = (
+        f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+        f"ON CONFLICT ({', '.join(keys)}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")
+    )
+    rows = [tuple(_to_sql_value(v) for v in row) for row in df.astype(object).itertuples(index=False)]
+    with conn:
+        conn.executemany(sql, rows)
+    return len(rows)
+
+
+def upsert_games(df, conn=None):
+    return upsert(conn or connect(), "games", df, GAME_COLUMNS)
+
+
+def upsert_odds(df, conn=None):
+    return upsert(conn or connect(), "odds", df, ODDS_COLUMNS)
+
+
+def upsert_predictions(df, conn=None):
+    return upsert(conn or connect(), "predictions", df, PREDICTION_COLUMNS)
+
+
+def cached_predictions(model_version, conn=None):
+    """game_key, row_hash, yrfi_prob of every game last scored by `model_version`."""
+    return query("SELECT game_key, row_hash, yrfi_prob FROM prediction_cache WHERE model_version = ?",
+                 (model_version,), conn, dates=())
+
+
+def upsert_prediction_cache(df, conn=None):
+    """Stores (game_key, row_hash, model_version, yrfi_prob) rows; a game keeps only its latest."""
+    return upsert(conn or connect(), "prediction_cache", df, replace=True)
+
+
+def upsert_starters(df, conn=None):
+    return upsert(conn or connect(), "starters", df)
+
+
+
+def table_digest(table, conn=None):
+    """sha256 of every row of `table` in key order (what the stage cache keys SQLite reads on)."""
+    h = hashlib.sha256()
+    cursor = (conn or connect()).execute(f"SELECT * FROM {table} ORDER BY {', '.join(KEYS[table])}")
+    for row in cursor:
+        h.update(repr(row).encode("utf-8"))
+    return h.hexdigest()
+
+
+def get_state(name, conn=None):
+    row = (conn or connect()).execute("SELECT value FROM state WHERE name = ?", (name,)).fetchone()
+    return None if row is None else json.loads(row[0])
+
+
+def set_state(name, value, conn=None):
+    conn = conn or connect()
+    with conn:
+        conn.execute(
+            "INSERT INTO state (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+            (name, json.dumps(value)),
+        )
+
+
+def query(sql, params=(), conn=None, dates=("date",)):
+    conn = conn or connect()
+    df = pd.read_sql_query(sql, conn, params=params)
+    for col in dates:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+def model_input(start=None, end=None, conn=None, complete=False):
+    """Model feature rows for games between `start` and `end` (inclusive, either may be None).
+
+    complete=True keeps only games where both starters' handedness is known.
+    """
+    clauses, params = [], []
+    if complete:
+        clauses.append("away_hand IS NOT NULL AND home_hand IS NOT NULL")
+    if start is not None:
+        clauses.append("date >= ?")
+        params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+    if end is not None:
+        clauses.append("date <= ?")
+        params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return query(f"SELECT * FROM model_input {where} ORDER BY date, home_team, game_key", params, conn)
+
+
+def odds_with_scores(conn=None):
+    return query("""
+        SELECT o.*, g.away_record, g.away_score, g.home_record, g.home_score,
+               g.away_1st, g.home_1st
+        FROM odds o
+        LEFT JOIN games g ON g.game_key = o.game_key
+        ORDER BY o.date, o.home_team, o.game_key
+    """, conn=conn)
+
+
+if __name__ == "__main__":
+    import storage
+
+    conn = connect()
+    if storage.exists("mlb_boxscores_cleaned"):
+        print(f"🏟 Games upserted: {upsert_games(storage.read_table('mlb_boxscores_cleaned'), conn)}")
+    if storage.exists("mlb_odds_mybookie"):
+        print(f"💵 Odds upserted: {upsert_odds(storage.read_table('mlb_odds_mybookie'), conn)}")
+    for table in ["games", "starters", "era_history", "odds", "predictions"]:
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        print(f"📦 {table}: {count} rows")
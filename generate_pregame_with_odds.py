@@ -1,9 +1,10 @@
 ﻿import pandas as pd
 from pathlib import Path
+import storage
 
 # Load original file
 DATA_DIR = Path("data")
-df = pd.read_csv(DATA_DIR / "yrfi_predictions_pregame.csv")
+df = storage.read_table("yrfi_predictions_pregame")
 
 # 🔥 Map fireball count to estimated odds
 fireball_map = {
@@ -24,7 +25,7 @@ df["yrfi_odds"] = df["fire_count"].map(fireball_map)
 df.drop(columns=["fire_count"], inplace=True)
 
 # Save updated file
-output_path = DATA_DIR / "yrfi_predictions_pregame_with_odds.csv"
-df.to_csv(output_path, index=False)
+storage.write_table(df, "yrfi_predictions_pregame_with_odds")
+output_path = storage.table_path("yrfi_predictions_pregame_with_odds")
 
 print(f"✅ File saved with estimated odds to: {output_path.resolve()}")
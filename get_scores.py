@@ -1,23 +1,138 @@
 ﻿import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
+from bs4 import BeautifulSoup, SoupStrainer
+from collections import Counter
+from datetime import date, datetime, timedelta
 import pandas as pd
+import http_cache
+import game_store
+import storage
+from scrape_journal import DayJournal
+import argparse
+import asyncio
+import random
 import re
 import time
 import os
 
+# === Endpoints (override with env vars to point at a local stand-in server) ===
+SCOREBOARD_URL = os.environ.get(
+    "ESPN_SCOREBOARD_URL", "https://site.api.espn.com/apis/site/v2/sports/baseball/mlb/scoreboard"
+)
+BOXSCORE_URL = os.environ.get("ESPN_BOXSCORE_URL", "https://www.espn.com/mlb/boxscore/_/gameId/{game_id}")
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# === HTML fallback parser: lxml when installed, and only the gamestrip/linescore subtrees ===
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+BOXSCORE_STRAINER = SoupStrainer(
+    class_=re.compile(r"(^|\s)(ScoreCell__TeamName|Gamestrip__Record|Gamestrip__Score|Table--align-center)(\s|$)")
+)
+
+# Which path (json / html) produced each row in this run
+PARSE_PATHS = Counter()
+
+def scoreboard_url(date_obj):
+    return f"{SCOREBOARD_URL}?dates={date_obj.strftime('%Y%m%d')}"
+
+def parse_game_ids(payload, date_obj):
+    events = payload.get("events", [])
+    return [{"gameId": e["id"], "date": date_obj.strftime("%Y-%m-%d"), "event": e} for e in events]
+
+BOXSCORE_KEYS = ["Game Date", "Away Team", "Home Team"]
+
+def event_state(event):
+    status = event.get("status") or (event.get("competitions") or [{}])[0].get("status") or {}
+    return status.get("type", {}).get("state")
+
+def is_final_slate(response):
+    # Finished slates never change, so they are cached permanently
+    events = response.json().get("events", [])
+    return bool(events) and all(event_state(e) == "post" for e in events)
+
+def is_past(game_date):
+    return game_date < date.today().strftime("%Y-%m-%d")
+
 def get_game_ids(date_obj):
-    date_str = date_obj.strftime("%Y%m%d")
-    url = f"https://site.api.espn.com/apis/site/v2/sports/baseball/mlb/scoreboard?dates={date_str}"
-    r = requests.get(url)
-    events = r.json().get("events", [])
-    return [{"gameId": e["id"], "date": date_obj.strftime("%Y-%m-%d")} for e in events]
-
-def extract_boxscore(game_id, game_date):
-    url = f"https://www.espn.com/mlb/boxscore/_/gameId/{game_id}"
+    r = http_cache.get(scoreboard_url(date_obj), permanent=is_final_slate)
+    return parse_game_ids(r.json(), date_obj)
+
+def extract_boxscore(game_id, game_date, event=None):
+    if event is not None:
+        row = parse_boxscore_json(event, game_date)
+        if row:
+            log_row(row, "json")
+            return row
+
+    url = BOXSCORE_URL.format(game_id=game_id)
     print(f"🌐 Scraping HTML: {url}")
-    r = requests.get(url, headers={"User-Agent": "Mozilla/5.0"})
-    soup = BeautifulSoup(r.content, "html.parser")
+    r = http_cache.get(url, headers=HEADERS, permanent=is_past(game_date))
+    if not r.from_cache:
+        time.sleep(0.75)
+    row = final_scores_only(parse_boxscore_html(r.content, game_date), event)
+    if row:
+        log_row(row, "html")
+    return row
+
+def final_scores_only(row, event):
+    """Blanks the scores of a game that isn't final yet: a stored score marks a finished
+    game, which is what the model's label requires (features.labeled)."""
+    if row and event is not None and event_state(event) != "post":
+        row["Away Score"] = row["Home Score"] = ""
+    return row
+
+def log_row(row, path):
+    PARSE_PATHS[path] += 1
+    print(f"✅ Parsed ({path}): {row['Away Team']} {row['Away 1st']} | {row['Home Team']} {row['Home 1st']}")
+
+def parse_boxscore_json(event, game_date):
+    """Reads the boxscore fields from a scoreboard event; returns None if the HTML page is needed."""
+    try:
+        competition = event["competitions"][0]
+        sides = {c["homeAway"]: c for c in competition["competitors"]}
+        away, home = sides["away"], sides["home"]
+        state = competition.get("status", event.get("status", {}))["type"]["state"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+    def record(side):
+        records = side.get("records") or []
+        total = next((r for r in records if r.get("type") == "total" or r.get("name") == "overall"), None)
+        total = total or (records[0] if records else {})
+        return total.get("summary", "").split(",")[0]
+
+    def first_inning(side):
+        linescores = side.get("linescores") or []
+        if not linescores:
+            return 0
+        try:
+            return int(float(linescores[0].get("value", linescores[0].get("displayValue"))))
+        except (TypeError, ValueError):
+            return 0
+
+    # A started game must carry its linescore; otherwise let the HTML path have a go
+    if state != "pre" and not away.get("linescores"):
+        return None
+
+    def score(side):
+        return re.sub(r"\D", "", str(side.get("score", ""))) if state == "post" else ""
+
+    return {
+        "Game Date": game_date,
+        "Away Team": away["team"]["displayName"],
+        "Away Record": record(away),
+        "Away Score": score(away),
+        "Home Team": home["team"]["displayName"],
+        "Home Record": record(home),
+        "Home Score": score(home),
+        "Away 1st": first_inning(away),
+        "Home 1st": first_inning(home)
+    }
+
+def parse_boxscore_html(content, game_date):
+    soup = BeautifulSoup(content, HTML_PARSER, parse_only=BOXSCORE_STRAINER)
 
     team_names = soup.select("h2.ScoreCell__TeamName")
     if len(team_names) < 2:
@@ -82,8 +197,6 @@ def extract_boxscore(game_id, game_date):
     except Exception as e:
         print(f"⚠️ Error parsing inning data: {e}")
 
-    print(f"✅ Parsed: {away_team} {away_1st} | {home_team} {home_1st}")
-
     return {
         "Game Date": game_date,
         "Away Team": away_team,
@@ -96,58 +209,189 @@ def extract_boxscore(game_id, game_date):
         "Home 1st": home_1st
     }
 
-def scrape_range(start_date, end_date, output_file="data/mlb_boxscores_cleaned.csv"):
-    if os.path.exists(output_file):
-        existing_df = pd.read_csv(output_file)
-        print(f"📄 Found existing file with {len(existing_df)} rows.")
+def finalize_boxscores(combined):
+    combined = combined.sort_values(by=["Game Date", "Home Team"])
+
+    if 'Away 1st' in combined.columns and 'Home 1st' in combined.columns:
+        combined['YRFI'] = ((combined['Away 1st'] + combined['Home 1st']) > 0).astype(int)
+        print("✅ YRFI column created.")
     else:
-        existing_df = pd.DataFrame()
-        print("🆕 No previous file found. Starting fresh.")
+        print("⚠️ Could not create YRFI column — missing 1st inning data.")
+    return combined
+
+def open_journal(table):
+    return DayJournal(table)
 
+def days_to_scrape(journal, start_date, end_date):
     current = datetime.strptime(start_date, "%Y-%m-%d")
     end = datetime.strptime(end_date, "%Y-%m-%d")
-    new_rows = []
-
+    days = []
     while current <= end:
-        games = get_game_ids(current)
-        for game in games:
-            try:
-                row = extract_boxscore(game["gameId"], game["date"])
-                if row:
-                    new_rows.append(row)
-            except Exception as e:
-                print(f"❌ Error parsing {game['gameId']}: {e}")
-            time.sleep(0.75)
+        day = current.strftime("%Y-%m-%d")
+        if journal.is_final(day):
+            print(f"⏭ Skipping {day} (already committed)")
+        else:
+            days.append(current)
         current += timedelta(days=1)
+    return days
+
+def commit_day(journal, date_obj, games, rows):
+    # A day is final once it is over, every game is finished and every game parsed
+    day = date_obj.strftime("%Y-%m-%d")
+    final = is_past(day) and len(rows) == len(games) and all(
+        event_state(game["event"]) == "post" for game in games
+    )
+    journal.commit(day, rows, final=final)
+
+def save_boxscores(journal, table):
+    combined = journal.compact(table, BOXSCORE_KEYS, finalize=finalize_boxscores,
+                               on_new=game_store.upsert_games)
+    if combined is None:
+        print("ℹ️ No new games found to append.")
+    else:
+        print(f"\n✅ Updated and saved to {storage.table_path(table)} ({len(combined)} rows in the updated months)")
+
+def scrape_range(start_date, end_date, table="mlb_boxscores_cleaned"):
+    journal = open_journal(table)
+
+    try:
+        for current in days_to_scrape(journal, start_date, end_date):
+            games = get_game_ids(current)
+            rows = []
+            for game in games:
+                try:
+                    row = extract_boxscore(game["gameId"], game["date"], game["event"])
+                    if row:
+                        rows.append(row)
+                except Exception as e:
+                    print(f"❌ Error parsing {game['gameId']}: {e}")
+            commit_day(journal, current, games, rows)
+    finally:
+        # Days that finished before a failure are already journaled; fold them in either way
+        print_parse_paths()
+        save_boxscores(journal, table)
+
+def print_parse_paths():
+    print(f"📊 Rows by parse path: json={PARSE_PATHS['json']}, html={PARSE_PATHS['html']}")
+
+# === Async scraping ===
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts of up to `capacity`."""
 
-    if new_rows:
-        new_df = pd.DataFrame(new_rows)
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
 
-        if not existing_df.empty:
-            merge_keys = ["Game Date", "Away Team", "Home Team"]
-            existing_df = existing_df[
-                ~existing_df[merge_keys].apply(tuple, axis=1).isin(
-                    new_df[merge_keys].apply(tuple, axis=1)
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+async def fetch_with_retry(session, url, limiter, semaphore, retries=3, backoff=1.0, permanent=False):
+    for attempt in range(retries + 1):
+        cached = http_cache.lookup(url)
+        if cached is not None:
+            return cached
+        await limiter.acquire()
+        async with semaphore:
+            try:
+                r = await asyncio.to_thread(
+                    http_cache.get, url, headers=HEADERS, permanent=permanent, session=session
                 )
-            ]
+                if r.status_code == 429 or r.status_code >= 500:
+                    raise requests.HTTPError(f"HTTP {r.status_code}")
+                return r
+            except requests.RequestException as e:
+                if attempt == retries:
+                    raise
+                delay = backoff * 2 ** attempt + random.uniform(0, backoff)
+                print(f"🔁 Retry {attempt + 1}/{retries} for {url} in {delay:.1f}s ({e})")
+        await asyncio.sleep(delay)
 
-        combined = pd.concat([existing_df, new_df], ignore_index=True)
-        combined.sort_values(by=["Game Date", "Home Team"], inplace=True)
+async def _scrape_days(journal, days, concurrency, rate, retries):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    limiter = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
 
-        if 'Away 1st' in combined.columns and 'Home 1st' in combined.columns:
-            combined['YRFI'] = ((combined['Away 1st'] + combined['Home 1st']) > 0).astype(int)
-            print("✅ YRFI column created.")
-        else:
-            print("⚠️ Could not create YRFI column — missing 1st inning data.")
+    async def game_row(game):
+        row = parse_boxscore_json(game["event"], game["date"])
+        if row:
+            log_row(row, "json")
+            return row
 
-        combined.to_csv(output_file, index=False)
-        print(f"\n✅ Updated and saved to {output_file} ({len(combined)} total rows)")
-    else:
-        print("ℹ️ No new games found to append.")
+        url = BOXSCORE_URL.format(game_id=game["gameId"])
+        print(f"🌐 Scraping HTML: {url}")
+        try:
+            r = await fetch_with_retry(session, url, limiter, semaphore, retries,
+                                       permanent=is_past(game["date"]))
+            row = final_scores_only(parse_boxscore_html(r.content, game["date"]), game["event"])
+            if row:
+                log_row(row, "html")
+            return row
+        except Exception as e:
+            print(f"❌ Error parsing {game['gameId']}: {e}")
+            return None
+
+    async def day_rows(date_obj):
+        r = await fetch_with_retry(session, scoreboard_url(date_obj), limiter, semaphore, retries,
+                                   permanent=is_final_slate)
+        games = parse_game_ids(r.json(), date_obj)
+        rows = await asyncio.gather(*(game_row(game) for game in games))
+        # Each day is committed as soon as it finishes; game order within the day is kept
+        commit_day(journal, date_obj, games, [row for row in rows if row])
+
+    try:
+        results = await asyncio.gather(*(day_rows(day) for day in days), return_exceptions=True)
+    finally:
+        session.close()
+    # A failed day doesn't cancel the others; it is journaled as not final so the next run retries it
+    for date_obj, result in zip(days, results):
+        if isinstance(result, Exception):
+            day = date_obj.strftime("%Y-%m-%d")
+            print(f"❌ Error scraping {day}: {result}")
+            journal.commit(day, None, final=False, error=str(result))
+
+def scrape_range_async(start_date, end_date, table="mlb_boxscores_cleaned",
+                       concurrency=8, rate=4.0, retries=3):
+    journal = open_journal(table)
+    days = days_to_scrape(journal, start_date, end_date)
+
+    try:
+        asyncio.run(_scrape_days(journal, days, concurrency, rate, retries))
+    finally:
+        # Days that finished before a failure are already journaled; fold them in either way
+        print_parse_paths()
+        save_boxscores(journal, table)
 
 if __name__ == "__main__":
     today = datetime.today()
-    start_date = (today - timedelta(days=1)).strftime("%Y-%m-%d")
-    end_date = (today + timedelta(days=1)).strftime("%Y-%m-%d")  # now includes tomorrow
-    print(f"🚀 Scraping boxscores for: {start_date} to {end_date}")
-    scrape_range(start_date, end_date)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", default=(today - timedelta(days=1)).strftime("%Y-%m-%d"))
+    parser.add_argument("--end", default=(today + timedelta(days=1)).strftime("%Y-%m-%d"))  # now includes tomorrow
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Fetch games concurrently")
+    parser.add_argument("--concurrency", type=int, default=8, help="Max in-flight requests (async mode)")
+    parser.add_argument("--rate", type=float, default=4.0, help="Max requests per second (async mode)")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per request (async mode)")
+    parser.add_argument("--replay-only", action="store_true", help="Serve every request from the HTTP cache")
+    args = parser.parse_args()
+    if args.replay_only:
+        http_cache.REPLAY_ONLY = True
+
+    print(f"🚀 Scraping boxscores for: {args.start} to {args.end}")
+    if args.use_async:
+        scrape_range_async(args.start, args.end, concurrency=args.concurrency,
+                           rate=args.rate, retries=args.retries)
+    else:
+        scrape_range(args.start, args.end)
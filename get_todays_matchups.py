@@ -1,56 +1,32 @@
 ﻿import pandas as pd
 from datetime import datetime, timedelta
+import rotowire
+import storage
 
 # === Config ===
-input_file = "data/rotowire-projstarters.csv"
-output_file = "data/today_matchups.csv"
+input_file = "data/rotowire-projstarters.csv"  # raw Rotowire download, kept as-is
+output_table = "today_matchups"
 
-# Get formatted date labels like "Sun 4/21" and "Mon 4/22"
-def format_date_label(dt):
-    return f"{dt.strftime('%a')} {dt.month}/{dt.day}"
-
-today = datetime.today()
+today = pd.Timestamp(datetime.today().date())
 tomorrow = today + timedelta(days=1)
 
-dates_to_pull = {
-    format_date_label(today): today.strftime("%Y-%m-%d"),
-    format_date_label(tomorrow): tomorrow.strftime("%Y-%m-%d")
-}
-
-# === Load and transform Rotowire data ===
-df = pd.read_csv(input_file, header=0)
-df_t = df.set_index(df.columns[0]).T.reset_index()
-df_t.rename(columns={"index": "Date"}, inplace=True)
-
-# === Extract matchups for today + tomorrow ===
-matchups = []
+# === Load the tidy Rotowire table; each game is listed once from the home team's row ===
+starters = rotowire.load_starters(input_file)
+games = starters[starters["home"].eq(True) & starters["date"].isin([today, tomorrow])]
 
-for label, iso_date in dates_to_pull.items():
-    daily_games = df_t[df_t["Date"].str.strip() == label]
-    if daily_games.empty:
-        print(f"⚠️ No games found for {label} in Rotowire file.")
-        continue
+for day in (today, tomorrow):
+    if not (starters["date"] == day).any():
+        print(f"⚠️ No games found for {day:%a} {day.month}/{day.day} in Rotowire file.")
 
-    for team, game in daily_games.iloc[0].items():
-        if team == "Date" or pd.isna(game):
-            continue
-        if " vs " in game:
-            home = team
-            away = game.split(" vs ")[1].split()[0]
-        elif " @ " in game:
-            away = team
-            home = game.split(" @ ")[1].split()[0]
-        else:
-            continue  # skip OFF DAY or POSTPONED
-        matchups.append({
-            "Game Date": iso_date,
-            "Away Team": away.upper(),
-            "Home Team": home.upper()
-        })
+matchups = pd.DataFrame({
+    "Game Date": games["date"].dt.strftime("%Y-%m-%d"),
+    "Away Team": games["opponent"].str.upper(),
+    "Home Team": games["team"].str.upper(),
+})
 
 # === Save output ===
-if matchups:
-    pd.DataFrame(matchups).to_csv(output_file, index=False)
-    print(f"✅ Saved {len(matchups)} matchups for today + tomorrow to {output_file}")
+if not matchups.empty:
+    storage.write_table(matchups, output_table)
+    print(f"✅ Saved {len(matchups)} matchups for today + tomorrow to {storage.table_path(output_table)}")
 else:
     print("❌ No matchups generated. Check rotowire-projstarters.csv format.")
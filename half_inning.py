@@ -0,0 +1,134 @@
+﻿# half_inning.py
+# Half-inning decomposition model: P(YRFI) = 1 - P(top 1st scoreless) x P(bottom 1st scoreless).
+#
+# Instead of one classifier on the combined yrfi label, every game is split into its two
+# half-innings: the away offense against the home starter (top), and the home offense
+# against the away starter (bottom), each labeled by whether that half scored (Away 1st /
+# Home 1st > 0). One booster is fitted on the stacked halves, with a bats_home flag for
+# the side. A slate is scored in one vectorized pass over its 2n halves, and the halves
+# combine in closed form (treating the two halves as independent). Each half's probability
+# is kept too, for half-inning markets.
+#
+# The fitted model is exported as an inference bundle (inference.py) under
+# model/half_inning_bundles, so it is scored with NumPy like the main model.
+#
+#   python half_inning.py --train    # fit on every labeled game, export the bundle
+#   python half_inning.py            # score the slate -> yrfi_half_inning_predictions
+import argparse
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import OneHotEncoder
+
+import features
+import inference
+import storage
+import tune_yrfi_xgb
+
+BUNDLE_DIR = inference.BUNDLE_DIR.parent / "half_inning_bundles"
+PREDICTIONS_TABLE = "yrfi_half_inning_predictions"
+HALF_CATEGORICAL = ["batting_team", "pitcher_hand"]
+HALF_NUMERIC = [
+    "offense_avg_1st", "offense_games", "pitcher_era",
+    "pitcher_r1_rate", "pitcher_scoreless_pct", "pitcher_starts",
+    "bats_home", "day_of_week",
+]
+# Half column <- (top half source column, bottom half source column)
+SIDES = {
+    "batting_team": ("away_team", "home_team"),
+    "pitcher_hand": ("home_hand", "away_hand"),
+    "offense_avg_1st": ("away_team_avg_1st", "home_team_avg_1st"),
+    "offense_games": ("away_games", "home_games"),
+    "pitcher_era": ("home_era", "away_era"),
+    "pitcher_r1_rate": ("home_starter_r1_rate", "away_starter_r1_rate"),
+    "pitcher_scoreless_pct": ("home_starter_scoreless_pct", "away_starter_scoreless_pct"),
+    "pitcher_starts": ("home_starter_starts", "away_starter_starts"),
+    "runs": ("Away 1st", "Home 1st"),
+}
+
+
+def halves(rows):
+    """The 2n half-innings of `rows`: every top half, then every bottom half (same order).
+
+    `scored` is 1/0 when the half's runs are known, NaN when they're missing. Games not
+    played yet are stored with 0 runs, so filter with features.labeled() before fitting.
+    """
+    n = len(rows)
+    out = {}
+    for col, (top, bottom) in SIDES.items():
+        values = [rows[top] if top in rows else pd.Series(np.nan, index=rows.index),
+                  rows[bottom] if bottom in rows else pd.Series(np.nan, index=rows.index)]
+        if col in HALF_CATEGORICAL:
+            out[col] = np.concatenate([v.astype(object).to_numpy() for v in values])
+        else:
+            out[col] = np.concatenate([pd.to_numeric(v, errors="coerce").to_numpy(dtype=float) for v in values])
+    out["bats_home"] = np.repeat([0.0, 1.0], n)
+    out["day_of_week"] = np.tile(pd.to_datetime(rows["date"]).dt.dayofweek.to_numpy(dtype=float), 2)
+    df = pd.DataFrame(out)
+    df["scored"] = np.where(np.isnan(df["runs"]), np.nan, (df["runs"] > 0).astype(float))
+    return df
+
+
+def half_matrix(df, encoder):
+    return np.hstack([encoder.transform(df[HALF_CATEGORICAL].astype(str)), df[HALF_NUMERIC].to_numpy(dtype=float)])
+
+
+def fit(rows, params=None):
+    """(model, encoder) fitted on every half-inning of the finished games in `rows`."""
+    h = halves(rows[features.labeled(rows)])
+    h = h[h["scored"].notna()]
+    encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore").fit(h[HALF_CATEGORICAL].astype(str))
+    model = xgb.XGBClassifier(objective="binary:logistic", eval_metric="logloss", random_state=42,
+                              **(params or tune_yrfi_xgb.best_params()))
+    model.fit(half_matrix(h, encoder), h["scored"].astype(int))
+    return model, encoder
+
+
+def combine(p_top, p_bottom):
+    """P(at least one half scores), assuming the halves are independent."""
+    return 1.0 - (1.0 - p_top) * (1.0 - p_bottom)
+
+
+def predict_halves(scorer, rows):
+    """(p_top, p_bottom, p_yrfi) for `rows` in one pass over their 2n halves.
+
+    `scorer` is an inference.Bundle of the half model, or a fitted (model, encoder) pair.
+    """
+    h = halves(rows)
+    if isinstance(scorer, inference.Bundle):
+        p = scorer.predict_proba(h.assign(**{c: h[c].astype(str) for c in HALF_CATEGORICAL}))
+    else:
+        model, encoder = scorer
+        p = model.predict_proba(half_matrix(h, encoder))[:, 1]
+    p_top, p_bottom = p[:len(rows)], p[len(rows):]
+    return p_top, p_bottom, combine(p_top, p_bottom)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--train", action="store_true", help="Fit on every labeled game and export the bundle")
+    args = parser.parse_args()
+
+    rows, _ = features.cached_rows()
+    if args.train:
+        model, encoder = fit(rows)
+        finished = rows[features.labeled(rows)]
+        bundle = inference.export(model, encoder, "dense", HALF_CATEGORICAL, HALF_NUMERIC, bundle_dir=BUNDLE_DIR,
+                                  meta={"model": "half_inning", "train_halves": int(halves(finished)["scored"].notna().sum())})
+        print(f"✅ Half-inning model trained on {len(finished)} finished games; bundle: {bundle}")
+    else:
+        bundle = inference.load(inference.latest(BUNDLE_DIR)) if inference.latest(BUNDLE_DIR) else None
+        if bundle is None:
+            raise SystemExit(f"❌ No half-inning bundle in {BUNDLE_DIR}; run python half_inning.py --train")
+        p_top, p_bottom, p_yrfi = predict_halves(bundle, rows)
+        out = rows[["date", "game_key", "away_team", "home_team", "away_starter", "home_starter"]].copy()
+        out["Top_Score_Prob"] = p_top
+        out["Bottom_Score_Prob"] = p_bottom
+        out["YRFI_Prob"] = p_yrfi
+        out["NRFI_Prob"] = 1 - p_yrfi
+        out["model_version"] = f"half_inning:{bundle.version}"
+        storage.write_table(out, PREDICTIONS_TABLE)
+        print(f"✅ Half-inning predictions for {len(out)} games saved to: {storage.table_path(PREDICTIONS_TABLE)}")
+        print(out[["date", "away_team", "home_team", "Top_Score_Prob", "Bottom_Score_Prob", "YRFI_Prob"]]
+              .round(3).tail())
@@ -0,0 +1,199 @@
+﻿# http_cache.py
+# Shared on-disk response cache for the ESPN and Odds API scrapers.
+#
+# Bodies are stored once under blobs/<sha256 of body>; entries/<sha256 of request>.json
+# points at the blob and records status, headers and expiry. Final games and historical
+# snapshots are stored with no expiry, live/future slates expire after a TTL.
+#
+#   YRFI_HTTP_CACHE          cache directory (default data/http_cache)
+#   YRFI_HTTP_CACHE_TTL      seconds before a non-final response expires (default 900)
+#   YRFI_HTTP_CACHE_MAX_MB   size bound; least recently used entries are evicted (default 512)
+#   YRFI_REPLAY_ONLY=1       never touch the network, serve everything from the cache
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_DIR = Path(os.environ.get("YRFI_HTTP_CACHE", "data/http_cache"))
+DEFAULT_TTL = int(os.environ.get("YRFI_HTTP_CACHE_TTL", "900"))
+MAX_CACHE_BYTES = int(os.environ.get("YRFI_HTTP_CACHE_MAX_MB", "512")) * 1024 * 1024
+REPLAY_ONLY = os.environ.get("YRFI_REPLAY_ONLY") == "1"
+
+# Query params that identify the caller rather than the resource
+IGNORED_PARAMS = {"apiKey"}
+# Blobs touched this recently are never swept as orphans: their entry may not have landed yet
+ORPHAN_GRACE_SECONDS = 300
+
+_lock = threading.Lock()
+_cache_bytes = None
+
+
+class CacheMiss(LookupError):
+    """Raised in replay-only mode when a request has no cached response."""
+
+
+class CachedResponse:
+    """The parts of requests.Response the scrapers use."""
+
+    def __init__(self, status_code, content, headers, from_cache):
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def request_key(url, params=None):
+    params = {k: v for k, v in (params or {}).items() if k not in IGNORED_PARAMS}
+    full = url + ("?" + urlencode(sorted(params.items())) if params else "")
+    return hashlib.sha256(full.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return CACHE_DIR / "entries" / f"{key}.json"
+
+
+def _blob_path(digest):
+    return CACHE_DIR / "blobs" / digest[:2] / digest
+
+
+def _atomic_write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def lookup(url, params=None, allow_expired=False):
+    entry_path = _entry_path(request_key(url, params))
+    try:
+        entry = json.loads(entry_path.read_text())
+        content = _blob_path(entry["blob"]).read_bytes()
+    except (OSError, ValueError, KeyError):
+        return None
+    if entry["expires"] is not None and entry["expires"] < time.time() and not allow_expired:
+        return None
+    os.utime(entry_path)  # mark as recently used for eviction
+    return CachedResponse(entry["status"], content, entry["headers"], from_cache=True)
+
+
+def store(url, params, response, permanent=False, ttl=DEFAULT_TTL):
+    global _cache_bytes
+    digest = hashlib.sha256(response.content).hexdigest()
+    blob = _blob_path(digest)
+    try:
+        os.utime(blob)  # already stored: refresh it so eviction's orphan sweep leaves it alone
+    except FileNotFoundError:
+        _atomic_write(blob, response.content)
+        with _lock:
+            if _cache_bytes is not None:
+                _cache_bytes += len(response.content)
+    entry = {
+        "url": url,
+        "status": response.status_code,
+        "headers": dict(response.headers),
+        "blob": digest,
+        "stored": time.time(),
+        "expires": None if permanent else time.time() + ttl,
+    }
+    _atomic_write(_entry_path(request_key(url, params)), json.dumps(entry).encode("utf-8"))
+    if cache_size() > MAX_CACHE_BYTES:
+        evict(int(MAX_CACHE_BYTES * 0.9))
+
+
+def get(url, params=None, headers=None, permanent=False, ttl=DEFAULT_TTL, session=None, timeout=30):
+    """GET through the cache. `permanent` may be a bool or a callable taking the fresh response."""
+    cached = lookup(url, params, allow_expired=REPLAY_ONLY)
+    if cached is not None:
+        return cached
+    if REPLAY_ONLY:
+        raise CacheMiss(f"No cached response for {url} (replay-only mode)")
+
+    r = (session or requests).get(url, params=params, headers=headers, timeout=timeout)
+    if r.status_code == 200:
+        keep = permanent(r) if callable(permanent) else permanent
+        store(url, params, r, permanent=keep, ttl=ttl)
+    return CachedResponse(r.status_code, r.content, r.headers, from_cache=False)
+
+
+def cache_size():
+    global _cache_bytes
+    with _lock:
+        if _cache_bytes is None:
+            blobs = CACHE_DIR / "blobs"
+            _cache_bytes = sum(p.stat().st_size for p in blobs.glob("*/*")) if blobs.exists() else 0
+        return _cache_bytes
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Drops least recently used entries until blob storage fits in `max_bytes`."""
+    global _cache_bytes
+    started = time.time()
+    with _lock:
+        entries = sorted((CACHE_DIR / "entries").glob("*.json"), key=lambda p: p.stat().st_mtime)
+        blob_refs = {}
+        for path in entries:
+            try:
+                blob_refs.setdefault(json.loads(path.read_text())["blob"], []).append(path)
+            except (OSError, ValueError, KeyError):
+                path.unlink(missing_ok=True)
+
+        for blob in (CACHE_DIR / "blobs").glob("*/*"):
+            if blob.name in blob_refs or blob.name.endswith(".tmp"):
+                continue
+            try:
+                # Orphaned by removed entries, unless just written by a store() still in flight
+                if blob.stat().st_mtime < started - ORPHAN_GRACE_SECONDS:
+                    blob.unlink()
+            except FileNotFoundError:
+                pass
+        total = sum(_blob_path(d).stat().st_size for d in blob_refs if _blob_path(d).exists())
+        for path in entries:
+            if total <= max_bytes:
+                break
+            if not path.exists():
+                continue
+            digest = json.loads(path.read_text())["blob"]
+            path.unlink()
+            refs = blob_refs[digest]
+            refs.remove(path)
+            if not refs and _blob_path(digest).exists():
+                total -= _blob_path(digest).stat().st_size
+                _blob_path(digest).unlink()
+        _cache_bytes = total
+    print(f"🧹 HTTP cache trimmed to {total / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--evict", action="store_true", help="Trim the cache to YRFI_HTTP_CACHE_MAX_MB")
+    parser.add_argument("--clear-expired", action="store_true", help="Remove expired entries")
+    args = parser.parse_args()
+
+    if args.clear_expired:
+        removed = 0
+        for path in (CACHE_DIR / "entries").glob("*.json"):
+            entry = json.loads(path.read_text())
+            if entry["expires"] is not None and entry["expires"] < time.time():
+                path.unlink()
+                removed += 1
+        print(f"🗑 Removed {removed} expired entries")
+    if args.evict:
+        evict(MAX_CACHE_BYTES)
+
+    entries = list((CACHE_DIR / "entries").glob("*.json"))
+    print(f"📦 {len(entries)} cached responses, {cache_size() / 1024 / 1024:.1f} MB in {CACHE_DIR}")
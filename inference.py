@@ -0,0 +1,206 @@
+﻿# inference.py
+# Versioned inference bundle: written by save_yrfi_model.py, scored without sklearn or joblib.
+#
+# A bundle is a directory model/bundles/<version>/ holding
+#   model.json    the booster in XGBoost's native JSON format
+#   lookup.csv    flat category -> matrix column table (feature, category, column, value)
+#   schema.json   format, layout, feature columns, objective and library versions
+# and model/bundles/LATEST names the newest one. Bundle.predict_proba scores a batch with
+# NumPy alone, walking every tree at once over flat node arrays; models with native
+# categorical splits are scored by the xgboost core (no sklearn) instead. Loading needs
+# json, csv and numpy only, so a prediction run starts without the sklearn/xgboost stack.
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+BUNDLE_DIR = Path("model") / "bundles"
+FORMAT = 1
+
+
+# === Export (called with the trained model and fitted encoder) ===
+def export(model, encoder, layout, categorical_cols, numeric_cols, bundle_dir=BUNDLE_DIR, meta=None):
+    """Writes a new bundle for a trained XGBClassifier and its OneHotEncoder; returns its path."""
+    booster = model.get_booster()
+    raw = booster.save_raw(raw_format="json")
+    version = f"{datetime.now():%Y%m%d-%H%M%S}-{hashlib.sha256(raw).hexdigest()[:8]}"
+    path = Path(bundle_dir) / version
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.mkdir(parents=True, exist_ok=True)
+    (tmp / "model.json").write_bytes(raw)
+
+    # One-hot layouts: one column per category; categorical layout: one column per
+    # feature holding the category's code (its position in the encoder's categories)
+    lookup, column = [], 0
+    for feature, cats in zip(categorical_cols, encoder.categories_):
+        for code, category in enumerate(cats):
+            if layout == "categorical":
+                lookup.append((feature, str(category), column, code))
+            else:
+                lookup.append((feature, str(category), column + code, 1))
+        column += 1 if layout == "categorical" else len(cats)
+    with open(tmp / "lookup.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["feature", "category", "column", "value"])
+        writer.writerows(lookup)
+
+    import xgboost
+    schema = {
+        "format": FORMAT,
+        "version": version,
+        "layout": layout,
+        "categorical": list(categorical_cols),
+        "numeric": {name: column + i for i, name in enumerate(numeric_cols)},
+        "n_features": column + len(numeric_cols),
+        # Unset one-hot cells: a zero value (dense) or missing (sparse CSR, categorical)
+        "unset": "zero" if layout == "dense" else "missing",
+        "objective": json.loads(raw)["learner"]["objective"]["name"],
+        "xgboost": xgboost.__version__,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        **(meta or {}),
+    }
+    (tmp / "schema.json").write_text(json.dumps(schema, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+    pointer = Path(bundle_dir) / "LATEST"
+    pointer_tmp = pointer.with_name("LATEST.tmp")
+    pointer_tmp.write_text(version, encoding="utf-8")
+    os.replace(pointer_tmp, pointer)
+    return path
+
+
+# === Loading + scoring ===
+def latest(bundle_dir=BUNDLE_DIR):
+    """Path of the newest bundle, or None if none was exported."""
+    pointer = Path(bundle_dir) / "LATEST"
+    if not pointer.exists():
+        return None
+    path = Path(bundle_dir) / pointer.read_text(encoding="utf-8").strip()
+    return path if path.is_dir() else None
+
+
+def load(path=None):
+    path = path or latest()
+    if path is None:
+        raise FileNotFoundError(f"No inference bundle in {BUNDLE_DIR} (run save_yrfi_model.py)")
+    return Bundle(path)
+
+
+class Bundle:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.schema = json.loads((self.path / "schema.json").read_text(encoding="utf-8"))
+        if self.schema["format"] != FORMAT:
+            raise ValueError(f"Bundle format {self.schema['format']} not supported (expected {FORMAT})")
+        if self.schema["objective"] != "binary:logistic":
+            raise ValueError(f"Unsupported objective {self.schema['objective']}")
+        self.version = self.schema["version"]
+        self.lookup = {}
+        with open(self.path / "lookup.csv", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                self.lookup.setdefault(row["feature"], {})[row["category"]] = (int(row["column"]), float(row["value"]))
+        self._load_trees()
+
+    def _load_trees(self):
+        learner = json.loads((self.path / "model.json").read_text(encoding="utf-8"))["learner"]
+        self.base_margin = _logit(float(learner["learner_model_param"]["base_score"].strip("[]")))
+        trees = learner["gradient_booster"]["model"]["trees"]
+        self.categorical_splits = any(t.get("categories_nodes") for t in trees)
+        roots, left, right, feature, cond, default_left = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            roots.append(offset)
+            lc = np.asarray(tree["left_children"], dtype=np.int64)
+            rc = np.asarray(tree["right_children"], dtype=np.int64)
+            leaf = lc == -1
+            left.append(np.where(leaf, np.arange(len(lc)), lc) + offset)  # leaves point to themselves
+            right.append(np.where(leaf, np.arange(len(rc)), rc) + offset)
+            feature.append(np.asarray(tree["split_indices"], dtype=np.int64))
+            cond.append(np.asarray(tree["split_conditions"], dtype=np.float32))  # leaf value on leaves
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            offset += len(lc)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.left, self.right = np.concatenate(left), np.concatenate(right)
+        self.feature, self.cond = np.concatenate(feature), np.concatenate(cond)
+        self.default_left = np.concatenate(default_left)
+        self.depth = max(_depth(t["left_children"], t["right_children"]) for t in trees)
+
+    def matrix(self, columns):
+        """float32 model matrix from a mapping of column name -> values (e.g. a DataFrame)."""
+        schema = self.schema
+        n = len(columns[schema["categorical"][0]] if schema["categorical"] else columns[next(iter(schema["numeric"]))])
+        X = np.full((n, schema["n_features"]), 0.0 if schema["unset"] == "zero" else np.nan, dtype=np.float32)
+        for feature in schema["categorical"]:
+            values = np.asarray(columns[feature], dtype=object).astype(str)
+            uniques, inverse = np.unique(values, return_inverse=True)
+            table = self.lookup.get(feature, {})
+            hits = [(i, *table[u]) for i, u in enumerate(uniques) if u in table]  # unknown: left unset
+            for i, column, value in hits:
+                X[inverse == i, column] = value
+        for name, column in schema["numeric"].items():
+            X[:, column] = np.asarray(columns[name], dtype=np.float64)
+        return X
+
+    def margin(self, X):
+        """Raw scores of every row: all trees are walked together, one level per step."""
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+        for _ in range(self.depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.cond[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.cond[node].sum(axis=1, dtype=np.float64) + self.base_margin
+
+    def predict_proba(self, columns, engine="auto"):
+        """P(YRFI) for each row. engine: "numpy", "xgboost" (core Booster) or "auto"."""
+        return self.predict_matrix(self.matrix(columns), engine)
+
+    def predict_matrix(self, X, engine="auto"):
+        """P(YRFI) for each row of a matrix built by matrix()."""
+        if engine == "xgboost" or (engine == "auto" and self.categorical_splits):
+            return self._predict_core(X)
+        if self.categorical_splits:
+            raise ValueError("This bundle has categorical splits; score it with engine='xgboost'")
+        return 1.0 / (1.0 + np.exp(-self.margin(X)))
+
+    def column_features(self):
+        """The feature behind each matrix column (a one-hot column maps to its categorical)."""
+        names = [None] * self.schema["n_features"]
+        for feature, table in self.lookup.items():
+            for column, _ in table.values():
+                names[column] = feature
+        for name, column in self.schema["numeric"].items():
+            names[column] = name
+        return names
+
+    def contributions(self, X):
+        """Each column's contribution to the margin (XGBoost's pred_contribs), bias last."""
+        return self._core().predict(self._dmatrix(X), pred_contribs=True)
+
+    def _predict_core(self, X):
+        return self._core().predict(self._dmatrix(X)).astype(np.float64)
+
+    def _core(self):
+        import xgboost as xgb
+        if not hasattr(self, "_booster"):
+            self._booster = xgb.Booster(model_file=str(self.path / "model.json"))
+        return self._booster
+
+    def _dmatrix(self, X):
+        import xgboost as xgb
+        types = self._core().feature_types
+        return xgb.DMatrix(X, feature_names=self._core().feature_names, feature_types=types,
+                           enable_categorical=bool(types and "c" in types))
+
+
+def _logit(p):
+    return float(np.log(p / (1.0 - p)))
+
+
+def _depth(left, right, node=0):
+    if left[node] == -1:
+        return 0
+    return 1 + max(_depth(left, right, left[node]), _depth(left, right, right[node]))
@@ -1,56 +1,53 @@
 ﻿# -*- coding: utf-8 -*-
 import pandas as pd
 from pathlib import Path
+import game_store
+import rotowire
+import storage
+import teams
 
 # Set data folder relative to script location
 DATA_DIR = Path("data")
 
 # Load boxscores
-boxscores = pd.read_csv(DATA_DIR / "mlb_boxscores_cleaned.csv", parse_dates=["Game Date"])
-
-# Load and reshape starters file (wide → long)
-starters_raw = pd.read_csv(DATA_DIR / "rotowire-projstarters.csv")
-starters_long = starters_raw.melt(id_vars=["Unnamed: 0"], var_name="Date", value_name="starter_name")
-starters_long = starters_long.rename(columns={"Unnamed: 0": "Team"})
-
-# Parse date strings into actual datetime
-starters_long["Date"] = pd.to_datetime(starters_long["Date"] + " 2025", format="%a %m/%d %Y")
-
-# Team abbreviation → full name mapping
-TEAM_NAME_MAP = {
-    'ARI': 'Arizona Diamondbacks', 'ATL': 'Atlanta Braves', 'BAL': 'Baltimore Orioles',
-    'BOS': 'Boston Red Sox', 'CHC': 'Chicago Cubs', 'CWS': 'Chicago White Sox',
-    'CIN': 'Cincinnati Reds', 'CLE': 'Cleveland Guardians', 'COL': 'Colorado Rockies',
-    'DET': 'Detroit Tigers', 'HOU': 'Houston Astros', 'KC': 'Kansas City Royals',
-    'LAA': 'Los Angeles Angels', 'LAD': 'Los Angeles Dodgers', 'MIA': 'Miami Marlins',
-    'MIL': 'Milwaukee Brewers', 'MIN': 'Minnesota Twins', 'NYM': 'New York Mets',
-    'NYY': 'New York Yankees', 'OAK': 'Athletics', 'PHI': 'Philadelphia Phillies',
-    'PIT': 'Pittsburgh Pirates', 'SD': 'San Diego Padres', 'SEA': 'Seattle Mariners',
-    'SF': 'San Francisco Giants', 'STL': 'St. Louis Cardinals', 'TB': 'Tampa Bay Rays',
-    'TEX': 'Texas Rangers', 'TOR': 'Toronto Blue Jays', 'WSH': 'Washington Nationals'
-}
-
-# Apply team name mapping and drop junk rows
-starters_long["team"] = starters_long["Team"].map(TEAM_NAME_MAP)
-starters_long = starters_long.dropna(subset=["team"])
-
-# Normalize columns for merging
+boxscores = storage.read_table("mlb_boxscores_cleaned")
+
+# Load starters (tidy: one row per team, date and game number); drop junk rows
+starters_long = rotowire.load_starters()
+starters_long = starters_long[teams.team_id(starters_long["team"]) > teams.UNKNOWN]
+
+# Every join runs on the packed game_key; a starter's game is (date, home, away, game number)
 boxscores = boxscores.rename(columns={
     "Game Date": "date", "Home Team": "home_team", "Away Team": "away_team"
 })
-starters_long = starters_long.rename(columns={"Date": "date"})
+boxscores["game_key"] = teams.game_keys(boxscores, "date", "home_team", "away_team")
+
+team_id = teams.team_id(starters_long["team"])
+opponent_id = teams.team_id(starters_long["opponent"])
+at_home = starters_long["home"].eq(True)
+starters_long["game_key"] = teams.game_key(
+    starters_long["date"],
+    team_id.where(at_home, opponent_id),
+    opponent_id.where(at_home, team_id),
+    starters_long["game_number"].to_numpy(),
+)
+has_game = starters_long["game_key"].notna()
 
 # Merge home starters
-home = starters_long.rename(columns={"team": "home_team", "starter_name": "home_starter"})
-merged = pd.merge(boxscores, home[["date", "home_team", "home_starter"]], on=["date", "home_team"], how="left")
+home = starters_long[has_game & at_home].rename(columns={"starter": "home_starter"})
+merged = pd.merge(boxscores, home[["game_key", "home_starter"]], on="game_key", how="left")
 
 # Merge away starters
-away = starters_long.rename(columns={"team": "away_team", "starter_name": "away_starter"})
-merged = pd.merge(merged, away[["date", "away_team", "away_starter"]], on=["date", "away_team"], how="left")
+away = starters_long[has_game & starters_long["home"].eq(False)].rename(columns={"starter": "away_starter"})
+merged = pd.merge(merged, away[["game_key", "away_starter"]], on="game_key", how="left")
+
+# Keep the game store's starters table current (date, team and game number are its key)
+store_starters = starters_long.assign(team=teams.canonical(starters_long["team"]))
+game_store.upsert_starters(store_starters[["date", "team", "game_number", "starter", "pitcher", "hand"]])
 
 # Save merged output in /data folder
-output_path = DATA_DIR / "boxscores_with_starters.csv"
-merged.to_csv(output_path, index=False)
+storage.write_table(merged, "boxscores_with_starters")
+output_path = storage.table_path("boxscores_with_starters")
 
 # Final info
 print("✅ Merged file saved to:", output_path.resolve())
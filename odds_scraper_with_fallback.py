@@ -1,11 +1,18 @@
 ﻿import requests
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import threading
 import time
 import os
 import argparse
 import sys
 import numpy as np
+import game_store
+import http_cache
+import storage
+import teams
+from scrape_journal import DayJournal
 
 
 # === Config ===
@@ -14,32 +21,85 @@ SPORT_KEY = "baseball_mlb"
 MARKETS = "h2h,spreads,totals"
 REGION = "us"
 BOOKMAKER_PRIORITY = ["mybookieag", "fanduel", "draftkings", "betmgm"]
+ODDS_API_URL = os.environ.get("ODDS_API_URL", "https://api.the-odds-api.com/v4")
 
 # === Paths ===
 DATA_DIR = "data"
 os.makedirs(DATA_DIR, exist_ok=True)
 
-ODDS_CSV = os.path.join(DATA_DIR, "mlb_odds_mybookie.csv")
-BOXSCORE_CSV = os.path.join(DATA_DIR, "mlb_boxscores_cleaned.csv")
-MERGED_CSV = os.path.join(DATA_DIR, "mlb_model_and_odds.csv")
+ODDS_TABLE = "mlb_odds_mybookie"
+BOXSCORE_TABLE = "mlb_boxscores_cleaned"
+MERGED_TABLE = "mlb_model_and_odds"
+LEDGER_JSON = os.path.join(DATA_DIR, "odds_fetch_ledger.json")
+
+# === Backfill Scheduling ===
+WORKERS = 4             # concurrent day requests
+MIN_INTERVAL = 0.25     # seconds between request starts across all workers
+QUOTA_RESERVE = 500     # stop before remaining credits drop below this
+QUOTA_SLOWDOWN = 2000   # fall back to the old 1.25s pacing below this
+COMPACT_EVERY = 10      # journaled days between folds into ODDS_TABLE
+ODDS_KEYS = ["Game Date", "Home Team", "Away Team"]
 
 # === Scrape Range ===
 START_DATE = datetime.strptime("2025-03-27", "%Y-%m-%d")
 END_DATE = datetime.today() + timedelta(days=1)
 
-# === Normalize Merge Keys ===
+# === Normalize Merge Keys (canonical team names + packed game_key) ===
 def normalize_merge_keys(df):
     df["Game Date"] = pd.to_datetime(df["Game Date"], errors="coerce").dt.strftime("%Y-%m-%d")
-    df["Home Team"] = df["Home Team"].astype(str).str.strip().str.title()
-    df["Away Team"] = df["Away Team"].astype(str).str.strip().str.title()
+    df["Home Team"] = teams.canonical(df["Home Team"])
+    df["Away Team"] = teams.canonical(df["Away Team"])
+    df["game_key"] = teams.game_keys(df)
     return df
 
+# === Quota Tracking ===
+class QuotaTracker:
+    """Paces requests from the Odds API usage headers and signals when to stop."""
+
+    def __init__(self, reserve=QUOTA_RESERVE, slowdown=QUOTA_SLOWDOWN, min_interval=MIN_INTERVAL):
+        self.reserve = reserve
+        self.slowdown = slowdown
+        self.min_interval = min_interval
+        self.remaining = None
+        self.used = None
+        self.last_cost = 0
+        self.next_start = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, headers):
+        with self.lock:
+            if "x-requests-remaining" in headers:
+                self.remaining = float(headers["x-requests-remaining"])
+            if "x-requests-used" in headers:
+                self.used = float(headers["x-requests-used"])
+            if "x-requests-last" in headers:
+                self.last_cost = float(headers["x-requests-last"])
+
+    def exhausted(self, in_flight=0):
+        with self.lock:
+            if self.remaining is None:
+                return False
+            return self.remaining - self.last_cost * (in_flight + 1) < self.reserve
+
+    def wait_turn(self):
+        with self.lock:
+            slow = self.remaining is not None and self.remaining < self.slowdown
+            interval = 1.25 if slow else self.min_interval
+            start = max(time.monotonic(), self.next_start)
+            self.next_start = start + interval
+        time.sleep(max(0.0, start - time.monotonic()))
+
+    def summary(self):
+        return f"remaining={self.remaining}, used={self.used}, last call cost={self.last_cost}"
+
 # === Fetch Odds Function ===
-def fetch_odds_for_day(date_obj):
+def fetch_odds_for_day(date_obj, quota=None, retries=3, usage=None):
+    """Odds rows for the day (None on error). `usage["cost"]` accumulates the credits this
+    call spent, from each response's own x-requests-last; cached responses cost nothing."""
     is_future = date_obj.date() > datetime.today().date()
 
     if is_future:
-        url = f"https://api.the-odds-api.com/v4/sports/{SPORT_KEY}/odds"
+        url = f"{ODDS_API_URL}/sports/{SPORT_KEY}/odds"
         params = {
             "apiKey": API_KEY,
             "markets": MARKETS,
@@ -47,8 +107,9 @@ def fetch_odds_for_day(date_obj):
             "oddsFormat": "decimal"
         }
     else:
-        snapshot_time = date_obj.replace(hour=16).isoformat() + "Z"
-        url = f"https://api.the-odds-api.com/v4/historical/sports/{SPORT_KEY}/odds"
+        snapshot_dt = date_obj.replace(hour=16, minute=0, second=0, microsecond=0)
+        snapshot_time = snapshot_dt.isoformat() + "Z"
+        url = f"{ODDS_API_URL}/historical/sports/{SPORT_KEY}/odds"
         params = {
             "apiKey": API_KEY,
             "markets": MARKETS,
@@ -60,10 +121,22 @@ def fetch_odds_for_day(date_obj):
     print(f"📅 Fetching odds for {date_obj.strftime('%Y-%m-%d')}...")
 
     try:
-        res = requests.get(url, params=params)
+        # Historical snapshots already in the past never change; live odds expire after the TTL
+        permanent = not is_future and snapshot_dt < datetime.utcnow()
+        for attempt in range(retries + 1):
+            if quota is not None:
+                quota.wait_turn()
+            res = http_cache.get(url, params=params, permanent=permanent)
+            if quota is not None and not res.from_cache:
+                quota.update(res.headers)
+            if usage is not None and not res.from_cache:
+                usage["cost"] = usage.get("cost", 0.0) + float(res.headers.get("x-requests-last", 0))
+            if res.status_code != 429 or attempt == retries:
+                break
+            time.sleep(2 ** attempt)
         if res.status_code != 200:
             print(f"⚠️ API Error {res.status_code}: {res.text}")
-            return []
+            return None
 
         snapshot = res.json()
         if not is_future:
@@ -115,77 +188,115 @@ def fetch_odds_for_day(date_obj):
         return rows
     except Exception as e:
         print(f"❌ Error on {date_obj.strftime('%Y-%m-%d')}: {e}")
-        return []
+        return None
 
 # === Scrape Range ===
-def scrape_range(start_date, end_date, update_existing=False):
-    columns = [
-        "Game Date", "Home Team", "Away Team", "Bookmaker Used",
-        "ML Home", "ML Away", "Spread Home", "Spread Home Odds",
-        "Spread Away", "Spread Away Odds", "Total", "Over Odds", "Under Odds"
-    ]
-
-    if os.path.exists(ODDS_CSV):
-        existing_df = pd.read_csv(ODDS_CSV)
+def scrape_range(start_date, end_date, update_existing=False, workers=WORKERS, reserve=QUOTA_RESERVE):
+    if storage.exists(ODDS_TABLE):
+        existing = storage.read_table(ODDS_TABLE, columns=["Game Date"], start=start_date, end=end_date)
+        existing_dates = set(existing["Game Date"].dt.strftime("%Y-%m-%d"))
     else:
         print("🆕 No odds file found. Starting new.")
-        existing_df = pd.DataFrame(columns=columns)
+        existing_dates = set()
 
-    all_rows = []
+    # Each fetched day is committed to data/journal/odds on its own; the manifest is the fetch ledger
+    ledger = DayJournal("odds", manifest_path=LEDGER_JSON)
+
+    todo = []
     current = start_date
     while current <= end_date:
         date_str = current.strftime("%Y-%m-%d")
-        if not update_existing and date_str in existing_df["Game Date"].astype(str).unique():
+        # Live slates (today and later) are never final, so they are always refetched
+        done = ledger.is_final(date_str) and ledger.entry(date_str).get("status") in ("done", "empty")
+        if not update_existing and (done or date_str in existing_dates):
             print(f"⏭ Skipping {date_str} (already exists)")
         else:
-            rows = fetch_odds_for_day(current)
-            if rows:
-                all_rows.extend(rows)
-            else:
-                print(f"⚠️ No odds found for {date_str}")
-            time.sleep(1.25)
+            todo.append(current)
         current += timedelta(days=1)
 
-    if all_rows:
-        new_df = pd.DataFrame(all_rows)
-        combined = pd.concat([existing_df, new_df], ignore_index=True)
-        combined.drop_duplicates(subset=["Game Date", "Home Team", "Away Team"], keep="last", inplace=True)
-        combined.to_csv(ODDS_CSV, index=False)
-        print(f"\n✅ Updated odds saved to {ODDS_CSV} ({len(combined)} total rows)")
-    else:
+    quota = QuotaTracker(reserve=reserve)
+    state = {"in_flight": 0, "stopped": False, "fetched": 0, "new": 0, "since_compact": 0}
+    lock = threading.Lock()
+    compact_lock = threading.Lock()
+    today_str = datetime.today().strftime("%Y-%m-%d")
+
+    def compact():
+        with compact_lock:
+            combined = ledger.compact(ODDS_TABLE, ODDS_KEYS, dedupe_new=True, on_new=game_store.upsert_odds)
+        if combined is not None:
+            print(f"💾 Checkpoint: {storage.table_path(ODDS_TABLE)} ({len(combined)} rows in the updated months)")
+
+    def fetch_day(date_obj):
+        date_str = date_obj.strftime("%Y-%m-%d")
+        with lock:
+            if state["stopped"] or quota.exhausted(state["in_flight"]):
+                if not state["stopped"]:
+                    print(f"🛑 Stopping before quota reserve ({quota.summary()})")
+                state["stopped"] = True
+                return
+            state["in_flight"] += 1
+
+        usage = {"cost": 0.0}
+        rows = fetch_odds_for_day(date_obj, quota, usage=usage)
+
+        if rows is None:
+            ledger.commit(date_str, None, final=False, status="error")
+        else:
+            if not rows:
+                print(f"⚠️ No odds found for {date_str}")
+            ledger.commit(date_str, rows, final=date_str < today_str,
+                          status="done" if rows else "empty", cost=usage["cost"])
+
+        with lock:
+            state["in_flight"] -= 1
+            if rows is not None:
+                state["fetched"] += 1
+                state["new"] += len(rows)
+                state["since_compact"] += 1
+            due = state["since_compact"] >= COMPACT_EVERY
+            if due:
+                state["since_compact"] = 0
+        if due:
+            compact()
+
+    print(f"📋 {len(todo)} day(s) to fetch with {workers} worker(s)")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(fetch_day, todo))
+    finally:
+        compact()
+
+    print(f"📊 Fetched {state['fetched']}/{len(todo)} day(s); quota {quota.summary()}")
+    if state["stopped"]:
+        print("ℹ️ Quota reserve reached — rerun later to resume from the ledger.")
+    if not state["new"]:
         print("❌ No new odds scraped.")
 
 # === Merge Scores ===
 def merge_with_model_results():
     print("🔗 Merging odds and scores...")
 
-    if not os.path.exists(ODDS_CSV):
+    if not storage.exists(ODDS_TABLE):
         print("⚠️ Missing odds file.")
         sys.exit(1)
 
     try:
-        odds = normalize_merge_keys(pd.read_csv(ODDS_CSV))
+        odds = normalize_merge_keys(storage.read_table(ODDS_TABLE))
     except Exception as e:
         print(f"❌ Failed to load odds: {e}")
         sys.exit(1)
 
-    if os.path.exists(BOXSCORE_CSV):
+    if storage.exists(BOXSCORE_TABLE):
         try:
-            scores = normalize_merge_keys(pd.read_csv(BOXSCORE_CSV))
-            scores = scores.drop_duplicates(subset=["Game Date", "Home Team", "Away Team"], keep="last")
+            scores = normalize_merge_keys(storage.read_table(BOXSCORE_TABLE))
+            scores = scores.dropna(subset=["game_key"]).drop_duplicates(subset=["game_key"], keep="last")
 
-            # Use a merge key to ensure proper join
-            odds["merge_key"] = odds["Game Date"] + "|" + odds["Home Team"] + "|" + odds["Away Team"]
-            scores["merge_key"] = scores["Game Date"] + "|" + scores["Home Team"] + "|" + scores["Away Team"]
-
-            # Drop keys to avoid overwrite
+            # Join on the packed game_key; drop the score side's names/date to avoid overwrite
             scores_clean = scores.drop(columns=["Game Date", "Home Team", "Away Team"])
 
             # ⚠️ DO NOT replace 0.0 with NaN here
 
-            merged = pd.merge(odds, scores_clean, on="merge_key", how="left")
-            merged[["Game Date", "Home Team", "Away Team"]] = merged["merge_key"].str.split("|", expand=True)
-            merged.drop(columns=["merge_key"], inplace=True)
+            merged = pd.merge(odds, scores_clean, on="game_key", how="left")
 
         except Exception as e:
             print(f"❌ Failed to merge with scores: {e}")
@@ -193,8 +304,8 @@ def merge_with_model_results():
     else:
         merged = odds
 
-    merged.to_csv(MERGED_CSV, index=False)
-    print(f"✅ Merged dataset saved to {MERGED_CSV} ({len(merged)} rows)")
+    storage.write_table(merged, MERGED_TABLE)
+    print(f"✅ Merged dataset saved to {storage.table_path(MERGED_TABLE)} ({len(merged)} rows)")
 
     # 🧪 Show some samples for debugging
     merged_check = merged[merged["Game Date"] == "2025-04-18"]
@@ -208,8 +319,18 @@ def merge_with_model_results():
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--update-existing", action="store_true", help="Update odds for existing dates")
+    parser.add_argument("--start", default=START_DATE.strftime("%Y-%m-%d"), help="First day to fetch (YYYY-MM-DD), any season")
+    parser.add_argument("--end", default=END_DATE.strftime("%Y-%m-%d"), help="Last day to fetch (YYYY-MM-DD)")
+    parser.add_argument("--replay-only", action="store_true", help="Serve every request from the HTTP cache")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Concurrent day requests")
+    parser.add_argument("--reserve", type=int, default=QUOTA_RESERVE, help="API credits to leave untouched")
     args = parser.parse_args()
-
-    print("🚀 Starting odds scrape from 2025-03-27 to today + 1...")
-    scrape_range(START_DATE, END_DATE, update_existing=args.update_existing)
+    if args.replay_only:
+        http_cache.REPLAY_ONLY = True
+
+    start = datetime.strptime(args.start, "%Y-%m-%d")
+    end = datetime.strptime(args.end, "%Y-%m-%d")
+    print(f"🚀 Starting odds scrape from {args.start} to {args.end}...")
+    scrape_range(start, end, update_existing=args.update_existing,
+                 workers=args.workers, reserve=args.reserve)
     merge_with_model_results()
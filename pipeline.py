@@ -0,0 +1,185 @@
+﻿# pipeline.py
+# In-process DAG runner for the daily pipeline (see ScratchModelV3_1.py).
+#
+# Each Stage declares the tables it reads and writes; a stage depends on whichever stages
+# write its inputs (plus any listed in `after`). Stages run in one interpreter, so pandas,
+# sklearn and xgboost are imported once, and tables are handed over in memory through
+# storage's in-memory hand-off. Stages whose dependencies are done run in parallel on a
+# thread pool; a failed stage skips everything downstream of it, and the run reports it.
+#
+# Stages are memoized by stage_cache.py: a stage whose input tables, source files, game
+# store tables, code and params hash to a key seen before is skipped and its outputs are restored from the cache.
+# Stages with outside effects (scrapes, publishing) set cache=False.
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import stage_cache
+import storage
+
+
+class StageFailed(RuntimeError):
+    """Raised by run() when any stage failed or was skipped."""
+
+
+class Stage:
+    """One pipeline step: a callable (or a script run in-process) with its tables.
+
+    `sources` are files read outside storage, `store` game store (SQLite) tables it reads,
+    `code` extra modules whose changes should invalidate the cached outputs, `params`
+    anything else the result depends on.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), after=(), sources=(), store=(), code=(), params=None,
+                 cache=True):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.after = tuple(after)
+        self.sources = tuple(sources)
+        self.store = tuple(store)
+        self.code = tuple(code)
+        self.params = params or {}
+        self.cache = cache
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+def script(path):
+    """A stage body that runs a top-level script in this process (as if `python path`).
+
+    The script gets its own globals; unlike runpy this leaves sys.modules["__main__"] and
+    sys.argv alone, so scripts can run side by side in threads.
+    """
+    def run():
+        code = compile(Path(path).read_text(encoding="utf-8-sig"), path, "exec")
+        exec(code, {"__name__": "__main__", "__file__": path})
+    run.__name__ = run.path = path
+    return run
+
+
+def dependencies(stages):
+    """Stage name -> names of the stages it waits for."""
+    writers = {}
+    for stage in stages:
+        for table in stage.outputs:
+            if table in writers:
+                raise ValueError(f"Table '{table}' is written by both {writers[table]} and {stage.name}")
+            writers[table] = stage.name
+    names = {stage.name for stage in stages}
+    deps = {}
+    for stage in stages:
+        unknown = set(stage.after) - names
+        if unknown:
+            raise ValueError(f"{stage.name} runs after unknown stage(s): {sorted(unknown)}")
+        deps[stage.name] = {writers[t] for t in stage.inputs if t in writers} | set(stage.after)
+        deps[stage.name].discard(stage.name)
+
+    # Reject cycles up front (Kahn's algorithm)
+    remaining = {name: set(d) for name, d in deps.items()}
+    while remaining:
+        ready = [name for name, d in remaining.items() if not d]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for d in remaining.values():
+            d.difference_update(ready)
+    return deps
+
+
+def run(stages, workers=4, only=None, skip=(), use_cache=True):
+    """Runs `stages` in dependency order; returns {stage name: "done" | "failed" | "skipped"}.
+
+    `only` limits the run to those stage names and everything they depend on; `skip`
+    leaves stages out, counting them as satisfied (their outputs are used as stored);
+    use_cache=False re-runs every stage (fresh outputs are still cached).
+    Raises StageFailed after the run if anything failed or was skipped.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    unknown = sorted((set(only or ()) | set(skip)) - set(by_name))
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)}")
+    deps = dependencies(stages)
+    if only:
+        wanted, todo = set(), list(only)
+        while todo:
+            name = todo.pop()
+            if name not in wanted:
+                wanted.add(name)
+                if name not in skip:
+                    todo.extend(deps[name])
+        deps = {name: deps[name] for name in deps if name in wanted}
+    deps = {name: d - set(skip) for name, d in deps.items() if name not in skip}
+
+    status, decisions = {}, {}
+    storage.keep_in_memory(True)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            while len(status) < len(deps):
+                for name, d in deps.items():
+                    if name in status or name in running.values():
+                        continue
+                    blocked = sorted(dep for dep in d if status.get(dep) in ("failed", "skipped"))
+                    if blocked:
+                        status[name] = "skipped"
+                        print(f"⏭ {name}: skipped ({', '.join(blocked)} did not finish)")
+                    elif all(status.get(dep) == "done" for dep in d):
+                        print(f"▶️ {name}")
+                        running[pool.submit(_run_stage, by_name[name], use_cache)] = name
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        decisions[name] = future.result()
+                        status[name] = "done"
+                        d = decisions[name]
+                        if d["result"] == "hit":
+                            print(f"♻️ {name}: unchanged inputs, outputs restored from cache ({d['seconds']:.1f}s)")
+                        else:
+                            why = f" — {'; '.join(d['reasons'])}" if d["reasons"] else ""
+                            print(f"✅ {name} ({d['seconds']:.1f}s){why}")
+                    except Exception:
+                        status[name] = "failed"
+                        print(f"❌ {name} failed:\n{traceback.format_exc()}")
+    finally:
+        storage.keep_in_memory(False)
+        for name, s in status.items():
+            decisions.setdefault(name, {"result": s, "reasons": [], "seconds": 0.0})
+        stage_cache.record_run(decisions)
+        stage_cache.evict()
+
+    bad = sorted(name for name, s in status.items() if s != "done")
+    if bad:
+        raise StageFailed(f"Stages not completed: {', '.join(f'{n} ({status[n]})' for n in bad)}")
+    return status
+
+
+def _run_stage(stage, use_cache):
+    """Runs one stage (or restores it from the cache); returns its cache decision."""
+    start = time.perf_counter()
+    key = None
+    if not stage.cache:
+        decision = {"result": "uncached", "reasons": []}
+    else:
+        key, parts = stage_cache.stage_key(stage)
+        entry = stage_cache.lookup(key) if use_cache else None
+        if entry is not None:
+            stage_cache.restore(entry)
+            stage_cache.touch(key)
+            return {"result": "hit", "reasons": [], "seconds": time.perf_counter() - start}
+        decision = {"result": "miss", "reasons": stage_cache.explain(stage, parts) if use_cache else ["--no-cache"]}
+    try:
+        stage.run()
+    except SystemExit as e:  # scripts and scrapers bail out with sys.exit(1)
+        if e.code not in (None, 0):
+            raise RuntimeError(f"{stage.name} exited with status {e.code}") from None
+    if key is not None:
+        stage_cache.save(stage, key, parts)
+    return {**decision, "seconds": time.perf_counter() - start}
@@ -1,43 +1,77 @@
-﻿import pandas as pd
-import joblib
-import numpy as np
+﻿import numpy as np
 from pathlib import Path
-from sklearn.preprocessing import OneHotEncoder
+import features
+import game_store
+import inference
+import stage_cache
+import storage
 
 # === Setup paths ===
 DATA_DIR = Path("data")
 MODEL_DIR = Path("model")
 MODEL_PATH = MODEL_DIR / "yrfi_xgb_model.pkl"
 ENCODER_PATH = MODEL_DIR / "yrfi_encoder.pkl"
+OUTPUT_TABLE = "yrfi_predictions_pregame_with_odds"
+STATE_NAME = "predict_today"
 
-# ✅ Use the same enriched dataset used during training
-df = pd.read_csv(DATA_DIR / "yrfi_model_input_with_era_and_team_rates.csv", parse_dates=["date"])
-df["day_of_week"] = df["date"].dt.dayofweek
 
-# === Build same_hand column
-if "away_hand" in df.columns and "home_hand" in df.columns:
-    df["same_hand"] = (df["away_hand"] == df["home_hand"]).astype(int)
-else:
-    df["same_hand"] = 0
+def month_digests(table):
+    """{"YYYY-MM": file digest} of a table's month partitions ({} if it isn't partitioned)."""
+    if not storage.is_partitioned(table):
+        return {}
+    months = {f"{p.parent.name.split('=')[1]}-{p.stem.split('=')[1]}": stage_cache.file_digest(p)
+              for p in storage.partitions(table)}
+    stage_cache.save_digests()
+    return months
+
 
-# === Define features used by the model
-categorical_cols = ["away_team", "home_team", "away_hand", "home_hand"]
-numeric_cols = [
-    "home_era", "away_era", "home_team_avg_1st", "away_team_avg_1st",
-    "day_of_week", "same_hand"
-]
-required_cols = categorical_cols + numeric_cols
-df = df.dropna(subset=required_cols)
+# === Predict
+# ✅ Use the same enriched dataset used during training, prepared once in the feature
+# cache (see features.py). The inference bundle (see inference.py) scores it with NumPy;
+# without one, fall back to the joblib model + encoder.
+bundle_path = inference.latest()
+if bundle_path is not None:
+    bundle = inference.load(bundle_path)
+    rows, _ = features.cached_rows()
+    model_version = f"bundle:{bundle.version}"
+    print(f"📦 Scoring with inference bundle {bundle.version}")
+    score = lambda pos: bundle.predict_proba(rows.iloc[pos])
+else:
+    import joblib
+    encoder = joblib.load(ENCODER_PATH)
+    model = joblib.load(MODEL_PATH)
+    fm = features.cached(encoder, layout=features.model_layout(model))
+    rows = fm.rows
+    model_version = f"joblib:{stage_cache.file_digest(MODEL_PATH)[:16]}:{features.encoder_version(encoder)}"
+    score = lambda pos: model.predict_proba(features._take(fm.X, pos))[:, 1]
 
-# === Encode categoricals + stack features
-encoder = joblib.load(ENCODER_PATH)
-X_cat = encoder.transform(df[categorical_cols])
-X_num = df[numeric_cols].values
-X = np.hstack([X_cat, X_num])
+# 🗓 Only the months of the feature table that changed since the last run (same model) are
+# looked at; the output already holds every other month, unless something else (another
+# writer, a stage-cache restore) changed it since
+months = month_digests(features.SOURCE_TABLE)
+state = game_store.get_state(STATE_NAME) or {}
+incremental = (bool(months) and state.get("model_version") == model_version
+               and set(state.get("months", {})) <= set(months)
+               and state.get("output") == month_digests(OUTPUT_TABLE))
+if incremental:
+    changed_months = [m for m, digest in months.items() if state["months"].get(m) != digest]
+    open_pos = np.flatnonzero(rows["date"].dt.strftime("%Y-%m").isin(changed_months).to_numpy())
+else:
+    open_pos = np.arange(len(rows))
 
-# === Load model + predict
-model = joblib.load(MODEL_PATH)
-df["YRFI_Prob"] = model.predict_proba(X)[:, 1]
+# ♻️ Within those, only games with no cached prediction, or whose feature row or model changed
+# since, are scored; everything else reuses its probability from game_store's prediction_cache
+df = rows.iloc[open_pos].reset_index(drop=True)
+row_hash = features.row_hashes(df)
+cache = game_store.cached_predictions(model_version)
+known = df[["game_key"]].assign(row_hash=row_hash).merge(cache, on=["game_key", "row_hash"], how="left")
+prob = known["yrfi_prob"].to_numpy(dtype=float)
+todo = np.flatnonzero(np.isnan(prob))
+if len(todo):
+    prob[todo] = score(open_pos[todo])
+df["YRFI_Prob"] = prob
+print(f"♻️ {len(df)} games in changed months: reused {len(df) - len(todo)} cached predictions, "
+      f"scored {len(todo)} new or changed games")
 df["NRFI_Prob"] = 1 - df["YRFI_Prob"]
 
 # === Add Fireball Confidence
@@ -61,7 +95,21 @@ df.rename(columns={
     "home_hand": "Home Hand"
 }, inplace=True)
 
-output_path = DATA_DIR / "yrfi_predictions_pregame_with_odds.csv"
-df.to_csv(output_path, index=False)
+if not incremental:
+    storage.write_table(df, OUTPUT_TABLE)
+elif len(df):
+    # Rewrite only the changed months (df holds all of their games); the CSV export is
+    # refreshed at publish (storage.export_stale_csv)
+    storage.write_partitions(df, OUTPUT_TABLE)
+changed = df.iloc[todo]
+game_store.upsert_predictions(changed)
+game_store.upsert_prediction_cache(
+    changed[changed["game_key"].notna()]
+    .assign(row_hash=row_hash[todo], model_version=model_version, yrfi_prob=changed["YRFI_Prob"])
+    [["game_key", "row_hash", "model_version", "yrfi_prob"]]
+)
+game_store.set_state(STATE_NAME, {"model_version": model_version, "months": months,
+                                  "output": month_digests(OUTPUT_TABLE)})
+output_path = storage.table_path(OUTPUT_TABLE)
 print(f"✅ Saved predictions to {output_path}")
 
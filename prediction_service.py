@@ -0,0 +1,381 @@
+﻿# prediction_service.py
+# Resident YRFI scoring service on localhost HTTP, so callers don't pay the model and
+# feature load on every prediction.
+#
+# The service keeps the inference bundle (inference.py), the prepared feature rows and
+# their model matrix in memory, indexed by game_key. Requests are micro-batched: requests
+# that arrive together (within YRFI_SERVICE_BATCH_MS) are scored in one matrix pass, while
+# a lone request is scored straight away.
+# A watcher reloads the warm state when save_yrfi_model.py exports a new bundle or the
+# feature table changes.
+#
+#   POST /predict  {"games": [game, ...]}  ->  {"model": version, "predictions": [...]}
+#                  a game is {"game_key": k}, {"date", "home_team", "away_team"[, "game_number"]}
+#                  or a full feature row (date + every features.REQUIRED_COLS column)
+#   GET  /health   bundle version, rows held, requests and batches served
+#   POST /reload   reload the bundle and feature rows now
+#
+#   python prediction_service.py                          # serve on 127.0.0.1:8765
+#   python prediction_service.py --query 2025-04-18 "New York Yankees" "Tampa Bay Rays"
+#
+#   YRFI_SERVICE_PORT       port (default 8765; the service only binds to 127.0.0.1)
+#   YRFI_SERVICE_BATCH_MS   micro-batch window in milliseconds (default 2)
+#   YRFI_SERVICE_REFRESH    seconds between checks for a new bundle or feature table (default 30)
+import argparse
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import features
+import inference
+import stage_cache
+import teams
+
+HOST = "127.0.0.1"
+PORT = int(os.environ.get("YRFI_SERVICE_PORT", "8765"))
+BATCH_WINDOW = float(os.environ.get("YRFI_SERVICE_BATCH_MS", "2")) / 1000
+REFRESH_SECONDS = float(os.environ.get("YRFI_SERVICE_REFRESH", "30"))
+MAX_BATCH = 4096  # games per scoring pass
+ROW_FIELDS = ["date", "away_team", "home_team"]
+
+
+class ServiceUnavailable(ConnectionError):
+    """Raised by the client helpers when no service answers."""
+
+
+# === Warm state ===
+class Scorer:
+    """The bundle, the prepared rows and their matrix, indexed by game_key.
+
+    load() builds a new state and swaps it in whole, so a batch always scores against
+    one consistent bundle + rows pair.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.load()
+
+    def signature(self):
+        pointer = inference.BUNDLE_DIR / "LATEST"
+        files = stage_cache.table_files(features.SOURCE_TABLE) + [pointer]
+        return tuple((str(p), p.stat().st_size, p.stat().st_mtime_ns) for p in files if p.exists())
+
+    def load(self):
+        with self.lock:
+            signature = self.signature()
+            bundle = inference.load()
+            rows, _ = features.cached_rows()
+            keys = rows["game_key"]
+            valid = keys.notna().to_numpy()
+            self.state = {
+                "bundle": bundle,
+                "rows": rows[ROW_FIELDS].assign(date=rows["date"].dt.strftime("%Y-%m-%d")).to_dict("records"),
+                "X": bundle.matrix(rows),
+                "index": dict(zip(keys[valid].astype("int64").tolist(), np.flatnonzero(valid).tolist())),
+                "loaded": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self.loaded_signature = signature
+        print(f"🔥 Scoring service ready: bundle {bundle.version}, {len(rows)} rows")
+
+    def watch(self, interval=REFRESH_SECONDS):
+        while True:
+            time.sleep(interval)
+            try:
+                if self.signature() != self.loaded_signature:
+                    print("🔄 Bundle or feature table changed, reloading")
+                    self.load()
+            except Exception as e:  # keep serving the state we have
+                print(f"⚠️ Reload failed: {e}")
+
+    def score(self, games):
+        """One result dict per game: its probabilities, or an "error".
+
+        Every game is checked on its own, so a malformed one gets its own error instead of
+        failing the batch it shares with other requests.
+        """
+        state = self.state
+        results = [None] * len(games)
+        positions, slots, adhoc, adhoc_slots = [], [], [], []
+        for i, game in enumerate(games):
+            if not isinstance(game, dict):
+                results[i] = {"error": "a game must be a JSON object"}
+            elif all(col in game for col in features.REQUIRED_COLS if col not in ("day_of_week", "same_hand")):
+                error = _row_error(game)
+                if error:
+                    results[i] = {"error": error, **{col: game.get(col) for col in ROW_FIELDS}}
+                else:
+                    adhoc.append(game)
+                    adhoc_slots.append(i)
+            else:
+                try:
+                    key = game.get("game_key")
+                    if key is None:
+                        key = teams.one_game_key(game.get("date"), game.get("home_team"), game.get("away_team"),
+                                                 game.get("game_number", 1))
+                    pos = None if key is None else state["index"].get(int(key))
+                except (TypeError, ValueError, OverflowError):
+                    results[i] = {"error": "game_key and game_number must be integers", **game}
+                    continue
+                if pos is None:
+                    results[i] = {"error": "unknown game (no feature row for it)", **game}
+                else:
+                    positions.append(pos)
+                    slots.append(i)
+
+        bundle = state["bundle"]
+        if positions:
+            proba = bundle.predict_matrix(state["X"][positions])
+            for i, pos, p in zip(slots, positions, proba):
+                results[i] = _result(state["rows"][pos], p)
+        if adhoc:
+            try:
+                proba = _score_rows(bundle, adhoc)
+            except Exception:
+                # Something the checks missed: score the rows one by one to find the culprit
+                proba = []
+                for game in adhoc:
+                    try:
+                        proba.append(_score_rows(bundle, [game])[0])
+                    except Exception as e:
+                        proba.append(e)
+            for i, game, p in zip(adhoc_slots, adhoc, proba):
+                row = {col: game.get(col) for col in ROW_FIELDS}
+                results[i] = {"error": f"can't score this row: {p}", **row} if isinstance(p, Exception) else _result(row, p)
+        return results
+
+
+def _row_error(game):
+    """Why an ad-hoc feature row can't be scored, or None."""
+    try:
+        if pd.isna(pd.to_datetime(game.get("date"), errors="coerce")):
+            return "date must be a date"
+    except (TypeError, ValueError):
+        return "date must be a date"
+    for col in features.CATEGORICAL_COLS:
+        if not (game.get(col) is None or isinstance(game[col], str)):
+            return f"{col} must be a string"
+    for col in features.NUMERIC_COLS:
+        if game.get(col) is not None:
+            try:
+                float(game[col])
+            except (TypeError, ValueError):
+                return f"{col} must be a number"
+    return None
+
+
+def _score_rows(bundle, games):
+    frame = pd.DataFrame(games)
+    frame["date"] = pd.to_datetime(frame["date"], errors="coerce")
+    for col in features.NUMERIC_COLS:
+        if col in frame.columns:
+            frame[col] = pd.to_numeric(frame[col])
+    return bundle.predict_proba(features.add_derived(frame))
+
+
+def _result(row, p):
+    p = float(p)
+    return {**row, "YRFI_Prob": round(p, 6), "NRFI_Prob": round(1 - p, 6)}
+
+
+# === Micro-batching ===
+class Batcher:
+    """Scores queued requests together.
+
+    After taking a request, the batcher waits up to `window` seconds for the other requests
+    already being received (see expecting()), so a lone request is scored at once and
+    concurrent ones share a scoring pass.
+    """
+
+    def __init__(self, scorer, window=BATCH_WINDOW, max_games=MAX_BATCH):
+        self.scorer = scorer
+        self.window = window
+        self.max_games = max_games
+        self.queue = queue.Queue()
+        self.requests = self.batches = 0
+        self.active = 0  # requests between arrival and their result
+        self.lock = threading.Lock()
+        threading.Thread(target=self._run, name="batcher", daemon=True).start()
+
+    @contextmanager
+    def expecting(self):
+        with self.lock:
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def submit(self, games, timeout=30):
+        future = Future()
+        self.queue.put((games, future))
+        return future.result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            pending = [self.queue.get()]
+            size = len(pending[0][0])
+            deadline = time.perf_counter() + self.window
+            while size < self.max_games and len(pending) < self.active:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            try:
+                results = self.scorer.score([game for games, _ in pending for game in games])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.requests += len(pending)
+            self.batches += 1
+            start = 0
+            for games, future in pending:
+                future.set_result(results[start:start + len(games)])
+                start += len(games)
+
+
+# === HTTP ===
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so a client reuses one connection
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, self.server.health())
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path == "/predict":
+            with self.server.batcher.expecting():
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                except ValueError:
+                    return self._reply(400, {"error": "request body is not JSON"})
+                games = body.get("games", [body]) if isinstance(body, dict) else body
+                if not isinstance(games, list):
+                    return self._reply(400, {"error": '"games" must be a list'})
+                try:
+                    predictions = self.server.batcher.submit(games)
+                except Exception as e:
+                    return self._reply(500, {"error": str(e)})
+            self._reply(200, {"model": self.server.scorer.state["bundle"].version, "predictions": predictions})
+        elif self.path == "/reload":
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.server.scorer.load()
+            self._reply(200, self.server.health())
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # one line per request would drown the batch stats
+
+
+class Service(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=PORT, window=BATCH_WINDOW):
+        self.scorer = Scorer()
+        self.batcher = Batcher(self.scorer, window)
+        super().__init__((HOST, port), Handler)
+
+    def health(self):
+        state = self.scorer.state
+        return {
+            "model": state["bundle"].version,
+            "layout": state["bundle"].schema["layout"],
+            "rows": len(state["rows"]),
+            "loaded": state["loaded"],
+            "requests": self.batcher.requests,
+            "batches": self.batcher.batches,
+        }
+
+
+def serve(port=PORT, window=BATCH_WINDOW):
+    service = Service(port, window)
+    threading.Thread(target=service.scorer.watch, name="watcher", daemon=True).start()
+    print(f"🌐 Listening on http://{HOST}:{port} (batch window {window * 1000:.1f} ms)")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 Scoring service stopped")
+
+
+# === Client ===
+_local = threading.local()
+
+
+def _request(method, path, payload=None, port=PORT, timeout=5.0):
+    # One keep-alive connection per thread; reconnect once if the service dropped it
+    for attempt in range(2):
+        conn = getattr(_local, "conn", None)
+        if conn is None or conn.port != port:
+            conn = _local.conn = http.client.HTTPConnection(HOST, port, timeout=timeout)
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = json.loads(response.read())
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            _local.conn = None
+            if attempt:
+                raise ServiceUnavailable(f"No scoring service on {HOST}:{port} ({e})") from None
+            continue
+        if response.status != 200:
+            raise RuntimeError(f"Scoring service: {data.get('error', response.status)}")
+        return data
+
+
+def predict(games, port=PORT, timeout=5.0):
+    """YRFI/NRFI probabilities for a list of games (see the header) from a running service."""
+    return _request("POST", "/predict", {"games": list(games)}, port, timeout)["predictions"]
+
+
+def health(port=PORT):
+    return _request("GET", "/health", port=port, timeout=1.0)
+
+
+def available(port=PORT):
+    try:
+        health(port)
+        return True
+    except ServiceUnavailable:
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--batch-ms", type=float, default=BATCH_WINDOW * 1000, help="Micro-batch window")
+    parser.add_argument("--query", nargs=3, metavar=("DATE", "AWAY", "HOME"),
+                        help="Ask a running service about one game instead of serving")
+    args = parser.parse_args()
+
+    if args.query:
+        date, away, home = args.query
+        for p in predict([{"date": date, "away_team": away, "home_team": home}], port=args.port):
+            print(json.dumps(p, indent=1))
+    else:
+        serve(args.port, args.batch_ms / 1000)
@@ -2,13 +2,15 @@
 import pandas as pd
 from pathlib import Path
 import re
+import storage
 
 DATA_DIR = Path("data")
-input_path = DATA_DIR / "boxscores_with_starters.csv"
-output_path = DATA_DIR / "yrfi_model_input.csv"
+output_path = storage.table_path("yrfi_model_input")
 
 # Load data
-df = pd.read_csv(input_path, parse_dates=["date"])
+df = storage.read_table("boxscores_with_starters", columns=[
+    "date", "away_team", "home_team", "away_starter", "home_starter", "Away 1st", "Home 1st", "Away Score", "Home Score", "game_key"
+])
 
 # Drop rows with missing or placeholder starters
 df = df.dropna(subset=["home_starter", "away_starter"])
@@ -26,22 +28,23 @@ df["home_hand"] = df["home_starter"].apply(extract_hand)
 # Drop rows where handedness wasn't found (just to keep it clean)
 df = df.dropna(subset=["away_hand", "home_hand"])
 
-# Create YRFI label
-df["yrfi"] = ((df["Away 1st"] > 0) | (df["Home 1st"] > 0)).astype(int)
+# Create YRFI label; empty until the game is final (scores are only stored for final games)
+finished = df["Away Score"].notna() & df["Home Score"].notna()
+df["yrfi"] = ((df["Away 1st"] > 0) | (df["Home 1st"] > 0)).astype(int).where(finished)
 
-# Remove any duplicate games
-df = df.drop_duplicates(subset=["date", "home_team", "away_team"])
+# Remove any duplicate games (game_key keeps both games of a doubleheader)
+df = df.drop_duplicates(subset=[c for c in ["date", "home_team", "away_team", "game_key"] if c in df.columns])
 
 # Final output
 model_df = df[[
     "date", "away_team", "home_team",
     "away_starter", "away_hand",
     "home_starter", "home_hand",
-    "Away 1st", "Home 1st", "yrfi"
+    "Away 1st", "Home 1st", "Away Score", "Home Score", "yrfi"
 ]]
 
 # Save output
-model_df.to_csv(output_path, index=False)
+storage.write_table(model_df, "yrfi_model_input")
 print(f"✅ YRFI model input saved to: {output_path.resolve()}")
 print("🧪 Preview:")
 print(model_df.head())
@@ -0,0 +1,173 @@
+﻿# rotowire.py
+# Parser for the Rotowire projected-starters download (data/rotowire-projstarters.csv).
+#
+# The download is wide: one column per date, and per team a block of three rows
+#   ATL    "C. Sale (L)"    starter (or OFF DAY / POSTPONED / ---)
+#   game   "L4-7 @ SD"      result, or "Sun 1:35pm vs MIA" before the game
+#   stats  "0-2 6.63 ERA"   starter's record and ERA going in
+# parse_starters() turns every block into tidy rows in one vectorized pass: team, date,
+# starter, pitcher, hand, opponent, home, game_time, result, record, era. A team with a
+# second block (doubleheaders) gets game_number 2 for those dates.
+#
+# The date columns look like "Thu 3/27" and carry no year. The labels' weekdays pin it
+# down: the season is the latest year (not after this one) in which every label's
+# month/day falls on its weekday, unless ROTOWIRE_SEASON is set. Only when the labels
+# can't decide is the download's mtime used, with a warning.
+import os
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STARTERS_CSV = Path("data") / "rotowire-projstarters.csv"
+
+STARTER_RE = r"^(?P<pitcher>.+?)\s*\((?P<hand>[LR])\)\s*$"
+GAME_RE = (
+    r"^(?:(?P<result>[WLT]\d+-\d+)|\w{3}\s+(?P<game_time>\d{1,2}:\d{2}\s*[ap]m))?"
+    r"\s*(?P<site>vs|@)\s+(?P<opponent>[A-Z]+)"
+)
+STATS_RE = r"(?P<record>\d+-\d+)\s+(?P<era>\d+\.\d+)\s*ERA"
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+COLUMNS = [
+    "team", "date", "game_number", "starter", "pitcher", "hand", "opponent", "home",
+    "game_time", "result", "record", "era",
+]
+
+
+def downloaded_at(path=STARTERS_CSV):
+    """When the download was saved (its mtime); its stats column is as of this moment."""
+    return pd.Timestamp(datetime.fromtimestamp(Path(path).stat().st_mtime))
+
+
+def _label_parts(label):
+    """'Thu 3/27' -> (weekday, month, day), or None when the label isn't a date."""
+    try:
+        weekday, month_day = str(label).split()
+        month, day = (int(x) for x in month_day.split("/"))
+        return WEEKDAYS.index(weekday[:3].title()), month, day
+    except ValueError:
+        return None
+
+
+def season_from_labels(labels, latest=None, earliest=1990):
+    """Latest year up to `latest` (default: this year) whose calendar fits every label."""
+    parts = {p for p in map(_label_parts, labels) if p is not None}
+    if not parts:
+        return None
+    for year in range(latest or date.today().year, earliest - 1, -1):
+        try:
+            if all(date(year, month, day).weekday() == weekday for weekday, month, day in parts):
+                return year
+        except ValueError:  # Feb 29 outside a leap year
+            continue
+    return None
+
+
+def season_reference(path=STARTERS_CSV, labels=None):
+    """Date the download's labels are resolved against (mid-season of its year).
+
+    `labels` are the date column labels (read from the file's header when not given).
+    """
+    season = os.environ.get("ROTOWIRE_SEASON")
+    if not season:
+        try:
+            if labels is None:
+                labels = pd.read_csv(path, nrows=0).columns[1:]
+            season = season_from_labels(labels)
+            if season is None:
+                print(f"⚠️ Can't tell the season from the date labels in {path}; using the file's "
+                      "modification date (set ROTOWIRE_SEASON to override)")
+                return downloaded_at(path).normalize()
+        except OSError:
+            return pd.Timestamp.today().normalize()
+    return pd.Timestamp(year=int(season), month=7, day=1)
+
+
+@lru_cache(maxsize=4096)
+def slate_date(label, reference):
+    """'Thu 3/27' -> Timestamp, or NaT when the label isn't a date."""
+    parts = _label_parts(label)
+    if parts is None:
+        return pd.NaT
+    wanted, month, day = parts
+    ref = reference.date()
+    candidates = []
+    for year in range(ref.year - 11, ref.year + 2):
+        try:
+            d = date(year, month, day)
+        except ValueError:  # Feb 29, or not a date at all
+            continue
+        if d.weekday() == wanted:
+            candidates.append(d)
+    if not candidates:
+        return pd.NaT
+    return pd.Timestamp(min(candidates, key=lambda d: abs(d - ref)))
+
+
+def slate_dates(labels, reference=None):
+    """Maps each column label to its date (NaT for non-date labels)."""
+    reference = season_reference(labels=labels) if reference is None else pd.Timestamp(reference)
+    return {label: slate_date(label, reference) for label in labels}
+
+
+def _extract(values, pattern):
+    """str.extract over the distinct values only (starters and ERAs repeat all season)."""
+    codes, uniques = pd.factorize(values)
+    parts = pd.Series(uniques, dtype=object).str.extract(pattern)
+    out = parts.reindex(codes).set_axis(values.index)
+    out[codes == -1] = np.nan
+    return out
+
+
+def parse_starters(raw, reference=None):
+    """Tidy long table from the wide Rotowire frame (as read by pd.read_csv)."""
+    label = raw.iloc[:, 0]
+    date_cols = list(raw.columns[1:])
+    is_team = label.notna() & ~label.isin(["game", "stats"])
+    block = is_team.cumsum()
+
+    values = raw[date_cols].to_numpy(dtype=object)
+    teams = raw[is_team]
+    blocks = block[is_team].to_numpy()
+    cells = {}
+    for kind in ("game", "stats"):
+        # First row of this kind in each team's block (missing -> all empty)
+        rows = np.flatnonzero((label == kind).to_numpy())
+        ids, first = np.unique(block.to_numpy()[rows], return_index=True)
+        pos = pd.Index(ids).get_indexer(blocks)
+        picked = values[rows[first][pos]]
+        picked[pos == -1] = np.nan
+        cells[kind] = picked.ravel()
+    starter = values[is_team.to_numpy()].ravel()
+
+    n_dates = len(date_cols)
+    col_dates = slate_dates(date_cols, reference)
+    df = pd.DataFrame({
+        "team": np.repeat(teams.iloc[:, 0].str.strip().to_numpy(), n_dates),
+        "date": np.tile(pd.DatetimeIndex([col_dates[c] for c in date_cols]), len(teams)),
+        "block": np.repeat(blocks, n_dates),
+        "starter": starter,
+        "game": cells["game"],
+        "stats": cells["stats"],
+    })
+    # Keep cells that say something: a game, or a starter entry other than the "---" filler
+    df = df[df["game"].notna() | (df["starter"].notna() & (df["starter"] != "---"))]
+
+    df = df.join(_extract(df["starter"], STARTER_RE))
+    df = df.join(_extract(df["game"], GAME_RE))
+    df = df.join(_extract(df["stats"], STATS_RE))
+    df["home"] = df["site"].map({"vs": True, "@": False})
+    df["era"] = pd.to_numeric(df["era"])
+    df = df.sort_values(["team", "date", "block"], kind="stable")
+    df["game_number"] = df.groupby(["team", "date"]).cumcount() + 1
+    return df[COLUMNS].reset_index(drop=True)
+
+
+def load_starters(path=STARTERS_CSV, reference=None):
+    """Reads and parses the Rotowire download."""
+    raw = pd.read_csv(path)
+    if reference is None:
+        reference = season_reference(path, labels=raw.columns[1:])
+    return parse_starters(raw, reference)
@@ -1,55 +1,172 @@
 ﻿# save_yrfi_model.py
+# Trains the model the predictors use and saves it (joblib pickles + inference bundle).
+#
+# By default the model is retrained from scratch on all history. --incremental instead
+# appends --daily-rounds boosting rounds to the saved model, fitted on the games labeled
+# since it was last trained plus the --window-days before them, weighted down by age
+# (--half-life days), so a daily refresh costs the day's games, not the season's.
+# Every --check-every days an incremental run also fits the full retrain and compares the
+# two on the recent games; when their probabilities drift apart by more than
+# --drift-threshold it alerts and keeps the full retrain. The online state (last labeled
+# date trained on, rounds appended, drift checks) lives in game_store's state table.
+import argparse
+import sys
 import joblib
 import pandas as pd
 from pathlib import Path
+import features
+import game_store
+import inference
+import storage
+import tune_yrfi_xgb
+from sklearn.metrics import log_loss
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.model_selection import train_test_split
 import xgboost as xgb
 import numpy as np
 
 DATA_DIR = Path("data")
-df = pd.read_csv(DATA_DIR / "yrfi_model_input_with_era_and_team_rates.csv", parse_dates=["date"])
-
-# Prep data (same as training script)
-df["day_of_week"] = df["date"].dt.dayofweek
-df["same_hand"] = (df["away_hand"] == df["home_hand"]).astype(int)
-
-feature_cols = [
-    "home_era", "away_era", "home_team_avg_1st", "away_team_avg_1st",
-    "day_of_week", "same_hand"
-]
-df = df.dropna(subset=feature_cols)
-
-categorical_cols = ["away_team", "home_team", "away_hand", "home_hand"]
-numeric_cols = feature_cols
-
-encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore")
-X_cat = encoder.fit_transform(df[categorical_cols])
-X_num = df[numeric_cols].values
-X = np.hstack([X_cat, X_num])
-y = df["yrfi"]
-
-X_train, _, y_train, _ = train_test_split(
-    X, y, test_size=0.2, stratify=y, random_state=42
-)
-
-# Train model again (just to capture the latest)
-model = xgb.XGBClassifier(
-    objective="binary:logistic",
-    eval_metric="logloss",
-    use_label_encoder=False,
-    n_estimators=100,
-    max_depth=4,
-    learning_rate=0.1,
-    random_state=42
-)
-model.fit(X_train, y_train)
+MODEL_DIR = Path("model")
+MODEL_PATH = MODEL_DIR / "yrfi_xgb_model.pkl"
+ENCODER_PATH = MODEL_DIR / "yrfi_encoder.pkl"
+STATE_NAME = "online_model"
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--layout", choices=features.LAYOUTS,
+                    help="Feature matrix layout the model is trained on (predictors follow it); "
+                         f"default: the one tuned in {tune_yrfi_xgb.BEST_PARAMS_PATH}, else dense")
+parser.add_argument("--defaults", action="store_true",
+                    help=f"Ignore {tune_yrfi_xgb.BEST_PARAMS_PATH} and train with the untuned parameters")
+parser.add_argument("--incremental", action="store_true",
+                    help="Append rounds to the saved model from newly labeled games instead of retraining")
+parser.add_argument("--daily-rounds", type=int, default=5, help="Boosting rounds appended per incremental run")
+parser.add_argument("--window-days", type=int, default=14, help="Days of earlier games refitted alongside the new ones")
+parser.add_argument("--half-life", type=float, default=7.0, help="Age in days at which a game's weight halves")
+parser.add_argument("--max-online-rounds", type=int, default=200,
+                    help="Retrain from scratch once this many rounds have been appended")
+parser.add_argument("--check-every", type=int, default=7, help="Days between drift checks against a full retrain")
+parser.add_argument("--drift-threshold", type=float, default=0.05,
+                    help="Mean absolute probability gap to the full retrain that raises a drift alert")
+args = parser.parse_args()
+
+# Best configuration from tune_yrfi_xgb.py (the untuned defaults until it has run), on the
+# layout it was tuned on unless --layout says otherwise
+params = dict(tune_yrfi_xgb.DEFAULT_PARAMS) if args.defaults else tune_yrfi_xgb.best_params()
+default_layout = None if args.defaults else tune_yrfi_xgb.best_layout()
+
+
+def new_classifier(layout, **overrides):
+    return xgb.XGBClassifier(
+        objective="binary:logistic",
+        eval_metric="logloss",
+        use_label_encoder=False,
+        random_state=42,
+        **{**params, **overrides},
+        **features.xgb_options(layout)
+    )
+
+
+def full_retrain(layout):
+    """(model, encoder, training rows, last labeled date) from all history."""
+    # Prep data (same as training script; shared feature cache)
+    fm = features.cached(OneHotEncoder(sparse_output=False, handle_unknown="ignore"), fit=True, layout=layout)
+    known = features.labeled(fm.rows)
+    y = fm.y[known].astype(int)
+    X_train, _, y_train, _ = train_test_split(
+        features._take(fm.X, np.flatnonzero(known)), y, test_size=0.2, stratify=y, random_state=42
+    )
+    model = new_classifier(layout)
+    model.fit(X_train, y_train)
+    features.tag_layout(model, layout)
+    return model, fm.encoder, len(y_train), fm.rows.loc[known, "date"].max()
+
+
+def labeled_since(start):
+    """Prepared, labeled rows dated `start` or later; only the months holding them are read."""
+    rows = features.prepare(storage.read_table(features.SOURCE_TABLE, start=start))
+    return rows[features.labeled(rows)].sort_values("date", kind="stable").reset_index(drop=True)
+
+
+def probabilities(model, encoder, rows):
+    return model.predict_proba(features.matrix(rows, encoder, layout=features.model_layout(model)))[:, 1]
+
+
+state = game_store.get_state(STATE_NAME) or {}
+model = None
+layout = args.layout or default_layout or "dense"
+if args.incremental and MODEL_PATH.exists() and ENCODER_PATH.exists() and state.get("trained_through"):
+    model = joblib.load(MODEL_PATH)
+    encoder = joblib.load(ENCODER_PATH)  # kept as is: a refit would renumber the columns
+    layout = features.model_layout(model)
+    trained_through = pd.Timestamp(state["trained_through"])
+    rows = labeled_since(trained_through - pd.Timedelta(days=args.window_days - 1))
+    new_games = int((rows["date"] > trained_through).sum())
+    if new_games == 0:
+        print(f"✅ No games labeled since {trained_through.date()}; model unchanged")
+        sys.exit(0)
+    if state.get("online_rounds", 0) + args.daily_rounds > args.max_online_rounds:
+        print(f"🔁 {state['online_rounds']} rounds appended since the last full retrain; retraining from scratch")
+        model = None
+
+if model is not None:
+    # === Incremental: append rounds fitted on the recent games, newest weighted most
+    age_days = (rows["date"].max() - rows["date"]).dt.days.to_numpy()
+    weights = 0.5 ** (age_days / args.half_life)
+    print(f"➕ Appending {args.daily_rounds} rounds from {new_games} newly labeled games "
+          f"({len(rows)} games in the {args.window_days}-day window)")
+    online = new_classifier(layout, n_estimators=args.daily_rounds)
+    online.fit(features.matrix(rows, encoder, layout=layout), rows["yrfi"].astype(int),
+               sample_weight=weights, xgb_model=model.get_booster())
+    features.tag_layout(online, layout)
+    model = online
+    trained_through = rows["date"].max()
+    state["online_rounds"] = state.get("online_rounds", 0) + args.daily_rounds
+    train_rows = len(rows)
+    mode = "incremental"
+
+    # === Scheduled drift check against a full retrain
+    last_check = pd.Timestamp(state.get("last_check", state.get("last_full", trained_through)))
+    if (trained_through - last_check).days >= args.check_every:
+        full_model, full_encoder, full_rows, _ = full_retrain(layout)
+        p_online = probabilities(model, encoder, rows)
+        p_full = probabilities(full_model, full_encoder, rows)
+        y_recent = rows["yrfi"].astype(int)
+        check = {
+            "date": str(trained_through.date()),
+            "mean_abs_gap": round(float(np.mean(np.abs(p_online - p_full))), 4),
+            "logloss_online": round(log_loss(y_recent, p_online, labels=[0, 1]), 4),
+            "logloss_full": round(log_loss(y_recent, p_full, labels=[0, 1]), 4),
+        }
+        state["checks"] = (state.get("checks", []) + [check])[-20:]
+        state["last_check"] = check["date"]
+        print(f"🔍 Drift check vs full retrain: mean |Δp| {check['mean_abs_gap']:.4f}, "
+              f"log loss online {check['logloss_online']:.4f} / full {check['logloss_full']:.4f}")
+        if check["mean_abs_gap"] > args.drift_threshold:
+            print(f"⚠️ DRIFT ALERT: incremental model is {check['mean_abs_gap']:.3f} away from a full retrain "
+                  f"(threshold {args.drift_threshold}); switching to the full retrain")
+            model, encoder, train_rows = full_model, full_encoder, full_rows
+            state["online_rounds"] = 0
+            state["last_full"] = check["date"]
+            mode = "full (drift)"
+else:
+    # === Full retrain on all history
+    model, encoder, train_rows, trained_through = full_retrain(layout)
+    state.update(online_rounds=0, last_full=str(trained_through.date()), last_check=str(trained_through.date()))
+    mode = "full"
+print(f"🎛 {mode} model with {params}")
 
 # Save model + encoder
-MODEL_DIR = Path("model")
 MODEL_DIR.mkdir(exist_ok=True)
 
-joblib.dump(model, MODEL_DIR / "yrfi_xgb_model.pkl")
-joblib.dump(encoder, MODEL_DIR / "yrfi_encoder.pkl")
+joblib.dump(model, MODEL_PATH)
+joblib.dump(encoder, ENCODER_PATH)
+
+# Versioned inference bundle (native JSON booster + category lookup), what predict_today.py loads
+bundle = inference.export(model, encoder, layout, features.CATEGORICAL_COLS, features.NUMERIC_COLS,
+                          meta={"train_rows": int(train_rows), "params": params, "mode": mode,
+                                "trained_through": str(trained_through.date())})
+state["trained_through"] = str(trained_through.date())
+game_store.set_state(STATE_NAME, state)
 
 print("✅ Model and encoder saved to /model/")
+print(f"📦 Inference bundle: {bundle}")
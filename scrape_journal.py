@@ -0,0 +1,136 @@
+﻿# scrape_journal.py
+# Crash-safe, per-day journal for the scrapers.
+#
+# Every finished day is committed on its own: its rows go to data/journal/<name>/<day>.csv
+# (written to a temp file and renamed), then the manifest records the day. A crash loses at
+# most the day in flight, and a restarted run skips every final day already in the manifest.
+# compact() folds journaled days into the stored table with an indexed key upsert; for a
+# partitioned table only the months the new days fall in are read and rewritten (its
+# whole-table CSV export is refreshed later, by storage.export_stale_csv at publish).
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import storage
+
+JOURNAL_DIR = Path("data") / "journal"
+
+
+def atomic_to_csv(df, path):
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def upsert(existing_df, new_df, keys, dedupe_new=False):
+    """Replaces rows of `existing_df` whose keys appear in `new_df`, then appends `new_df`."""
+    if dedupe_new:
+        new_df = new_df.drop_duplicates(subset=keys, keep="last")
+    if existing_df.empty:
+        return new_df.reset_index(drop=True)
+    if new_df.empty:
+        return existing_df.reset_index(drop=True)
+    existing_idx = pd.MultiIndex.from_frame(existing_df[keys].astype(str))
+    new_idx = pd.MultiIndex.from_frame(new_df[keys].astype(str))
+    kept = existing_df[~existing_idx.isin(new_idx)]
+    return pd.concat([kept, new_df], ignore_index=True)
+
+
+class DayJournal:
+    """One CSV per committed day plus a JSON manifest of day -> metadata."""
+
+    def __init__(self, name, manifest_path=None):
+        self.dir = JOURNAL_DIR / name
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = Path(manifest_path) if manifest_path else self.dir / "manifest.json"
+        self.lock = threading.Lock()
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {}
+
+    def _save_manifest(self):
+        tmp = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def entry(self, day):
+        return self.manifest.get(day, {})
+
+    def is_final(self, day):
+        return self.entry(day).get("final", False)
+
+    def commit(self, day, rows, final, **meta):
+        """Persists one day's rows (None = nothing to store, e.g. a failed fetch) and its metadata."""
+        with self.lock:
+            if rows is not None:
+                atomic_to_csv(pd.DataFrame(rows), self.dir / f"{day}.csv")
+            self.manifest[day] = {
+                **meta,
+                "rows": 0 if rows is None else len(rows),
+                "final": final,
+                "compacted": rows is None,
+                "at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._save_manifest()
+
+    def pending(self):
+        return sorted(day for day, entry in self.manifest.items() if not entry.get("compacted", True))
+
+    def compact(self, table, keys, finalize=None, dedupe_new=False, on_new=None):
+        """Upserts every uncompacted day into storage `table`; returns the rewritten rows (or None).
+
+        That is the whole table, or just the touched months when the table is partitioned.
+
+        `on_new`, if given, is called with just the newly compacted rows (e.g. a game_store upsert).
+        """
+        days = self.pending()
+        if not days:
+            return None
+
+        frames = []
+        for day in days:
+            path = self.dir / f"{day}.csv"
+            if path.exists() and self.entry(day)["rows"]:
+                frames.append(pd.read_csv(path))
+        new_df = storage.apply_types(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame()
+        if dedupe_new and not new_df.empty:
+            # Also what on_new sees: the same game journaled on two days is one row
+            new_df = new_df.drop_duplicates(subset=keys, keep="last")
+
+        partitioned = table in storage.PARTITIONED
+        window = {}
+        if partitioned and not new_df.empty:
+            dates = pd.to_datetime(new_df[storage.PARTITIONED[table]]).dropna()
+            if not dates.empty:
+                window = {"start": dates.min().to_period("M").start_time,
+                          "end": dates.max().to_period("M").end_time}
+        if storage.exists(table) and (window or not partitioned):
+            existing_df = storage.read_table(table, **window)
+        else:
+            existing_df = pd.DataFrame()
+        combined = upsert(existing_df, new_df, keys, dedupe_new) if not new_df.empty else existing_df
+        if finalize is not None:
+            combined = finalize(combined)
+        if partitioned:
+            if not combined.empty:
+                # Only the compacted months are rewritten; the whole-table CSV export is
+                # refreshed at publish (storage.export_stale_csv)
+                combined = storage.write_partitions(combined, table)
+        else:
+            combined = storage.write_table(combined, table)
+        if on_new is not None and not new_df.empty:
+            on_new(new_df)
+
+        with self.lock:
+            for day in days:
+                self.manifest[day]["compacted"] = True
+            self._save_manifest()
+        return combined
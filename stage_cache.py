@@ -0,0 +1,277 @@
+﻿# stage_cache.py
+# Content-addressed artifact cache for pipeline stages (see pipeline.py).
+#
+# A stage's key is the sha256 of its name, the content of every table it reads, any extra
+# source files (the Rotowire download, model pickles), the rows of the game store tables it
+# queries, its code and its parameters. After a
+# stage runs, the files of the tables it writes are stored under blobs/<sha256>, and
+# entries/<key>.json maps each output file to its blob. When a later run computes the same
+# key, the stage is skipped and its outputs are restored from the blobs (only files that
+# differ are copied). A stage whose upstream re-ran but wrote identical tables is still a
+# hit, so an intraday refresh re-runs only what sits downstream of data that changed.
+#
+# File digests are remembered by (size, mtime), so unchanged partitions aren't re-read.
+#
+#   YRFI_STAGE_CACHE          cache directory (default data/stage_cache)
+#   YRFI_STAGE_CACHE_DAYS     entries unused this long are dropped (default 14); the
+#                             latest entry of each stage is always kept
+#   YRFI_STAGE_CACHE_MAX_MB   size bound; least recently used entries go first (default 1024)
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import game_store
+import storage
+
+CACHE_DIR = Path(os.environ.get("YRFI_STAGE_CACHE", "data/stage_cache"))
+MAX_AGE_DAYS = float(os.environ.get("YRFI_STAGE_CACHE_DAYS", "14"))
+MAX_CACHE_BYTES = int(os.environ.get("YRFI_STAGE_CACHE_MAX_MB", "1024")) * 1024 * 1024
+
+_lock = threading.Lock()
+_digests = None  # path -> [size, mtime_ns, sha256]
+
+
+def _digest_index_path():
+    return CACHE_DIR / "digests.json"
+
+
+def _entry_path(key):
+    return CACHE_DIR / "entries" / f"{key}.json"
+
+
+def _blob_path(digest):
+    return CACHE_DIR / "blobs" / digest[:2] / digest
+
+
+def _atomic_write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _read_json(path, default=None):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return default
+
+
+def file_digest(path):
+    """sha256 of a file's bytes, recomputed only when its size or mtime changed."""
+    global _digests
+    path = Path(path)
+    stat = path.stat()
+    with _lock:
+        if _digests is None:
+            _digests = _read_json(_digest_index_path(), {})
+        known = _digests.get(str(path))
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    with _lock:
+        _digests[str(path)] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+    return h.hexdigest()
+
+
+def save_digests():
+    with _lock:
+        if _digests is not None:
+            _atomic_write(_digest_index_path(), json.dumps(_digests).encode("utf-8"))
+
+
+def table_files(name):
+    """Every file that holds table `name`: its partitions or parquet file, and its CSV export."""
+    if storage.is_partitioned(name):
+        files = [p for p in storage.partition_dir(name).glob("season=*/month=*.*") if not p.name.endswith(".tmp")]
+    else:
+        files = [storage.parquet_path(name)]
+    files.append(storage.csv_path(name))
+    return sorted(p for p in files if p.exists())
+
+
+def _combine(digests):
+    return hashlib.sha256(json.dumps(digests, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def table_digest(name):
+    # The data files only (the CSV export is derived from them), unless the CSV is all there is.
+    # A flat legacy table is partitioned first, so its digest doesn't change on first read.
+    if name in storage.PARTITIONED:
+        storage.migrate(name)
+    files = table_files(name)
+    data = [p for p in files if p != storage.csv_path(name)] or files
+    return _combine({str(p.relative_to(storage.DATA_DIR)): file_digest(p) for p in data})
+
+
+def code_files(stage):
+    run = stage.run
+    files = [getattr(run, "path", None) or inspect.getsourcefile(run), *stage.code]
+    return sorted({os.path.relpath(f) for f in files if f})
+
+
+def stage_key(stage):
+    """(key, parts): the stage's cache key and what went into it, for explaining misses."""
+    parts = {
+        "inputs": {name: table_digest(name) if storage.exists(name) else None for name in stage.inputs},
+        "sources": {str(p): file_digest(p) if Path(p).exists() else None for p in stage.sources},
+        "store": {table: game_store.table_digest(table) for table in stage.store},
+        "code": {f: file_digest(f) for f in code_files(stage)},
+        "params": json.loads(json.dumps(stage.params, sort_keys=True, default=str)),
+    }
+    return _combine({"stage": stage.name, **parts}), parts
+
+
+def lookup(key):
+    entry = _read_json(_entry_path(key))
+    if entry is None:
+        return None
+    blobs = [d for files in entry["outputs"].values() for d in files.values()]
+    if not all(_blob_path(d).exists() for d in blobs):
+        return None  # a blob was evicted; treat as a miss
+    return entry
+
+
+def explain(stage, parts):
+    """Why `stage` missed: what differs from its latest cached entry."""
+    latest = _read_json(CACHE_DIR / "latest.json", {}).get(stage.name)
+    previous = _read_json(_entry_path(latest)) if latest else None
+    if previous is None:
+        return ["no cached run"]
+    reasons = []
+    for group in ["inputs", "sources", "store", "code"]:
+        before, now = previous["parts"].get(group, {}), parts[group]
+        changed = sorted(k for k in set(before) | set(now) if before.get(k) != now.get(k))
+        if changed:
+            reasons.append(f"{group} changed: {', '.join(changed)}")
+    if previous["parts"].get("params") != parts["params"]:
+        reasons.append("params changed")
+    return reasons or ["cached outputs were evicted"]
+
+
+def restore(entry):
+    """Puts a cached stage's output files back; only files that differ are copied.
+
+    Files go back in sorted order, so a table's parquet lands after (is newer than) its CSV.
+    """
+    restored = 0
+    for name, files in entry["outputs"].items():
+        wanted = {storage.DATA_DIR / rel: digest for rel, digest in sorted(files.items())}
+        for path in table_files(name) if wanted else []:
+            if path not in wanted:
+                path.unlink()  # e.g. a month the cached run didn't have
+        for path, digest in wanted.items():
+            if path.exists() and file_digest(path) == digest:
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(path.name + ".tmp")
+            shutil.copyfile(_blob_path(digest), tmp)
+            os.replace(tmp, path)
+            restored += 1
+    return restored
+
+
+def save(stage, key, parts):
+    """Stores the stage's output files and its entry after a successful run."""
+    outputs = {}
+    for name in stage.outputs:
+        files = {}
+        for path in table_files(name):
+            digest = file_digest(path)
+            blob = _blob_path(digest)
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                tmp = blob.with_name(f"{blob.name}.{threading.get_ident()}.tmp")
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, blob)
+            files[str(path.relative_to(storage.DATA_DIR))] = digest
+        outputs[name] = files
+    entry = {"stage": stage.name, "parts": parts, "outputs": outputs, "stored": time.time()}
+    _atomic_write(_entry_path(key), json.dumps(entry, indent=1).encode("utf-8"))
+    with _lock:
+        latest = _read_json(CACHE_DIR / "latest.json", {})
+        latest[stage.name] = key
+        _atomic_write(CACHE_DIR / "latest.json", json.dumps(latest, indent=1, sort_keys=True).encode("utf-8"))
+
+
+def touch(key):
+    os.utime(_entry_path(key))  # mark as recently used for eviction
+
+
+def record_run(decisions):
+    """Saves this run's hit/miss decisions (stage -> {result, reasons, seconds}) for the CLI."""
+    _atomic_write(CACHE_DIR / "last_run.json", json.dumps(
+        {"at": time.strftime("%Y-%m-%d %H:%M:%S"), "stages": decisions}, indent=1).encode("utf-8"))
+    save_digests()
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, max_age_days=MAX_AGE_DAYS):
+    """Drops expired entries, then least recently used ones until blobs fit in `max_bytes`."""
+    with _lock:
+        keep = set(_read_json(CACHE_DIR / "latest.json", {}).values())
+        entries = sorted((CACHE_DIR / "entries").glob("*.json"), key=lambda p: p.stat().st_mtime)
+        cutoff = time.time() - max_age_days * 86400
+        live = []
+        for path in entries:
+            if path.stem not in keep and path.stat().st_mtime < cutoff:
+                path.unlink()
+            else:
+                live.append(path)
+
+        def referenced(paths):
+            refs = set()
+            for path in paths:
+                entry = _read_json(path, {"outputs": {}})
+                refs.update(d for files in entry["outputs"].values() for d in files.values())
+            return refs
+
+        def blob_bytes(refs):
+            return sum(_blob_path(d).stat().st_size for d in refs if _blob_path(d).exists())
+
+        while live and blob_bytes(referenced(live)) > max_bytes:
+            victim = next((p for p in live if p.stem not in keep), None)
+            if victim is None:
+                break
+            victim.unlink()
+            live.remove(victim)
+
+        refs = referenced(live)
+        for blob in (CACHE_DIR / "blobs").glob("*/*"):
+            if blob.name not in refs and not blob.name.endswith(".tmp"):
+                blob.unlink()
+        total = blob_bytes(refs)
+    print(f"🧹 Stage cache: {len(live)} entries, {total / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--evict", action="store_true",
+                        help="Apply YRFI_STAGE_CACHE_DAYS and YRFI_STAGE_CACHE_MAX_MB now")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached stage output")
+    args = parser.parse_args()
+
+    if args.clear:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        print(f"🗑 Cleared {CACHE_DIR}")
+    elif args.evict:
+        evict()
+
+    last = _read_json(CACHE_DIR / "last_run.json")
+    if last:
+        print(f"🧾 Last pipeline run ({last['at']}):")
+        for name, d in last["stages"].items():
+            icon = {"hit": "♻️", "miss": "🔨", "uncached": "▶️"}.get(d["result"], "•")
+            why = f" — {'; '.join(d['reasons'])}" if d.get("reasons") else ""
+            print(f"  {icon} {name}: {d['result']} ({d['seconds']:.1f}s){why}")
+    entries = list((CACHE_DIR / "entries").glob("*.json"))
+    print(f"📦 {len(entries)} cached stage runs in {CACHE_DIR}")
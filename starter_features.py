@@ -0,0 +1,59 @@
+﻿# starter_features.py
+# As-of first-inning runs allowed by each starting pitcher.
+#
+# The starter of the home team is charged the away team's first-inning runs and vice
+# versa. Over every pitcher's starts in date order, grouped cumulative sums (minus the
+# current start) give what was known before each start: runs-allowed rate in the first,
+# share of scoreless firsts, and number of starts. Fully vectorized; results go to the
+# game store's starter_features table, which the model_input view joins for both sides.
+#
+# A pitcher is identified by (pitcher, team): the starters table only has display names,
+# and two pitchers with the same name on different clubs must not share a history.
+# Games without a final score (not played yet) count as no start.
+import numpy as np
+
+import game_store
+
+TIMELINE_SQL = f"""
+SELECT g.date, g.home_team AS team, s.game_number, s.pitcher,
+       CASE WHEN g.away_score IS NULL OR g.home_score IS NULL THEN NULL ELSE g.away_1st END AS runs
+FROM games g JOIN starters s
+  ON s.date = g.date AND s.team = g.home_team AND s.game_number = {game_store.GAME_NUMBER}
+WHERE s.pitcher IS NOT NULL
+UNION ALL
+SELECT g.date, g.away_team AS team, s.game_number, s.pitcher,
+       CASE WHEN g.away_score IS NULL OR g.home_score IS NULL THEN NULL ELSE g.home_1st END AS runs
+FROM games g JOIN starters s
+  ON s.date = g.date AND s.team = g.away_team AND s.game_number = {game_store.GAME_NUMBER}
+WHERE s.pitcher IS NOT NULL
+"""
+
+
+def compute(timeline):
+    """Per start (date, team, game_number, pitcher, runs) -> as-of r1_rate, scoreless_pct, starts."""
+    tl = timeline.sort_values(["pitcher", "team", "date", "game_number"], kind="stable").reset_index(drop=True)
+    done = tl["runs"].notna()
+    runs = tl["runs"].fillna(0).astype(float)
+    scoreless = (done & (runs == 0)).astype(int)
+    by = [tl["pitcher"], tl["team"]]
+
+    starts = done.astype(int).groupby(by).cumsum() - done.astype(int)
+    runs_before = runs.groupby(by).cumsum() - runs
+    scoreless_before = scoreless.groupby(by).cumsum() - scoreless
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tl["r1_rate"] = np.where(starts > 0, runs_before / starts, np.nan)
+        tl["scoreless_pct"] = np.where(starts > 0, scoreless_before / starts, np.nan)
+    tl["starts"] = starts
+    return tl[["date", "team", "game_number", "pitcher", "r1_rate", "scoreless_pct", "starts"]]
+
+
+def update(conn=None):
+    conn = conn or game_store.connect()
+    features = compute(game_store.query(TIMELINE_SQL, conn=conn))
+    game_store.upsert(conn, "starter_features", features, replace=True)
+    return len(features)
+
+
+if __name__ == "__main__":
+    print(f"🎯 Starter first-inning features written for {update()} starts")
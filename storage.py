@@ -0,0 +1,381 @@
+﻿# storage.py
+# Typed table storage shared by every script.
+#
+# Tables live in data/<name>.parquet with real dtypes: dates as datetime64, team and
+# handedness columns as categoricals, runs/labels as small integers. Readers can project
+# just the columns they use. A CSV copy is still written next to each table for the
+# dashboard and for humans; when only a CSV exists (or it is newer, e.g. edited by hand)
+# it is read instead and typed on the way in.
+#
+# Tables that grow with every season (PARTITIONED) are split by their date column into
+# data/<name>/season=YYYY/month=MM.parquet (.csv without pyarrow; a table keeps the format
+# it was first written in). Readers given start/end open only the months
+# overlapping that window, and upserts rewrite only the months they touch. A flat legacy
+# file is migrated into partitions the first time the table is read or written. Their CSV
+# export is the whole table, so a partial write leaves it stale rather than rewriting a
+# season per changed month; export_stale_csv() (the pipeline's publish step) refreshes it.
+#
+# Inside an in-process pipeline run (pipeline.py) every table written is also kept in
+# memory, so the next stage reads the typed frame back instead of re-parsing the file.
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAVE_PARQUET = True
+except ImportError:
+    HAVE_PARQUET = False
+
+DATA_DIR = Path("data")
+
+DATE_COLS = {"date", "Game Date"}
+TEAM_COLS = {"team", "away_team", "home_team", "Away Team", "Home Team", "Bookmaker Used"}
+HAND_COLS = {"away_hand", "home_hand", "Away Hand", "Home Hand"}
+HAND_DTYPE = pd.CategoricalDtype(["L", "R"])
+INT_COLS = {
+    "Away 1st": "int8", "Home 1st": "int8", "yrfi": "int8", "YRFI": "int8",
+    "Away Score": "int16", "Home Score": "int16",
+    "day_of_week": "int8", "same_hand": "int8", "yrfi_predicted": "int8",
+    "home_games": "int16", "away_games": "int16",
+    "home_starter_starts": "int16", "away_starter_starts": "int16",
+    "game_key": "int64",
+}
+
+# Partitioned table -> its date column
+PARTITIONED = {
+    "mlb_boxscores_cleaned": "Game Date",
+    "boxscores_with_starters": "date",
+    "mlb_odds_mybookie": "Game Date",
+    "mlb_model_and_odds": "Game Date",
+    "yrfi_model_input_with_era_and_team_rates": "date",
+    "yrfi_predictions_pregame": "Game Date",
+    "yrfi_predictions_pregame_with_odds": "Game Date",
+    "yrfi_prediction_contributions": "date",
+    "yrfi_half_inning_predictions": "date",
+}
+PART_EXT = ".parquet" if HAVE_PARQUET else ".csv"  # for new tables; existing ones keep theirs
+PART_EXTS = (".parquet", ".csv")
+
+# Table name -> typed frame while in-memory hand-off is on (None = off)
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def keep_in_memory(enabled=True):
+    """Turns the in-memory hand-off of written tables on (fresh and empty) or off."""
+    global _memory
+    with _memory_lock:
+        _memory = {} if enabled else None
+
+
+def _remember(name, df):
+    with _memory_lock:
+        if _memory is not None:
+            if df is None:
+                _memory.pop(name, None)
+            else:
+                _memory[name] = df.copy()  # callers may keep mutating their frame
+
+
+def _recall(name):
+    with _memory_lock:
+        return None if _memory is None else _memory.get(name)
+
+
+def parquet_path(name):
+    return DATA_DIR / f"{name}.parquet"
+
+
+def csv_path(name):
+    return DATA_DIR / f"{name}.csv"
+
+
+def table_path(name):
+    """Where a table lives, for messages: its partition directory or its parquet file."""
+    return partition_dir(name) if name in PARTITIONED else parquet_path(name)
+
+
+def unique_columns(df):
+    """Renames repeated column names to name.1, name.2, ... the way read_csv does."""
+    cols = pd.Series(df.columns)
+    for dup in cols[cols.duplicated()].unique():
+        for i, idx in enumerate(cols[cols == dup].index.tolist()[1:], start=1):
+            cols[idx] = f"{dup}.{i}"
+    df.columns = cols
+    return df
+
+
+def apply_types(df):
+    """Casts known columns to their storage dtypes; unknown columns are left alone."""
+    df = unique_columns(df.copy())
+    for col in df.columns:
+        if col in DATE_COLS:
+            df[col] = pd.to_datetime(df[col], errors="coerce").dt.normalize()
+        elif col in HAND_COLS:
+            df[col] = df[col].astype(str).where(df[col].notna()).astype(HAND_DTYPE)
+        elif col in TEAM_COLS:
+            df[col] = df[col].astype("category")
+        elif col in INT_COLS:
+            values = pd.to_numeric(df[col], errors="coerce")
+            if not (values.dropna() % 1 == 0).all():
+                df[col] = values  # not whole numbers after all; leave as float
+            elif values.isna().any():
+                df[col] = values.astype(INT_COLS[col].capitalize())  # nullable Int8/Int16
+            else:
+                df[col] = values.astype(INT_COLS[col])
+    return df
+
+
+def partition_dir(name):
+    return DATA_DIR / name
+
+
+def partition_path(name, season, month, ext=PART_EXT):
+    return partition_dir(name) / f"season={season:04d}" / f"month={month:02d}{ext}"
+
+
+def _partition_files(name):
+    return sorted(p for p in partition_dir(name).glob("season=*/month=*.*") if p.suffix in PART_EXTS)
+
+
+def partition_ext(name):
+    """The file format table `name` is partitioned in: that of its existing months, else PART_EXT.
+
+    Installing or removing pyarrow must not hide a table written in the other format, so a
+    table keeps its format; mixed formats, or parquet months without pyarrow, are errors.
+    """
+    exts = {p.suffix for p in _partition_files(name)}
+    if len(exts) > 1:
+        raise RuntimeError(f"{partition_dir(name)} mixes {' and '.join(sorted(exts))} partitions; "
+                           f"convert them to one format")
+    if exts == {".parquet"} and not HAVE_PARQUET:
+        raise RuntimeError(f"{partition_dir(name)} is stored as parquet but pyarrow is not installed")
+    return exts.pop() if exts else PART_EXT
+
+
+def partitions(name, start=None, end=None):
+    """Partition files of `name` overlapping [start, end], pruned by path alone."""
+    lo = None if start is None else pd.Timestamp(start).to_period("M")
+    hi = None if end is None else pd.Timestamp(end).to_period("M")
+    partition_ext(name)  # fail loudly rather than read part of a table
+    files = []
+    for path in _partition_files(name):
+        season = int(path.parent.name.split("=")[1])
+        month = int(path.stem.split("=")[1])
+        if season == 0:  # rows without a usable date
+            if lo is None and hi is None:
+                files.append(path)
+            continue
+        period = pd.Period(year=season, month=month, freq="M")
+        if (lo is None or period >= lo) and (hi is None or period <= hi):
+            files.append(path)
+    return files
+
+
+def partition_keys(df, name):
+    """(season, month) of each row; rows with no date go to (0, 0)."""
+    dates = pd.to_datetime(df[PARTITIONED[name]], errors="coerce")
+    return (
+        dates.dt.year.fillna(0).astype(int).rename("season"),
+        dates.dt.month.fillna(0).astype(int).rename("month"),
+    )
+
+
+def is_partitioned(name):
+    return name in PARTITIONED and partition_dir(name).is_dir()
+
+
+def exists(name):
+    return is_partitioned(name) or parquet_path(name).exists() or csv_path(name).exists()
+
+
+def _filter_dates(df, name, start, end):
+    col = PARTITIONED.get(name, "date")
+    if (start is None and end is None) or col not in df.columns:
+        return df
+    dates = pd.to_datetime(df[col])
+    keep = pd.Series(True, index=df.index)
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates <= pd.Timestamp(end)
+    return df[keep].reset_index(drop=True)
+
+
+def _read_file(path, columns=None):
+    if path.suffix == ".parquet":
+        if columns is not None:
+            available = set(_parquet_columns(path))
+            columns = [c for c in columns if c in available]
+        return pd.read_parquet(path, columns=columns)
+    usecols = None if columns is None else (lambda c: c in set(columns))
+    return apply_types(pd.read_csv(path, usecols=usecols))
+
+
+def read_table(name, columns=None, start=None, end=None):
+    """Loads a table, optionally projecting `columns` (missing ones are ignored).
+
+    start/end (inclusive) keep only rows in that date window; for partitioned tables
+    only the overlapping month files are opened.
+    """
+    held = _recall(name)
+    if held is not None:
+        df = _filter_dates(held, name, start, end)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df.copy()
+    if name in PARTITIONED:
+        migrate(name)
+    if is_partitioned(name):
+        read_cols = columns
+        if columns is not None and (start is not None or end is not None):
+            read_cols = list(dict.fromkeys([*columns, PARTITIONED[name]]))
+        frames = [_read_file(p, read_cols) for p in partitions(name, start, end)]
+        if not frames:
+            return pd.DataFrame(columns=columns or [])
+        df = frames[0] if len(frames) == 1 else apply_types(pd.concat(frames, ignore_index=True))
+        df = _filter_dates(df, name, start, end)
+        if columns is not None:
+            df = df[[c for c in read_cols if c in columns]]
+        return df
+    return _filter_dates(_read_flat(name, columns), name, start, end)
+
+
+def _read_flat(name, columns=None):
+    pq, csv = parquet_path(name), csv_path(name)
+    use_parquet = HAVE_PARQUET and pq.exists() and (
+        not csv.exists() or pq.stat().st_mtime >= csv.stat().st_mtime
+    )
+    if use_parquet:
+        return _read_file(pq, columns)
+    if not csv.exists():
+        raise FileNotFoundError(f"No table named '{name}' in {DATA_DIR}")
+    return _read_file(csv, columns)
+
+
+def _parquet_columns(path):
+    import pyarrow.parquet as pq
+    return pq.read_schema(path).names
+
+
+def _write_file(df, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    if path.suffix == ".parquet":
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def write_partitions(df, name, replace=False):
+    """Writes each (season, month) of `df` over its partition file.
+
+    Months absent from `df` are left alone, unless replace=True (whole-table write).
+    """
+    if not replace:
+        migrate(name)
+        _remember(name, None)  # only some months change; the next read goes to disk
+    typed = apply_types(df)
+    ext = partition_ext(name)
+    written = set()
+    for (season, month), part in typed.groupby(list(partition_keys(typed, name)), sort=True):
+        path = partition_path(name, season, month, ext)
+        _write_file(part.reset_index(drop=True), path)
+        written.add(path)
+    if replace:
+        for path in partitions(name):
+            if path not in written:
+                path.unlink()
+    return typed
+
+
+def migrate(name):
+    """Splits a flat legacy table into partitions (once)."""
+    if partition_dir(name).is_dir() or not (parquet_path(name).exists() or csv_path(name).exists()):
+        return
+    df = _read_flat(name)
+    tmp_dir = partition_dir(name).with_name(name + ".partitioning")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    final_dir = partition_dir(name)
+    try:
+        for (season, month), part in df.groupby(list(partition_keys(df, name)), sort=True):
+            rel = partition_path(name, season, month).relative_to(final_dir)
+            _write_file(part.reset_index(drop=True), tmp_dir / rel)
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_dir, final_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"🗂 Partitioned {name} by season/month ({len(df)} rows)")
+
+
+def write_table(df, name, csv=True):
+    """Writes a typed table (and its CSV export) atomically; returns the typed frame."""
+    if name in PARTITIONED:
+        typed = write_partitions(df, name, replace=True)
+        if csv:
+            export_csv(typed, name)
+        _remember(name, typed)
+        return typed
+    typed = apply_types(df)
+    if HAVE_PARQUET:
+        pq = parquet_path(name)
+        tmp = pq.with_name(pq.name + ".tmp")
+        typed.to_parquet(tmp, index=False)
+        os.replace(tmp, pq)
+    if csv or not HAVE_PARQUET:
+        export_csv(typed, name)
+    _remember(name, typed)
+    return typed
+
+
+def csv_stale(name):
+    """True when a month of partitioned table `name` was written after its CSV export."""
+    if not is_partitioned(name):
+        return False
+    csv = csv_path(name)
+    if not csv.exists():
+        return True
+    exported = csv.stat().st_mtime_ns
+    return any(p.stat().st_mtime_ns > exported for p in partitions(name))
+
+
+def export_stale_csv(names=None):
+    """Re-exports the CSV of every partitioned table written since its export; returns their names."""
+    stale = [name for name in (names or PARTITIONED) if csv_stale(name)]
+    for name in stale:
+        export_csv(read_table(name), name)
+    return stale
+
+
+def export_csv(df, name):
+    path = csv_path(name)
+    tmp = path.with_name(path.name + ".tmp")
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    # Keep the parquet copy authoritative when both were just written together
+    pq = parquet_path(name)
+    if HAVE_PARQUET and pq.exists():
+        os.utime(pq)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("names", nargs="*", help="Tables to convert (default: every CSV in data/)")
+    parser.add_argument("--export-csv", action="store_true", help="Write CSVs from the parquet tables instead")
+    args = parser.parse_args()
+
+    names = args.names or sorted(p.stem for p in DATA_DIR.glob("*.csv") if p.stem != "rotowire-projstarters")
+    for name in names:
+        if args.export_csv:
+            export_csv(read_table(name), name)
+            print(f"📄 Exported {csv_path(name)}")
+        else:
+            df = write_table(read_table(name), name, csv=False)
+            print(f"✅ {name}: {len(df)} rows → {parquet_path(name)}")
@@ -1,10 +1,11 @@
 ﻿# summarize_backtest_results.py
 import pandas as pd
 from pathlib import Path
+import storage
 from sklearn.metrics import accuracy_score, precision_score, recall_score, roc_auc_score
 
 DATA_DIR = Path("data")
-df = pd.read_csv(DATA_DIR / "yrfi_backtest_results_through_apr19.csv")
+df = storage.read_table("yrfi_backtest_results_through_apr19", columns=["yrfi", "yrfi_predicted", "yrfi_probability"])
 
 # Round probabilities to 3 decimals for display
 df["yrfi_probability"] = df["yrfi_probability"].round(3)
@@ -28,7 +29,7 @@ summary = pd.DataFrame({
 })
 
 # Save to CSV
-summary_path = DATA_DIR / "yrfi_backtest_summary_through_apr19.csv"
-summary.to_csv(summary_path, index=False)
+storage.write_table(summary, "yrfi_backtest_summary_through_apr19")
+summary_path = storage.table_path("yrfi_backtest_summary_through_apr19")
 print(f"✅ Summary saved to: {summary_path.resolve()}")
 print(summary)
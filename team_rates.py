@@ -0,0 +1,144 @@
+﻿# team_rates.py
+# Point-in-time team first-inning scoring rates.
+#
+# For every (team, side) the engine keeps running state: season sum/count, an exponentially
+# decayed sum/weight (half-life in games, carried across seasons) and the last-N runs.
+# Each game gets the numbers as they stood before its day's games were folded in, so no
+# game sees its own result or anything after it. Folding a game in is O(1).
+#
+# The state lives in the game store. A daily run only reads games from the fold frontier
+# (the first day not yet folded) onward: finished past days are folded, today and later get
+# features from the current state. If results turn up for an already-folded day, or the
+# settings change, the state is rebuilt from the full history. A game counts as finished once
+# its final scores are stored: scheduled and postponed games carry a 0 first inning, not a result.
+from collections import deque
+from datetime import date
+
+import pandas as pd
+
+import game_store
+
+HALF_LIFE = 20   # games
+WINDOW = 10      # last-N games
+STATE_NAME = "team_rates"
+FINISHED = ("home_score IS NOT NULL AND away_score IS NOT NULL "
+            "AND home_1st IS NOT NULL AND away_1st IS NOT NULL")
+
+
+class TeamRates:
+    """Running first-inning runs per (team, side)."""
+
+    def __init__(self, half_life=HALF_LIFE, window=WINDOW):
+        self.half_life = half_life
+        self.window = window
+        self.decay = 0.5 ** (1 / half_life)
+        self.splits = {}
+        self.season = None
+        self.frontier = None  # first date not folded in yet (YYYY-MM-DD)
+        self.folded = 0       # finished games folded in so far
+
+    def _split(self, team, side):
+        key = f"{team}|{side}"
+        if key not in self.splits:
+            self.splits[key] = {"sum": 0.0, "count": 0, "dsum": 0.0, "dweight": 0.0,
+                                "recent": deque(maxlen=self.window)}
+        return self.splits[key]
+
+    def start_season(self, season):
+        if season != self.season:
+            for s in self.splits.values():
+                s["sum"], s["count"] = 0.0, 0
+            self.season = season
+
+    def features(self, team, side):
+        s = self._split(team, side)
+        recent = s["recent"]
+        return {
+            f"{side}_team_avg_1st": s["sum"] / s["count"] if s["count"] else None,
+            f"{side}_games": s["count"],
+            f"{side}_team_ewm_1st": s["dsum"] / s["dweight"] if s["dweight"] else None,
+            f"{side}_team_recent_1st": sum(recent) / len(recent) if recent else None,
+        }
+
+    def add(self, team, side, runs):
+        s = self._split(team, side)
+        s["sum"] += runs
+        s["count"] += 1
+        s["dsum"] = s["dsum"] * self.decay + runs
+        s["dweight"] = s["dweight"] * self.decay + 1.0
+        s["recent"].append(runs)
+
+    def to_dict(self):
+        return {
+            "half_life": self.half_life, "window": self.window,
+            "season": self.season, "frontier": self.frontier, "folded": self.folded,
+            "splits": {k: {**v, "recent": list(v["recent"])} for k, v in self.splits.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        rates = cls(d["half_life"], d["window"])
+        rates.season, rates.frontier, rates.folded = d["season"], d["frontier"], d["folded"]
+        rates.splits = {
+            k: {**v, "recent": deque(v["recent"], maxlen=rates.window)} for k, v in d["splits"].items()
+        }
+        return rates
+
+
+def load_state(conn, half_life=HALF_LIFE, window=WINDOW):
+    saved = game_store.get_state(STATE_NAME, conn)
+    if saved and saved["half_life"] == half_life and saved["window"] == window:
+        rates = TeamRates.from_dict(saved)
+        # A result that arrived for a day already folded in means the state is stale
+        done = conn.execute(
+            f"SELECT COUNT(*) FROM games WHERE date < ? AND {FINISHED}",
+            (rates.frontier or "",),
+        ).fetchone()[0]
+        if done == rates.folded:
+            return rates
+        print("♻️ Earlier results changed; rebuilding team rate state")
+    return TeamRates(half_life, window)
+
+
+def update(conn=None, rebuild=False, half_life=HALF_LIFE, window=WINDOW, today=None):
+    """Folds newly finished days into the state and writes as-of features for every new game."""
+    conn = conn or game_store.connect()
+    rates = TeamRates(half_life, window) if rebuild else load_state(conn, half_life, window)
+    today = (today or date.today()).strftime("%Y-%m-%d")
+
+    games = game_store.query(
+        f"SELECT game_key, date, home_team, away_team, home_1st, away_1st, {FINISHED} AS finished "
+        "FROM games WHERE date >= ? ORDER BY date, home_team, away_team, game_key",
+        (rates.frontier or "",), conn=conn, dates=(),
+    )
+
+    rows = []
+    for day, day_games in games.groupby("date", sort=True):
+        rates.start_season(int(day[:4]))
+        for g in day_games.itertuples(index=False):
+            rows.append({"game_key": g.game_key, "date": day, "home_team": g.home_team, "away_team": g.away_team,
+                         **rates.features(g.home_team, "home"), **rates.features(g.away_team, "away")})
+        if day >= today:
+            continue  # not over yet: features only, fold it in on a later run
+        for g in day_games.itertuples(index=False):
+            if g.finished:
+                rates.add(g.home_team, "home", float(g.home_1st))
+                rates.add(g.away_team, "away", float(g.away_1st))
+                rates.folded += 1
+        rates.frontier = (pd.Timestamp(day) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+    game_store.upsert(conn, "team_rate_features", pd.DataFrame(rows))
+    game_store.set_state(STATE_NAME, rates.to_dict(), conn)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild", action="store_true", help="Recompute from the full game history")
+    parser.add_argument("--half-life", type=float, default=HALF_LIFE, help="Decay half-life in games")
+    parser.add_argument("--window", type=int, default=WINDOW, help="Games in the recent window")
+    args = parser.parse_args()
+    n = update(rebuild=args.rebuild, half_life=args.half_life, window=args.window)
+    print(f"📈 Team rate features written for {n} games")
@@ -0,0 +1,119 @@
+﻿# teams.py
+# Canonical team registry and packed game keys shared by every join in the pipeline.
+#
+# Every alias ESPN, Rotowire and the Odds API use for a club maps to one small integer id
+# (ids are permanent: game keys are stored, so never renumber). A game is identified by
+# game_key, a single int64 packing (date, home id, away id, game number):
+#
+#   days since 1970-01-01 << 16 | home id << 10 | away id << 4 | game number
+#
+# so merges compare one integer column instead of three strings, and the two games of a
+# doubleheader get different keys. Rows whose date or teams can't be resolved get <NA>.
+import numpy as np
+import pandas as pd
+
+# id, canonical name (as ESPN spells it), other aliases
+TEAMS = [
+    (1, "Arizona Diamondbacks", ["ARI", "AZ", "Arizona", "Diamondbacks", "D-backs"]),
+    (2, "Athletics", ["ATH", "OAK", "Oakland Athletics", "Oakland A's", "Sacramento Athletics", "A's"]),
+    (3, "Atlanta Braves", ["ATL", "Atlanta", "Braves"]),
+    (4, "Baltimore Orioles", ["BAL", "Baltimore", "Orioles"]),
+    (5, "Boston Red Sox", ["BOS", "Boston", "Red Sox"]),
+    (6, "Chicago Cubs", ["CHC", "CHN", "Cubs"]),
+    (7, "Chicago White Sox", ["CWS", "CHW", "CHA", "White Sox"]),
+    (8, "Cincinnati Reds", ["CIN", "Cincinnati", "Reds"]),
+    (9, "Cleveland Guardians", ["CLE", "Cleveland", "Guardians", "Cleveland Indians"]),
+    (10, "Colorado Rockies", ["COL", "Colorado", "Rockies"]),
+    (11, "Detroit Tigers", ["DET", "Detroit", "Tigers"]),
+    (12, "Houston Astros", ["HOU", "Houston", "Astros"]),
+    (13, "Kansas City Royals", ["KC", "KCR", "KCA", "Kansas City", "Royals"]),
+    (14, "Los Angeles Angels", ["LAA", "ANA", "Angels", "Los Angeles Angels of Anaheim"]),
+    (15, "Los Angeles Dodgers", ["LAD", "LAN", "Dodgers"]),
+    (16, "Miami Marlins", ["MIA", "FLA", "Miami", "Marlins"]),
+    (17, "Milwaukee Brewers", ["MIL", "Milwaukee", "Brewers"]),
+    (18, "Minnesota Twins", ["MIN", "Minnesota", "Twins"]),
+    (19, "New York Mets", ["NYM", "NYN", "Mets"]),
+    (20, "New York Yankees", ["NYY", "NYA", "Yankees"]),
+    (21, "Philadelphia Phillies", ["PHI", "Philadelphia", "Phillies"]),
+    (22, "Pittsburgh Pirates", ["PIT", "Pittsburgh", "Pirates"]),
+    (23, "San Diego Padres", ["SD", "SDP", "SDN", "San Diego", "Padres"]),
+    (24, "San Francisco Giants", ["SF", "SFG", "SFN", "San Francisco", "Giants"]),
+    (25, "Seattle Mariners", ["SEA", "Seattle", "Mariners"]),
+    (26, "St. Louis Cardinals", ["STL", "SLN", "St Louis Cardinals", "Saint Louis Cardinals", "Cardinals"]),
+    (27, "Tampa Bay Rays", ["TB", "TBR", "TBA", "Tampa Bay", "Rays"]),
+    (28, "Texas Rangers", ["TEX", "Texas", "Rangers"]),
+    (29, "Toronto Blue Jays", ["TOR", "Toronto", "Blue Jays"]),
+    (30, "Washington Nationals", ["WSH", "WAS", "WSN", "Washington", "Nationals"]),
+]
+
+UNKNOWN = 0
+NAMES = np.array([None] + [name for _, name, _ in TEAMS], dtype=object)  # id -> canonical name
+ALIASES = {
+    alias.casefold(): team
+    for team, name, aliases in TEAMS
+    for alias in [name, *aliases]
+}
+
+DAY_SHIFT, HOME_SHIFT, AWAY_SHIFT = 16, 10, 4
+GAME_MASK = (1 << AWAY_SHIFT) - 1
+
+
+def team_id(values):
+    """Registry id of each team alias (case and surrounding spaces ignored); 0 if unknown."""
+    s = pd.Series(values)
+    codes, uniques = pd.factorize(s.astype(object))
+    # Look up each distinct alias once; the extra trailing 0 catches missing values (code -1)
+    ids = np.array([ALIASES.get(str(u).strip().casefold(), UNKNOWN) for u in uniques] + [UNKNOWN], dtype=np.int8)
+    return pd.Series(ids[codes], index=s.index, name=s.name)
+
+
+def canonical(values):
+    """Canonical name of each team alias; unknown aliases are kept (stripped) as they are."""
+    s = pd.Series(values)
+    ids = team_id(s)
+    stripped = s.astype(object).where(s.isna(), s.astype(str).str.strip())
+    return pd.Series(NAMES[ids.to_numpy()], index=s.index, name=s.name).where(ids > UNKNOWN, stripped)
+
+
+def game_key(dates, home_ids, away_ids, game_numbers=1):
+    """Packed int64 key of each game (nullable Int64, <NA> when date or either team is unknown)."""
+    dates = pd.Series(pd.to_datetime(dates, errors="coerce"))
+    index = dates.index
+    days = dates.to_numpy().astype("datetime64[D]").astype(np.int64)
+    home = np.asarray(home_ids, dtype=np.int64)
+    away = np.asarray(away_ids, dtype=np.int64)
+    game = np.broadcast_to(np.asarray(game_numbers, dtype=np.int64), days.shape)
+    keys = (days << DAY_SHIFT) | (home << HOME_SHIFT) | (away << AWAY_SHIFT) | (game & GAME_MASK)
+    valid = dates.notna().to_numpy() & (home > UNKNOWN) & (away > UNKNOWN)
+    return pd.Series(pd.array(np.where(valid, keys, 0), dtype="Int64"), index=index, name="game_key").where(valid)
+
+
+def one_game_key(date, home, away, game_number=1):
+    """game_key of a single game from a date and two team aliases (None if any is unknown);
+    the scalar counterpart of game_key(), without pandas in the loop."""
+    home_id = ALIASES.get(str(home).strip().casefold(), UNKNOWN)
+    away_id = ALIASES.get(str(away).strip().casefold(), UNKNOWN)
+    try:
+        days = int(np.datetime64(str(date)[:10], "D").astype(np.int64))
+    except ValueError:
+        return None
+    if home_id == UNKNOWN or away_id == UNKNOWN:
+        return None
+    return (days << DAY_SHIFT) | (home_id << HOME_SHIFT) | (away_id << AWAY_SHIFT) | (int(game_number) & GAME_MASK)
+
+
+def game_keys(df, date="Game Date", home="Home Team", away="Away Team", game_number=None):
+    """game_key for every row of `df` from its date and team-alias columns.
+
+    Without a `game_number` column, repeated (date, home, away) rows are numbered 1, 2, ...
+    in table order, which is start-time order for both the ESPN and Odds API slates.
+    """
+    home_ids, away_ids = team_id(df[home]), team_id(df[away])
+    dates = pd.to_datetime(df[date], errors="coerce")
+    if game_number is None:
+        numbers = pd.DataFrame({"d": dates, "h": home_ids, "a": away_ids}).groupby(
+            ["d", "h", "a"], dropna=False, sort=False).cumcount() + 1
+    else:
+        numbers = df[game_number].fillna(1)
+    return game_key(dates, home_ids, away_ids, numbers.to_numpy())
+
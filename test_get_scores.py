@@ -0,0 +1,106 @@
+﻿# test_get_scores.py
+# Runs get_scores.scrape_range_async against a local stand-in for the ESPN scoreboard
+# (the ESPN_SCOREBOARD_URL hook), in a scratch working directory so the journal, HTTP
+# cache, tables and SQLite store are all throwaway.
+#
+#   python test_get_scores.py      (or: python -m pytest test_get_scores.py)
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import get_scores
+import storage
+from scrape_journal import DayJournal
+
+FAILING_DAY = "20250402"
+LIVE_DAY = "20250403"  # also has a game still in progress
+
+
+def competitor(home_away, team, runs, first):
+    return {
+        "homeAway": home_away,
+        "team": {"displayName": team},
+        "score": str(runs),
+        "records": [{"type": "total", "summary": "10-5"}],
+        "linescores": [{"value": first}],
+    }
+
+
+def event(game_id, state, away, home):
+    status = {"type": {"state": state}}
+    return {"id": game_id, "status": status, "competitions": [{"status": status, "competitors": [away, home]}]}
+
+
+def scoreboard(day):
+    """One finished game per day, plus one in progress on LIVE_DAY."""
+    events = [event(f"40{day}", "post", competitor("away", "Atlanta Braves", 3, 1),
+                    competitor("home", "New York Mets", 2, 0))]
+    if day == LIVE_DAY:
+        events.append(event(f"41{day}", "in", competitor("away", "Chicago Cubs", 1, 1),
+                            competitor("home", "St. Louis Cardinals", 0, 0)))
+    return {"events": events}
+
+
+class StandIn(BaseHTTPRequestHandler):
+    requested = []
+
+    def do_GET(self):
+        day = parse_qs(urlparse(self.path).query)["dates"][0]
+        StandIn.requested.append(day)
+        if day == FAILING_DAY:
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps(scoreboard(day)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_scrape_range_async_against_stand_in():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    get_scores.SCOREBOARD_URL = f"http://127.0.0.1:{server.server_port}/scoreboard"
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        os.makedirs("data")
+        try:
+            get_scores.scrape_range_async("2025-04-01", "2025-04-03", rate=100.0, retries=0)
+            journal = DayJournal("mlb_boxscores_cleaned")
+            # The failed scoreboard doesn't abort the range; it is journaled as not final
+            assert journal.is_final("2025-04-01")
+            assert not journal.is_final("2025-04-02")
+            assert "error" in journal.entry("2025-04-02")
+            # A day with a game still going isn't final either
+            assert not journal.is_final("2025-04-03")
+
+            games = storage.read_table("mlb_boxscores_cleaned")
+            assert len(games) == 3
+            assert (games["Away 1st"] == 1).all() and (games["YRFI"] == 1).all()
+            # Only final games carry a score, so the game in progress has no label yet
+            live = games["Home Team"] == "St. Louis Cardinals"
+            assert games.loc[live, ["Away Score", "Home Score"]].isna().all().all()
+            assert games.loc[~live, ["Away Score", "Home Score"]].notna().all().all()
+
+            # A rerun only asks for the day that failed; the live day is retried too, but its
+            # scoreboard is still fresh in the HTTP cache
+            StandIn.requested.clear()
+            get_scores.scrape_range_async("2025-04-01", "2025-04-03", rate=100.0, retries=0)
+            assert StandIn.requested == [FAILING_DAY]
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    test_scrape_range_async_against_stand_in()
+    print("✅ async scraper OK against the stand-in server")
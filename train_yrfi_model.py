@@ -1,18 +1,23 @@
 ﻿# train_yrfi_model.py
 import pandas as pd
 from pathlib import Path
+import features
+import storage
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import classification_report, roc_auc_score
 
 DATA_DIR = Path("data")
-df = pd.read_csv(DATA_DIR / "yrfi_model_input.csv", parse_dates=["date"])
+df = storage.read_table("yrfi_model_input", columns=[
+    "away_team", "home_team", "away_hand", "home_hand", "Away Score", "Home Score", "yrfi"
+])
+df = df[features.labeled(df)]  # games not finished yet have no label
 
 # Select features and target
 categorical_cols = ["away_team", "home_team", "away_hand", "home_hand"]
 X_cat = df[categorical_cols]
-y = df["yrfi"]
+y = df["yrfi"].astype(int)
 
 # One-hot encode categorical features
 encoder = OneHotEncoder(sparse_output=False)
@@ -0,0 +1,192 @@
+﻿# tune_yrfi_xgb.py
+# Hyperparameter search for the YRFI booster on time-ordered folds.
+#
+# Game days are cut into --folds + 1 consecutive chunks; fold i trains on chunks 0..i and
+# validates on chunk i + 1, so every score is out of sample in time. Random configurations
+# go through successive halving: all of them are scored with a small number of boosting
+# rounds, the best 1/--eta move on with --eta times as many rounds, and so on up to
+# --max-rounds. The winner is the best (configuration, rounds) pair seen in any rung. Trials run on a process pool; each worker builds the fold DMatrix buffers
+# once (from the memory-mapped feature cache) and reuses them for every trial it runs.
+#
+# Every trial is written to yrfi_tuning_results (parameters, per-fold log loss and Brier
+# score, fit and predict time). The best configuration goes to model/best_params.json,
+# which save_yrfi_model.py trains with.
+#
+#   python tune_yrfi_xgb.py                       # 27 configurations, 3 folds
+#   python tune_yrfi_xgb.py --trials 81 --workers 8 --max-rounds 1000
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import log_loss
+from sklearn.preprocessing import OneHotEncoder
+
+import features
+import storage
+
+RESULTS_TABLE = "yrfi_tuning_results"
+BEST_PARAMS_PATH = Path("model") / "best_params.json"
+# What train/save used before any tuning
+DEFAULT_PARAMS = {"n_estimators": 100, "max_depth": 4, "learning_rate": 0.1}
+SEARCH_SPACE = {
+    "max_depth": [2, 3, 4, 5, 6],
+    "learning_rate": [0.01, 0.03, 0.05, 0.1, 0.2],
+    "min_child_weight": [1, 3, 5, 10],
+    "subsample": [0.6, 0.8, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+    "reg_lambda": [0.5, 1.0, 5.0, 10.0],
+}
+
+
+def best_params(path=BEST_PARAMS_PATH):
+    """XGBClassifier arguments of the best tuned configuration, or DEFAULT_PARAMS before tuning."""
+    if not Path(path).exists():
+        return dict(DEFAULT_PARAMS)
+    return json.loads(Path(path).read_text(encoding="utf-8"))["params"]
+
+
+def best_layout(path=BEST_PARAMS_PATH):
+    """Feature layout the best configuration was tuned on, or None before tuning."""
+    if not Path(path).exists():
+        return None
+    return json.loads(Path(path).read_text(encoding="utf-8")).get("layout")
+
+
+def time_folds(dates, n_folds):
+    """[(train positions, validation positions)] over consecutive chunks of game days."""
+    days = np.unique(dates)
+    if len(days) < n_folds + 1:
+        raise ValueError(f"{n_folds} folds need at least {n_folds + 1} game days, got {len(days)}")
+    chunks = np.array_split(days, n_folds + 1)
+    folds = []
+    for i in range(n_folds):
+        train = np.flatnonzero(dates <= chunks[i][-1])
+        valid = np.flatnonzero((dates >= chunks[i + 1][0]) & (dates <= chunks[i + 1][-1]))
+        folds.append((train, valid))
+    return folds
+
+
+# === Worker side: fold buffers built once per process ===
+_folds = None
+_threads = 1
+
+
+def _init_worker(layout, n_folds, threads):
+    global _folds, _threads
+    _threads = threads
+    fm = features.cached(OneHotEncoder(sparse_output=False, handle_unknown="ignore"), fit=True, layout=layout)
+    known = features.labeled(fm.rows).to_numpy()
+    rows = fm.rows[known].reset_index(drop=True)
+    X = features._take(fm.X, np.flatnonzero(known))
+    y = rows["yrfi"].astype(int).to_numpy()
+    categorical = layout == "categorical"
+    _folds = []
+    for train, valid in time_folds(rows["date"].to_numpy(), n_folds):
+        dtrain = xgb.DMatrix(features._take(X, train), label=y[train], enable_categorical=categorical, nthread=threads)
+        dvalid = xgb.DMatrix(features._take(X, valid), label=y[valid], enable_categorical=categorical, nthread=threads)
+        _folds.append((dtrain, dvalid, y[valid]))
+
+
+def evaluate(params, rounds):
+    """Trains `params` for `rounds` on every fold; returns per-fold scores and timings."""
+    booster_params = {"objective": "binary:logistic", "eval_metric": "logloss", "seed": 42,
+                      "nthread": _threads, "tree_method": "hist", **params}
+    result = {"rounds": rounds, "fit_seconds": 0.0, "predict_seconds": 0.0}
+    for i, (dtrain, dvalid, y_valid) in enumerate(_folds, start=1):
+        start = time.perf_counter()
+        booster = xgb.train(booster_params, dtrain, num_boost_round=rounds)
+        fitted = time.perf_counter()
+        p = booster.predict(dvalid)
+        result["fit_seconds"] += fitted - start
+        result["predict_seconds"] += time.perf_counter() - fitted
+        result[f"logloss_fold{i}"] = log_loss(y_valid, p, labels=[0, 1])
+        result[f"brier_fold{i}"] = float(np.mean((p - y_valid) ** 2))
+    result["logloss"] = float(np.mean([result[f"logloss_fold{i}"] for i in range(1, len(_folds) + 1)]))
+    result["brier"] = float(np.mean([result[f"brier_fold{i}"] for i in range(1, len(_folds) + 1)]))
+    return result
+
+
+def sample_configs(n, seed):
+    rng = np.random.default_rng(seed)
+    configs, seen = [], set()
+    while len(configs) < n and len(seen) < np.prod([len(v) for v in SEARCH_SPACE.values()]):
+        config = {name: values[rng.integers(len(values))] for name, values in SEARCH_SPACE.items()}
+        config = {k: v.item() if hasattr(v, "item") else v for k, v in config.items()}
+        key = tuple(sorted(config.items()))
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=27, help="Random configurations to start with")
+    parser.add_argument("--folds", type=int, default=3, help="Time-ordered validation folds")
+    parser.add_argument("--min-rounds", type=int, default=30, help="Boosting rounds in the first halving rung")
+    parser.add_argument("--max-rounds", type=int, default=600, help="Most boosting rounds any trial gets")
+    parser.add_argument("--eta", type=int, default=3, help="Keep the best 1/eta per rung; rounds grow by eta")
+    parser.add_argument("--layout", choices=features.LAYOUTS, default="dense")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    fm = features.cached(OneHotEncoder(sparse_output=False, handle_unknown="ignore"), fit=True, layout=args.layout)
+    game_days = fm.rows.loc[features.labeled(fm.rows), "date"].nunique()
+    if args.folds < 1 or game_days < args.folds + 1:
+        raise SystemExit(f"❌ --folds {args.folds} needs at least {args.folds + 1} labeled game days "
+                         f"(and --folds >= 1); the feature table has {game_days}")
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    configs = sample_configs(args.trials, args.seed)
+    rungs = []
+    rounds = args.min_rounds
+    while rounds < args.max_rounds:
+        rungs.append(rounds)
+        rounds *= args.eta
+    rungs.append(args.max_rounds)
+    print(f"🎛 {len(configs)} configurations, {args.folds} time-ordered folds, rungs {rungs}, {args.workers} workers")
+
+    records, trials = [], []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.layout, args.folds, threads)) as pool:
+        for rung, rounds in enumerate(rungs):
+            results = list(pool.map(evaluate, configs, [rounds] * len(configs)))
+            scored = sorted(zip(configs, results), key=lambda cr: cr[1]["logloss"])
+            for trial, (config, result) in enumerate(scored):
+                records.append({"rung": rung, "trial": trial, **config, **result})
+            trials.extend(scored)
+            print(f"  rung {rung}: {len(configs)} trials x {rounds} rounds, best log loss {scored[0][1]['logloss']:.4f}")
+            if rung < len(rungs) - 1:
+                configs = [config for config, _ in scored[:max(1, len(scored) // args.eta)]]
+        defaults = {k: v for k, v in DEFAULT_PARAMS.items() if k != "n_estimators"}
+        baseline = pool.submit(evaluate, defaults, DEFAULT_PARAMS["n_estimators"]).result()
+
+    results = pd.DataFrame(records)
+    storage.write_table(results, RESULTS_TABLE)
+
+    # Best over every rung: more rounds can overfit, so a short early trial may win
+    config, result = min(trials, key=lambda cr: cr[1]["logloss"])
+    params = {**config, "n_estimators": result["rounds"]}
+    BEST_PARAMS_PATH.parent.mkdir(exist_ok=True)
+    BEST_PARAMS_PATH.write_text(json.dumps({
+        "params": params,
+        "layout": args.layout,
+        "logloss": result["logloss"],
+        "brier": result["brier"],
+        "folds": args.folds,
+        "tuned": datetime.now().isoformat(timespec="seconds"),
+    }, indent=1), encoding="utf-8")
+
+    print(f"✅ {len(results)} trials saved to: {storage.table_path(RESULTS_TABLE).resolve()}")
+    print(f"🏆 Best: {params} — log loss {result['logloss']:.4f}, Brier {result['brier']:.4f} "
+          f"(untuned defaults: {baseline['logloss']:.4f}, {baseline['brier']:.4f})")
+    print(f"💾 Saved to {BEST_PARAMS_PATH}; save_yrfi_model.py trains with it")
+    print(f"⏱ {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,139 @@
+﻿# walk_forward.py
+# Walk-forward backtest: each game day is scored by a model trained only on the games
+# completed before it, so no future game leaks into the score.
+#
+# The model is the one save_yrfi_model.py ships: tune_yrfi_xgb.py's best parameters on the
+# layout they were tuned on (--defaults for the untuned ones).
+#
+# Game days are cut into blocks of --refit-every days. A block opens with a full fit on
+# every earlier game; each later day in the block warm-starts from the previous day's
+# booster and adds --daily-rounds trees fitted on all games before that day, so daily
+# retrains stay cheap. Blocks don't depend on each other and run on a process pool; every
+# worker memory-maps the same cached feature matrix (features.py) instead of receiving it.
+#
+# The one-hot encoder's categories (teams, handedness) come from the whole table; they
+# are known before the season and carry no outcome information.
+#
+#   python walk_forward.py                                      # every game day in the table
+#   python walk_forward.py --start 2025-04-01 --end 2025-04-19 --workers 8
+#   python walk_forward.py --refit-every 14 --daily-rounds 5 --layout sparse
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import accuracy_score, log_loss, precision_score, recall_score, roc_auc_score
+from sklearn.preprocessing import OneHotEncoder
+
+import features
+import storage
+import tune_yrfi_xgb
+
+RESULTS_TABLE = "yrfi_walk_forward_backtest"
+SUMMARY_TABLE = "yrfi_walk_forward_summary"
+XGB_PARAMS = dict(objective="binary:logistic", eval_metric="logloss", random_state=42)
+MIN_TRAIN_ROWS = 50
+
+
+def feature_matrix(layout):
+    return features.cached(OneHotEncoder(sparse_output=False, handle_unknown="ignore"), fit=True, layout=layout)
+
+
+def run_block(days, layout, params, daily_rounds, min_train_rows=MIN_TRAIN_ROWS, n_jobs=1):
+    """Scores each day of one block; returns [(first row, end row, probabilities, trees, train rows)]."""
+    fm = feature_matrix(layout)
+    dates = fm.rows["date"].to_numpy()
+    y = fm.y.to_numpy(dtype=float, na_value=np.nan)
+    known = features.labeled(fm.rows).to_numpy()
+    booster, scored = None, []
+    for day in days:
+        lo = np.searchsorted(dates, np.datetime64(day), "left")
+        hi = np.searchsorted(dates, np.datetime64(day), "right")
+        train = np.flatnonzero(known[:lo])  # rows are sorted by date: everything before `day`
+        if len(train) < min_train_rows or len(np.unique(y[train])) < 2:
+            continue
+        rounds = {"n_estimators": daily_rounds} if booster else {}  # warm starts add daily_rounds trees
+        model = xgb.XGBClassifier(**XGB_PARAMS, **{**params, **rounds}, n_jobs=n_jobs, **features.xgb_options(layout))
+        model.fit(features._take(fm.X, train), y[train].astype(int), xgb_model=booster)
+        booster = model.get_booster()
+        proba = model.predict_proba(features._take(fm.X, slice(lo, hi)))[:, 1]
+        scored.append((lo, hi, proba, booster.num_boosted_rounds(), len(train)))
+    return scored
+
+
+def game_days(rows, start=None, end=None):
+    dates = pd.to_datetime(rows["date"])
+    keep = pd.Series(True, index=rows.index)
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates <= pd.Timestamp(end)
+    return sorted(dates[keep].dt.normalize().unique())
+
+
+def summarize(df):
+    """The same summary columns as summarize_backtest_results.py, plus log loss."""
+    done = df.dropna(subset=["yrfi", "yrfi_probability"])
+    y, p = done["yrfi"].astype(int), done["yrfi_probability"]
+    return pd.DataFrame({
+        "Total Games": [len(done)],
+        "Actual YRFI Rate": [round(y.mean(), 3)],
+        "Model Accuracy": [round(accuracy_score(y, done["yrfi_predicted"]), 3)],
+        "YRFI Precision": [round(precision_score(y, done["yrfi_predicted"], zero_division=0), 3)],
+        "YRFI Recall": [round(recall_score(y, done["yrfi_predicted"], zero_division=0), 3)],
+        "ROC AUC": [round(roc_auc_score(y, p), 3) if y.nunique() > 1 else np.nan],
+        "Log Loss": [round(log_loss(y, p, labels=[0, 1]), 4)],
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", help="First game day to score (default: the first one)")
+    parser.add_argument("--end", help="Last game day to score (default: the last one)")
+    parser.add_argument("--refit-every", type=int, default=7, help="Game days per block (full fit at each block start)")
+    parser.add_argument("--daily-rounds", type=int, default=10, help="Trees added by each warm-started daily retrain")
+    parser.add_argument("--min-train-rows", type=int, default=MIN_TRAIN_ROWS, help="Skip days with less history")
+    parser.add_argument("--layout", choices=features.LAYOUTS,
+                        help="Feature matrix layout (default: the one tune_yrfi_xgb.py tuned on, else dense)")
+    parser.add_argument("--defaults", action="store_true", help="Backtest the untuned default parameters")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Blocks fitted in parallel")
+    args = parser.parse_args()
+
+    # The configuration save_yrfi_model.py ships: tune_yrfi_xgb.py's best, on its layout
+    params = dict(tune_yrfi_xgb.DEFAULT_PARAMS) if args.defaults else tune_yrfi_xgb.best_params()
+    layout = args.layout or (None if args.defaults else tune_yrfi_xgb.best_layout()) or "dense"
+
+    started = time.perf_counter()
+    fm = feature_matrix(layout)  # builds the feature cache once, before the workers map it
+    days = game_days(fm.rows, args.start, args.end)
+    blocks = [days[i:i + args.refit_every] for i in range(0, len(days), args.refit_every)]
+    workers = max(1, min(args.workers, len(blocks)))
+    threads = max(1, (os.cpu_count() or 1) // workers)  # xgboost threads per worker
+    print(f"🚶 Walk-forward over {len(days)} game days in {len(blocks)} blocks, {workers} workers; "
+          f"{layout} layout, params {params}")
+
+    df = fm.rows.copy()
+    df["yrfi_probability"] = np.nan
+    df["model_trees"] = pd.array([pd.NA] * len(df), dtype="Int16")
+    df["train_rows"] = pd.array([pd.NA] * len(df), dtype="Int32")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_block, block, layout, params, args.daily_rounds, args.min_train_rows, threads)
+                   for block in blocks]
+        for future in futures:
+            for lo, hi, proba, trees, train_rows in future.result():
+                df.loc[lo:hi - 1, "yrfi_probability"] = proba
+                df.loc[lo:hi - 1, "model_trees"] = trees
+                df.loc[lo:hi - 1, "train_rows"] = train_rows
+
+    df = df[df["yrfi_probability"].notna()].reset_index(drop=True)
+    df["yrfi_predicted"] = (df["yrfi_probability"] >= 0.5).astype(int)
+    storage.write_table(df, RESULTS_TABLE)
+    summary = summarize(df)
+    storage.write_table(summary, SUMMARY_TABLE)
+
+    print(f"✅ Walk-forward predictions for {len(df)} games saved to: {storage.table_path(RESULTS_TABLE).resolve()}")
+    print(summary.to_string(index=False))
+    print(f"⏱ {time.perf_counter() - started:.1f}s")
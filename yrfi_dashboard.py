@@ -1,6 +1,8 @@
 ﻿import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+import explain_predictions
+import storage
 
 # === Page Setup ===
 st.set_page_config(page_title="YRFI Dashboard", layout="wide")
@@ -20,14 +22,14 @@ def dedupe_columns(df):
 
 # === Load and Prepare Data ===
 try:
-    live = pd.read_csv("data/yrfi_model_input_live_with_era.csv")
+    live = storage.read_table("yrfi_model_input_live_with_era")
     live = dedupe_columns(live)
 except Exception as e:
     st.error(f"💥 Failed to load data file: {e}")
     st.stop()
 
 # === Check Required Columns ===
-required_cols = ["date", "Away 1st_x", "Home 1st_x", "YRFI"]
+required_cols = ["date", "Away 1st", "Home 1st", "YRFI"]
 missing_cols = [col for col in required_cols if col not in live.columns]
 
 if missing_cols:
@@ -39,7 +41,7 @@ live["Game Date"] = pd.to_datetime(live["date"]).dt.date
 live.rename(columns={"YRFI": "YRFI_pred"}, inplace=True)
 
 # === Compute actual YRFI result from scores ===
-live["YRFI_actual"] = ((live["Away 1st_x"].fillna(0) > 0) | (live["Home 1st_x"].fillna(0) > 0)).astype(int)
+live["YRFI_actual"] = ((live["Away 1st"].fillna(0) > 0) | (live["Home 1st"].fillna(0) > 0)).astype(int)
 
 # === Debug Info ===
 st.markdown("### 🛠 Data Debug Info")
@@ -92,6 +94,22 @@ if not filtered.empty:
 else:
     st.warning("No predictions available for this date.")
 
+# === Why: per-feature contributions stored by explain_predictions.py (never recomputed here)
+if storage.exists(explain_predictions.TABLE):
+    contribs = storage.read_table(explain_predictions.TABLE, start=selected_date, end=selected_date)
+    if not contribs.empty:
+        contribs = contribs.sort_values("model_version").drop_duplicates("game_key", keep="last")
+        contrib_cols = [c for c in contribs.columns if c.startswith(explain_predictions.PREFIX)]
+        contribs["Top Drivers"] = explain_predictions.top_drivers(contribs)
+        st.subheader("🧮 Why the model rates these games")
+        st.caption("Each feature's push on the YRFI log-odds (positive = toward a 1st-inning run)")
+        st.dataframe(contribs[["away_team", "home_team", "yrfi_prob", "Top Drivers"]]
+                     .sort_values("yrfi_prob", ascending=False), use_container_width=True)
+        with st.expander("All feature contributions"):
+            st.dataframe(contribs[["away_team", "home_team", "bias"] + contrib_cols]
+                         .rename(columns=lambda c: c.removeprefix(explain_predictions.PREFIX)),
+                         use_container_width=True)
+
 # === Accuracy Summary ===
 today_total = filtered.shape[0]
 today_correct = (filtered["Correct"] == "✅").sum()